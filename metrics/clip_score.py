@@ -2,8 +2,20 @@ from PIL import Image
 import torch
 import os
 import json
+import time
 import argparse
+import numpy as np
+from torch.utils.data import Dataset, DataLoader
+from tqdm import tqdm
 from transformers import CLIPProcessor, CLIPModel
+from metric_cache import MetricCache
+from embedding_store import EmbeddingStore
+
+
+# bump when a change alters CLIP scores, invalidating cached results
+CLIP_VERSION = 2
+CLIP_MODEL = "ckpts/clip-vit-base-patch32"
+VIEW_FILES = ("image_000.png", "image_090.png", "image_180.png", "image_270.png")
 
 def clip_sim(model, processor, device, img_path, prompt):
     image = Image.open(img_path).convert("RGB")
@@ -15,35 +27,227 @@ def read_json_file(file_path):
     with open(file_path, 'r') as file:
         return json.load(file)
 
+def read_prompt(scene_dir, prompt_root="infer_res/prompt"):
+    """Description of <model>/<room>/<id> from <prompt_root>/<room>.json."""
+    parts = os.path.normpath(scene_dir).split(os.sep)
+    prompts = read_json_file(os.path.join(prompt_root, f"{parts[-2]}.json"))
+    return prompts[int(parts[-1])]["description"]
+
 def max_sim(model, processor, device, scene_dir, prompt):
-    img1 = os.path.join(scene_dir, "image_000.png")
-    img2 = os.path.join(scene_dir, "image_090.png")
-    img3 = os.path.join(scene_dir, "image_180.png")
-    img4 = os.path.join(scene_dir, "image_270.png")
-    
-    similarity1 = clip_sim(model, processor, device, img1, prompt)
-    similarity2 = clip_sim(model, processor, device, img2, prompt)
-    similarity3 = clip_sim(model, processor, device, img3, prompt)
-    similarity4 = clip_sim(model, processor, device, img4, prompt)
+    return max(clip_sim(model, processor, device, os.path.join(scene_dir, view), prompt) for view in VIEW_FILES)
+
+def cache_key(cache, scene_dir, prompt, model_name=CLIP_MODEL, variant=None):
+    """
+    MetricCache key of a scene's CLIP score: the rendered views, the prompt
+    text, the model and its variant (e.g. "int8"), since quantized scores differ.
+    """
+    params = {"prompt": prompt, "model": os.path.basename(os.path.normpath(model_name))}
+    if variant:
+        params["variant"] = variant
+    return cache.key("clip", CLIP_VERSION, [os.path.join(scene_dir, view) for view in VIEW_FILES], params)
+
+def set_cpu_threads(threads=None, interop_threads=None):
+    """Intra-op and inter-op thread pools; the inter-op size can only be set before any parallel work."""
+    if threads:
+        torch.set_num_threads(threads)
+    if interop_threads:
+        try:
+            torch.set_num_interop_threads(interop_threads)
+        except RuntimeError as e:
+            print(f"Warning: inter-op threads already fixed ({e})")
+
+def quantize_clip(model):
+    """Dynamic int8 quantization of every nn.Linear (weights int8, activations quantized on the fly); CPU only."""
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+def load_clip(model_name=CLIP_MODEL, device=None, quantize=False, threads=None, interop_threads=None):
+    """
+    CLIP model, processor and device in inference setup. `quantize` selects the
+    CPU mode: the model stays on CPU with int8 dynamic quantization of its
+    linear layers. `threads` / `interop_threads` size torch's CPU thread pools.
+    """
+    set_cpu_threads(threads, interop_threads)
+    if device is None:
+        device = "cpu" if quantize or not torch.cuda.is_available() else "cuda"
+    device = torch.device(device)
+    if quantize and device.type != "cpu":
+        raise ValueError("Dynamic quantization runs on CPU only")
+    model = CLIPModel.from_pretrained(model_name).eval()
+    processor = CLIPProcessor.from_pretrained(model_name, use_fast=True)
+    model = quantize_clip(model) if quantize else model.to(device)
+    return model, processor, device
+
+class ImageDataset(Dataset):
+    """Decodes and preprocesses images in DataLoader workers."""
+
+    def __init__(self, image_paths, image_processor):
+        self.image_paths = image_paths
+        self.image_processor = image_processor
+
+    def __len__(self):
+        return len(self.image_paths)
 
-    return max(similarity1, similarity2, similarity3, similarity4)
+    def __getitem__(self, index):
+        with Image.open(self.image_paths[index]) as image:
+            image = image.convert("RGB")
+        return self.image_processor(images=image, return_tensors="pt")["pixel_values"][0]
+
+def encode_images(model, processor, device, image_paths, batch_size=64, num_workers=4):
+    """L2-normalized CLIP image embeddings, (N, D), encoded in batches."""
+    loader = DataLoader(
+        ImageDataset(image_paths, processor.image_processor), batch_size=batch_size, num_workers=num_workers,
+        pin_memory=device.type == "cuda", prefetch_factor=2 if num_workers > 0 else None
+    )
+    embeddings = []
+    with torch.inference_mode():
+        for pixel_values in tqdm(loader, desc="CLIP images", disable=len(loader) < 2):
+            features = model.get_image_features(pixel_values=pixel_values.to(device, non_blocking=True))
+            embeddings.append(torch.nn.functional.normalize(features, dim=-1).float().cpu())
+    return torch.cat(embeddings) if embeddings else torch.zeros(0, model.config.projection_dim)
+
+def encode_texts(model, processor, device, prompts, batch_size=256):
+    """L2-normalized CLIP text embeddings, (N, D), one row per prompt."""
+    embeddings = []
+    with torch.inference_mode():
+        for start in range(0, len(prompts), batch_size):
+            inputs = processor.tokenizer(
+                list(prompts[start:start + batch_size]), padding=True, truncation=True, return_tensors="pt"
+            ).to(device)
+            features = model.get_text_features(**inputs)
+            embeddings.append(torch.nn.functional.normalize(features, dim=-1).float().cpu())
+    return torch.cat(embeddings) if embeddings else torch.zeros(0, model.config.projection_dim)
+
+def batch_sims(model, processor, device, scenes, batch_size=64, num_workers=4, store=None):
+    """
+    Per-view CLIP similarities of many (scene_dir, prompt) pairs. Each distinct
+    prompt is encoded once, all views of all scenes go through one prefetching
+    DataLoader, and the logits are the scaled dot products of the embeddings,
+    as in CLIPModel.forward. With an EmbeddingStore only views and prompts it
+    has not seen are encoded. Returns a (num_scenes, num_views) array.
+    """
+    if not scenes:
+        return torch.zeros(0, len(VIEW_FILES)).numpy()
+    prompts = sorted({prompt for _, prompt in scenes})
+    prompt_index = {prompt: i for i, prompt in enumerate(prompts)}
+    image_paths = [os.path.join(scene_dir, view) for scene_dir, _ in scenes for view in VIEW_FILES]
+    if store is None:
+        image_embeds = encode_images(model, processor, device, image_paths, batch_size, num_workers)
+        # after the DataLoader workers are gone, so the tokenizer is not used across a fork
+        text_embeds = encode_texts(model, processor, device, prompts)
+    else:
+        image_embeds = torch.from_numpy(store.embed(
+            "image", store.image_keys(image_paths), image_paths,
+            lambda paths: encode_images(model, processor, device, paths, batch_size, num_workers)
+        ))
+        text_embeds = torch.from_numpy(store.embed(
+            "text", store.text_keys(prompts), prompts, lambda texts: encode_texts(model, processor, device, texts)
+        ))
+    image_embeds = image_embeds.view(len(scenes), len(VIEW_FILES), -1)
+    text_embeds = text_embeds[[prompt_index[prompt] for _, prompt in scenes]]
+    logit_scale = model.logit_scale.detach().exp().float().cpu()
+    return (logit_scale * torch.einsum("svd,sd->sv", image_embeds, text_embeds)).numpy()
+
+def score_scenes(model, processor, device, scenes, cache=None, model_name=CLIP_MODEL, batch_size=64, num_workers=4,
+                 variant=None, store=None):
+    """
+    {"clip": max over views, "views": per-view similarities} for each
+    (scene_dir, prompt) pair. Cached results are reused and only the rest are
+    scored, together, by batch_sims (from `store` embeddings where possible).
+    """
+    results = [None] * len(scenes)
+    keys = [
+        cache_key(cache, scene_dir, prompt, model_name, variant) if cache is not None else None for scene_dir, prompt in scenes
+    ]
+    if cache is not None:
+        results = [cache.get("clip", key) for key in keys]
+    stale = [i for i, result in enumerate(results) if result is None]
+    sims = batch_sims(model, processor, device, [scenes[i] for i in stale], batch_size, num_workers, store)
+    for i, views in zip(stale, sims):
+        results[i] = {"clip": float(views.max()), "views": [float(v) for v in views]}
+        if cache is not None:
+            cache.put("clip", keys[i], results[i])
+    return results
+
+def score_scene(model, processor, device, scene_dir, prompt, cache=None, model_name=CLIP_MODEL, variant=None):
+    """score_scenes for a single scene."""
+    return score_scenes(model, processor, device, [(scene_dir, prompt)], cache, model_name, num_workers=0, variant=variant)[0]
+
+def find_scene_dirs(root):
+    """Folders below `root` holding all rendered views."""
+    scene_dirs = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        if all(view in filenames for view in VIEW_FILES):
+            scene_dirs.append(dirpath)
+    return scene_dirs
+
+def rank_correlation(a, b):
+    """Pearson and Spearman (rank, ties broken by order) correlation of two score vectors."""
+    a, b = np.asarray(a, dtype=np.float64).ravel(), np.asarray(b, dtype=np.float64).ravel()
+    pearson = float(np.corrcoef(a, b)[0, 1])
+    spearman = float(np.corrcoef(np.argsort(np.argsort(a)), np.argsort(np.argsort(b)))[0, 1])
+    return pearson, spearman
+
+def timed_sims(model, processor, device, scenes, batch_size=64, num_workers=4):
+    """batch_sims plus the throughput in images per second."""
+    start = time.perf_counter()
+    sims = batch_sims(model, processor, device, scenes, batch_size, num_workers)
+    return sims, len(scenes) * len(VIEW_FILES) / (time.perf_counter() - start)
+
+def check_quantized(scenes, model_name=CLIP_MODEL, batch_size=64, num_workers=4, threads=None):
+    """
+    Score the same scenes with the fp32 and the int8 CPU model and report
+    images/s of both and how well the int8 scores track the fp32 ones.
+    """
+    model, processor, device = load_clip(model_name, "cpu", threads=threads)
+    fp32, fp32_rate = timed_sims(model, processor, device, scenes, batch_size, num_workers)
+    int8, int8_rate = timed_sims(quantize_clip(model), processor, device, scenes, batch_size, num_workers)
+    report = {
+        "num_scenes": len(scenes), "threads": torch.get_num_threads(),
+        "fp32_images_per_second": fp32_rate, "int8_images_per_second": int8_rate,
+        "views_pearson_spearman": rank_correlation(fp32, int8),
+        "max_pearson_spearman": rank_correlation(fp32.max(axis=1), int8.max(axis=1)),
+        "max_abs_diff": float(np.abs(fp32 - int8).max())
+    }
+    print(f"fp32 {fp32_rate:.1f} images/s, int8 {int8_rate:.1f} images/s ({int8_rate / fp32_rate:.2f}x) on {report['threads']} threads")
+    print("int8 vs fp32 per-view Pearson {:.4f} / Spearman {:.4f}".format(*report["views_pearson_spearman"]))
+    print("int8 vs fp32 max-view Pearson {:.4f} / Spearman {:.4f}, max |diff| {:.4f}".format(
+        *report["max_pearson_spearman"], report["max_abs_diff"]))
+    return report
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Check USD object CLIP-Similarity")
-    parser.add_argument("--scene_dir", type=str, default="infer_res/sft_IL3D_1.7b/bathroom/0", help="Path to scene directory (contains object.usda and floor.usda)")
+    parser.add_argument("--scene_dir", type=str, nargs="+", default=["infer_res/sft_IL3D_1.7b/bathroom/0"], help="Scene directories (contain the rendered image_*.png views)")
+    parser.add_argument("--root", type=str, default=None, help="Score every scene with rendered views below this folder instead")
+    parser.add_argument("--prompt_root", type=str, default="infer_res/prompt")
+    parser.add_argument("--batch_size", type=int, default=64, help="Images per CLIP forward pass")
+    parser.add_argument("--num_workers", type=int, default=4, help="DataLoader processes decoding PNGs")
+    parser.add_argument("--device", type=str, default=None, choices=["cpu", "cuda"], help="Default: cuda when available")
+    parser.add_argument("--quantize", action="store_true", help="CPU mode: int8 dynamic quantization of the linear layers")
+    parser.add_argument("--threads", type=int, default=None, help="Intra-op CPU threads")
+    parser.add_argument("--interop_threads", type=int, default=None, help="Inter-op CPU threads")
+    parser.add_argument("--check_quantized", type=int, default=0, metavar="N", help="Compare int8 with fp32 scores and speed on N sampled scenes, then exit")
+    parser.add_argument("--cache_dir", type=str, default=None, help="Metric result cache shared with evaluate.py")
+    parser.add_argument("--embedding_store", type=str, default=None, help="Directory of memory-mapped image / prompt embeddings")
     args = parser.parse_args()
 
-    model = CLIPModel.from_pretrained("ckpts/clip-vit-base-patch32")
-    processor = CLIPProcessor.from_pretrained("ckpts/clip-vit-base-patch32", use_fast=True)
-    
-    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-    model.to(device)
-
-    id = 18
-    prompt_dir = args.scene_dir.split("/")[-2]
-    prompt_path = os.path.join("infer_res/prompt", f"{prompt_dir}.json")
-    prompts = read_json_file(prompt_path)
-    prompt = prompts[int(args.scene_dir.split("/")[-1])]["description"]
-    similarity = max_sim(model, processor, device, args.scene_dir, prompt)
-    print(f"Max CLIP-Sim score: {similarity:.4f}")
+    scene_dirs = find_scene_dirs(args.root) if args.root else args.scene_dir
+    scenes = [(scene_dir, read_prompt(scene_dir, args.prompt_root)) for scene_dir in scene_dirs]
+    if args.check_quantized:
+        rng = np.random.default_rng(0)
+        sample = rng.choice(len(scenes), size=min(args.check_quantized, len(scenes)), replace=False)
+        check_quantized([scenes[i] for i in sorted(sample)], batch_size=args.batch_size, num_workers=args.num_workers,
+                        threads=args.threads)
+        raise SystemExit
+
+    model, processor, device = load_clip(CLIP_MODEL, args.device, args.quantize, args.threads, args.interop_threads)
+    variant = "int8" if args.quantize else None
+    cache = MetricCache(args.cache_dir) if args.cache_dir else None
+    store = EmbeddingStore(args.embedding_store, CLIP_MODEL, variant) if args.embedding_store else None
+    results = score_scenes(model, processor, device, scenes, cache, batch_size=args.batch_size, num_workers=args.num_workers,
+                           variant=variant, store=store)
+    if cache is not None:
+        cache.flush()
+    for (scene_dir, _), result in zip(scenes, results):
+        print(f"{scene_dir}: max CLIP-Sim score {result['clip']:.4f}, views " + " ".join(f"{v:.4f}" for v in result["views"]))
@@ -0,0 +1,112 @@
+import os
+import json
+import hashlib
+import numpy as np
+from metric_cache import FileHashIndex, write_json_atomic
+
+
+# bump when stored embeddings are no longer comparable (preprocessing, normalization)
+EMBEDDING_VERSION = 1
+
+
+def text_hash(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingTable:
+    """
+    Append-only float32 matrix in <path>.f32 with a JSON index
+    <path>.json of {"dim": D, "rows": {key: row}}. Rows are read through a
+    read-only np.memmap, so only the rows that are gathered get paged in.
+    Rows past the index (an interrupted append) are overwritten by the next put.
+    """
+
+    def __init__(self, path):
+        self.data_path = path + ".f32"
+        self.index_path = path + ".json"
+        self.dim = None
+        self.rows = {}
+        self.memmap = None
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "r") as f:
+                index = json.load(f)
+            self.dim, self.rows = index["dim"], index["rows"]
+
+    def __len__(self):
+        return len(self.rows)
+
+    def lookup(self, keys):
+        """Row of every key, -1 where it is not stored."""
+        return np.array([self.rows.get(key, -1) for key in keys], dtype=np.int64)
+
+    def matrix(self):
+        """All stored rows as a read-only (N, D) memmap."""
+        if self.memmap is None or len(self.memmap) != len(self.rows):
+            if not self.rows:
+                return np.zeros((0, self.dim or 0), dtype=np.float32)
+            self.memmap = np.memmap(self.data_path, dtype=np.float32, mode="r", shape=(len(self.rows), self.dim))
+        return self.memmap
+
+    def get(self, rows):
+        return np.asarray(self.matrix()[rows])
+
+    def put(self, keys, embeddings):
+        """Append the rows of new keys; keys already stored keep their row."""
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        if self.dim is None:
+            self.dim = embeddings.shape[1]
+        if embeddings.shape[1] != self.dim:
+            raise ValueError(f"Embedding size {embeddings.shape[1]} does not match the stored {self.dim}")
+        new = {}
+        for key, embedding in zip(keys, embeddings):
+            if key not in self.rows and key not in new:
+                new[key] = embedding
+        if not new:
+            return
+        os.makedirs(os.path.dirname(self.data_path) or ".", exist_ok=True)
+        with open(self.data_path, "ab") as f:
+            f.truncate(len(self.rows) * self.dim * 4)
+            f.write(np.stack(list(new.values())).tobytes())
+        self.memmap = None
+        self.rows.update({key: len(self.rows) + i for i, key in enumerate(new)})
+        write_json_atomic({"dim": self.dim, "rows": self.rows}, self.index_path)
+
+
+class EmbeddingStore:
+    """
+    Embeddings of one CLIP model (and variant) below
+    <store_dir>/v<EMBEDDING_VERSION>/<model>[-<variant>]/: "image" rows keyed
+    by the content hash of the rendered view, "text" rows keyed by the hash of
+    the prompt. A view or
+    prompt is encoded once whichever scene, run or layout model it belongs to,
+    and scoring is a product of stored rows. Meant for one writing process.
+    """
+
+    def __init__(self, store_dir, model_name, variant=None):
+        name = os.path.basename(os.path.normpath(model_name)) + (f"-{variant}" if variant else "")
+        self.root = os.path.join(store_dir, f"v{EMBEDDING_VERSION}", name)
+        self.hashes = FileHashIndex(os.path.join(store_dir, "file_hashes.json"))
+        self.tables = {kind: EmbeddingTable(os.path.join(self.root, kind)) for kind in ("image", "text")}
+
+    def image_keys(self, image_paths):
+        return [self.hashes.file_hash(path) for path in image_paths]
+
+    def text_keys(self, texts):
+        return [text_hash(text) for text in texts]
+
+    def embed(self, kind, keys, items, encode):
+        """
+        (N, D) embeddings for `keys`; the items whose key is not stored yet are
+        passed to `encode` (deduplicated) and their embeddings appended.
+        """
+        table = self.tables[kind]
+        rows = table.lookup(keys)
+        missing = {}
+        for key, item, row in zip(keys, items, rows):
+            if row < 0:
+                missing.setdefault(key, item)
+        if missing:
+            table.put(list(missing), np.asarray(encode(list(missing.values()))))
+            rows = table.lookup(keys)
+        self.hashes.flush()
+        return table.get(rows)
@@ -0,0 +1,294 @@
+import os
+import csv
+import json
+import time
+import argparse
+import traceback
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from tqdm import tqdm
+import oobr
+from metric_cache import MetricCache
+
+
+# result columns contributed by each metric
+METRICS = {"oobr": ("oob", "oor"), "clip": ("clip",), "gpt": ("gpt",)}
+# per-process asset mesh caches for method="mesh", keyed by cache directory
+MESH_CACHES = {}
+
+
+def find_scenes(root, models=None):
+    """
+    Scene folders (holding object.usda and floor.usda) below `root`, laid out as
+    <root>/<model>/<room>/<id>. Returns (scene_dir, model, room) tuples.
+    """
+    scenes = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        if not all(f in filenames for f in oobr.SCENE_FILES):
+            continue
+        parts = os.path.relpath(dirpath, root).split(os.sep)
+        model = parts[0] if len(parts) >= 1 else ""
+        room = parts[1] if len(parts) >= 2 else ""
+        if models and model not in models:
+            continue
+        scenes.append((dirpath, model, room))
+    return scenes
+
+
+def get_mesh_cache(cache_dir):
+    if cache_dir not in MESH_CACHES:
+        from mesh_collision import AssetMeshCache
+        MESH_CACHES[cache_dir] = AssetMeshCache(cache_dir)
+    return MESH_CACHES[cache_dir]
+
+
+def compute_oobr(scene_dir, method="auto", mesh_cache_dir=None):
+    """OOB / OOR of one scene and the seconds it took, run in a worker process."""
+    start = time.perf_counter()
+    mesh_cache = get_mesh_cache(mesh_cache_dir) if method == "mesh" else None
+    return oobr.score_scene(scene_dir, method, mesh_cache=mesh_cache), time.perf_counter() - start
+
+
+class MetricJobs:
+    """
+    Stale entries of one metric: (scene index, cache key) pairs whose result
+    is not in the cache yet. Computed values are written back as they arrive.
+    """
+
+    def __init__(self, name, cache):
+        self.name = name
+        self.cache = cache
+        self.pending = []
+
+    def lookup(self, index, key, result):
+        cached = self.cache.get(self.name, key)
+        if cached is None:
+            self.pending.append((index, key))
+            return False
+        result[self.name] = cached
+        return True
+
+    def store(self, result, key, value):
+        self.cache.put(self.name, key, value)
+        result[self.name] = value
+
+
+def run_oobr(jobs, scenes, results, method, workers, mesh_cache_dir):
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(compute_oobr, scenes[index][0], method, mesh_cache_dir): (index, key) for index, key in jobs.pending
+        }
+        for future in tqdm(as_completed(futures), total=len(futures), desc="oobr"):
+            index, key = futures[future]
+            try:
+                value, seconds = future.result()
+                jobs.store(results[index], key, value)
+                results[index]["seconds"] = seconds
+            except Exception:
+                results[index]["errors"]["oobr"] = traceback.format_exc()
+
+
+def run_clip(jobs, scenes, results, prompts, batch_size=64, num_workers=4, quantize=False, threads=None, store_dir=None):
+    from clip_score import CLIP_MODEL, EmbeddingStore, load_clip, score_scenes
+
+    model, processor, device = load_clip(CLIP_MODEL, quantize=quantize, threads=threads)
+    store = EmbeddingStore(store_dir, CLIP_MODEL, "int8" if quantize else None) if store_dir else None
+    try:
+        values = score_scenes(
+            model, processor, device, [(scenes[index][0], prompts[index]) for index, _ in jobs.pending],
+            batch_size=batch_size, num_workers=num_workers, store=store
+        )
+    except Exception:
+        error = traceback.format_exc()
+        for index, _ in jobs.pending:
+            results[index]["errors"]["clip"] = error
+        return
+    for (index, key), value in zip(jobs.pending, values):
+        jobs.store(results[index], key, value)
+
+
+def run_gpt(jobs, scenes, results, prompt_root, concurrency=8, requests_per_minute=60, payload=None):
+    import gpt_rating
+    from gpt_runner import format_error, rate_scenes
+
+    rating_jobs = []
+    for index, key in jobs.pending:
+        scene_dir = scenes[index][0]
+        input_text = gpt_rating.scene_input_text(scene_dir, os.path.basename(os.path.normpath(scene_dir)), prompt_root)
+        rating_jobs.append((scene_dir, input_text, key))
+    try:
+        ratings, _ = rate_scenes(rating_jobs, concurrency=concurrency, requests_per_minute=requests_per_minute, payload=payload)
+    except Exception:
+        error = traceback.format_exc()
+        for index, _ in jobs.pending:
+            results[index]["errors"]["gpt"] = error
+        return
+    for (index, key), rating in zip(jobs.pending, ratings):
+        if isinstance(rating, Exception):
+            results[index]["errors"]["gpt"] = format_error(rating)
+        else:
+            jobs.store(results[index], key, rating)
+
+
+def scene_key(name, cache, scene_dir, method, prompt_root, prompts, index, clip_variant=None, gpt_payload=None):
+    """Cache key of metric `name` for one scene; CLIP prompts are kept in `prompts` for scoring."""
+    if name == "oobr":
+        return oobr.cache_key(cache, scene_dir, method)
+    from clip_score import read_prompt
+    prompt = read_prompt(scene_dir, prompt_root)
+    if name == "clip":
+        from clip_score import cache_key
+        prompts[index] = prompt
+        return cache_key(cache, scene_dir, prompt, variant=clip_variant)
+    if name == "gpt":
+        import gpt_rating
+        return gpt_rating.cache_key(cache, scene_dir, gpt_rating.get_prompt(prompt), payload=gpt_payload)
+    raise ValueError(f"Unknown metric: {name}")
+
+
+def scene_columns(result):
+    """Flat metric columns of one scene result."""
+    columns = {}
+    if "oobr" in result:
+        columns.update(oob=result["oobr"]["oob"], oor=result["oobr"]["oor"])
+    if "clip" in result:
+        columns["clip"] = result["clip"]["clip"]
+    if "gpt" in result:
+        import gpt_rating
+        columns["gpt"] = gpt_rating.overall_score(result["gpt"])
+    return columns
+
+
+def summarize(values):
+    values = np.asarray([v for v in values if v is not None], dtype=np.float64)
+    return {"mean": float(values.mean()), "median": float(np.median(values))} if len(values) else {"mean": None, "median": None}
+
+
+def aggregate(scene_rows, columns):
+    """
+    One row per (model, room type) plus one "ALL" row per model, with the
+    scene count and mean / median of every metric column.
+    """
+    groups = {}
+    for r in scene_rows:
+        groups.setdefault((r["model"], r["room"]), []).append(r)
+        groups.setdefault((r["model"], "ALL"), []).append(r)
+    rows = []
+    for (model, room), group in sorted(groups.items()):
+        row = {"model": model, "room_type": room, "num_scenes": len(group)}
+        for column in columns:
+            stats = summarize([r.get(column) for r in group])
+            row[f"{column}_mean"], row[f"{column}_median"] = stats["mean"], stats["median"]
+        rows.append(row)
+    return rows
+
+
+def write_report(report, report_path, columns):
+    with open(report_path, "w") as f:
+        f.write(json.dumps(report, indent=4))
+    csv_path = os.path.splitext(report_path)[0] + ".csv"
+    fields = ["model", "room_type", "num_scenes"] + [f"{c}_{s}" for c in columns for s in ("mean", "median")]
+    with open(csv_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(report["rows"])
+    return csv_path
+
+
+def evaluate(root, report_path, models=None, metrics=("oobr",), workers=None, method="auto", cache_dir="metric_cache",
+             prompt_root="infer_res/prompt", mesh_cache_dir=None, clip_batch_size=64, clip_workers=4, clip_quantize=False,
+             clip_threads=None, clip_embedding_dir=None, gpt_concurrency=8, gpt_rpm=60,
+             gpt_payload=None):
+    """
+    Score every scene below `root` and write the aggregated report to
+    `report_path` (JSON) and the matching .csv. Every result is looked up in
+    the content-hash MetricCache first and only stale entries are computed:
+    OOB / OOR on a process pool, CLIP in batches across scenes (reusing the
+    view / prompt embeddings in `clip_embedding_dir`) and GPT ratings as
+    concurrent, rate-limited requests carrying views preprocessed by
+    `gpt_payload` (an image_payload.ImagePayloads).
+    """
+    cache = MetricCache(cache_dir)
+    scenes = find_scenes(root, models)
+    results = [{"scene": d, "model": m, "room": r, "errors": {}} for d, m, r in scenes]
+    jobs = {name: MetricJobs(name, cache) for name in metrics}
+    prompts = {}
+
+    start = time.perf_counter()
+    for index, (scene_dir, _, _) in enumerate(tqdm(scenes, desc="hashing")):
+        for name in metrics:
+            try:
+                key = scene_key(
+                    name, cache, scene_dir, method, prompt_root, prompts, index, "int8" if clip_quantize else None, gpt_payload
+                )
+                jobs[name].lookup(index, key, results[index])
+            except Exception:
+                results[index]["errors"][name] = traceback.format_exc()
+    cache.flush()
+    computed = {name: len(job.pending) for name, job in jobs.items()}
+    print("Stale entries: " + ", ".join(f"{name} {count}/{len(scenes)}" for name, count in computed.items()))
+
+    if "oobr" in jobs and jobs["oobr"].pending:
+        run_oobr(jobs["oobr"], scenes, results, method, workers, mesh_cache_dir)
+    if "clip" in jobs and jobs["clip"].pending:
+        run_clip(jobs["clip"], scenes, results, prompts, clip_batch_size, clip_workers, clip_quantize, clip_threads,
+                 clip_embedding_dir)
+    if "gpt" in jobs and jobs["gpt"].pending:
+        run_gpt(jobs["gpt"], scenes, results, prompt_root, gpt_concurrency, gpt_rpm, gpt_payload)
+    elapsed = time.perf_counter() - start
+
+    columns = [c for name in metrics for c in METRICS[name]]
+    rows = [dict(r, **scene_columns(r)) for r in results]
+    failures = [{"scene": r["scene"], "metric": name, "error": error} for r in results for name, error in r["errors"].items()]
+    report = {
+        "root": root,
+        "metrics": list(metrics),
+        "num_scenes": len(results),
+        "computed": computed,
+        "failed": len(failures),
+        "elapsed_seconds": elapsed,
+        "mean_scene_seconds": float(np.mean([r["seconds"] for r in results if "seconds" in r] or [0.0])),
+        "rows": aggregate(rows, columns),
+        "scenes": [{k: r.get(k) for k in ("scene", "model", "room", "seconds") + tuple(columns)} for r in rows],
+        "failures": failures
+    }
+    csv_path = write_report(report, report_path, columns)
+    print(f"Scored {len(results)} scenes ({len(failures)} failures) in {elapsed:.1f}s -> {report_path}, {csv_path}")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate layout metrics over an infer_res/<model>/<room>/<id> tree")
+    parser.add_argument("--root", type=str, default="infer_res")
+    parser.add_argument("--models", type=str, nargs="*", default=None, help="Only evaluate these model folders")
+    parser.add_argument("--metrics", type=str, nargs="+", default=["oobr"], choices=list(METRICS))
+    parser.add_argument("--workers", type=int, default=None, help="OOB / OOR worker processes")
+    parser.add_argument("--method", type=str, default="auto", choices=["auto", "matrix", "sweep", "mesh"])
+    parser.add_argument("--mesh_cache", type=str, default=None, help="Directory caching asset meshes for --method mesh")
+    parser.add_argument("--cache_dir", type=str, default="metric_cache", help="Content-hash cache of metric results")
+    parser.add_argument("--prompt_root", type=str, default="infer_res/prompt", help="Folder of <room>.json scene descriptions")
+    parser.add_argument("--clip_batch_size", type=int, default=64, help="Images per CLIP forward pass")
+    parser.add_argument("--clip_workers", type=int, default=4, help="DataLoader processes decoding renders for CLIP")
+    parser.add_argument("--clip_quantize", action="store_true", help="Score CLIP on CPU with int8 dynamic quantization")
+    parser.add_argument("--clip_threads", type=int, default=None, help="CPU threads for CLIP")
+    parser.add_argument("--clip_embeddings", type=str, default=None, help="Embedding store reused across runs and models")
+    parser.add_argument("--gpt_concurrency", type=int, default=8, help="GPT rating requests in flight")
+    parser.add_argument("--gpt_rpm", type=float, default=60.0, help="GPT rating requests started per minute")
+    parser.add_argument("--gpt_image_size", type=int, default=384, help="Longest side of the views sent for GPT rating, 0 keeps the render size")
+    parser.add_argument("--gpt_image_quality", type=int, default=75, help="JPEG quality of the views sent for GPT rating")
+    parser.add_argument("--gpt_tile", action="store_true", help="Send the four views tiled 2x2 into one image")
+    parser.add_argument("--gpt_payload_cache", type=str, default=None, help="Directory caching the encoded views")
+    parser.add_argument("--report", type=str, default="eval_report.json")
+    args = parser.parse_args()
+
+    gpt_payload = None
+    if "gpt" in args.metrics:
+        from image_payload import ImagePayloads
+        gpt_payload = ImagePayloads(args.gpt_image_size, args.gpt_image_quality, args.gpt_tile, cache_dir=args.gpt_payload_cache)
+
+    evaluate(args.root, args.report, models=args.models, metrics=args.metrics, workers=args.workers, method=args.method,
+             cache_dir=args.cache_dir, prompt_root=args.prompt_root, mesh_cache_dir=args.mesh_cache,
+             clip_batch_size=args.clip_batch_size, clip_workers=args.clip_workers, clip_quantize=args.clip_quantize,
+             clip_threads=args.clip_threads, clip_embedding_dir=args.clip_embeddings,
+             gpt_concurrency=args.gpt_concurrency, gpt_rpm=args.gpt_rpm, gpt_payload=gpt_payload)
@@ -1,17 +1,22 @@
 import os
 import base64
 import json
+import hashlib
 from PIL import Image
 from io import BytesIO
 from openai import OpenAI
 import argparse
 from tqdm import tqdm
+from metric_cache import MetricCache, file_content_hash, write_json_atomic
 
 
-client = OpenAI(
-    base_url="",
-    api_key=""
-)
+# bump when a change alters ratings, invalidating cached results
+GPT_VERSION = 1
+GPT_MODEL = "openai/gpt-4o"
+VIEW_FILES = ("image_000.png", "image_090.png", "image_180.png", "image_270.png")
+DIMENSIONS = ("Object Pose", "Physical Reality", "Semantic Consistency", "Scene Functionality", "Visual Aesthetics")
+# sent after the prompt when the views are tiled into one image (see image_payload.ImagePayloads)
+TILE_NOTE = "The 4 renderings are tiled into one image: 0° top-left, 90° top-right, 180° bottom-left, 270° bottom-right."
 
 def get_prompt(scene_description):
     res = f"""
@@ -46,8 +51,15 @@ Standard JSON with scores (0-10) and evidence-based comments (linking text and i
 """
     return res
 
-if not client.api_key:
-    raise ValueError("Please set the OPENAI_API_KEY environment variable")
+def client_settings(base_url=None, api_key=None):
+    """Endpoint and key of an OpenAI-compatible API, defaulting to OPENAI_BASE_URL / OPENAI_API_KEY."""
+    api_key = api_key or os.environ.get("OPENAI_API_KEY")
+    if not api_key:
+        raise ValueError("Please set the OPENAI_API_KEY environment variable")
+    return {"base_url": base_url or os.environ.get("OPENAI_BASE_URL") or None, "api_key": api_key}
+
+def get_client(base_url=None, api_key=None):
+    return OpenAI(**client_settings(base_url, api_key))
 
 def read_json_file(file_path):
     with open(file_path, 'r') as file:
@@ -85,10 +97,20 @@ def encode_image(image_path):
     except Exception as e:
         raise ValueError(f"Error processing image {image_path}: {str(e)}")
 
-def call_gpt4v(image_paths, text_input, model="openai/gpt-4o", max_tokens=2000):
+def build_messages(image_paths, text_input, payload=None):
+    """
+    Chat messages of one rating request. The views are sent as re-encoded by
+    encode_image, or preprocessed and cached by an ImagePayloads `payload`.
+    """
     if len(image_paths) != 4:
         raise ValueError("Please provide exactly 4 image paths")
     
+    if payload is not None:
+        content = [{"type": "text", "text": text_input}]
+        if payload.tile:
+            content.append({"type": "text", "text": TILE_NOTE})
+        return [{"role": "user", "content": content + payload.image_parts(image_paths)}]
+
     base64_images = [encode_image(path) for path in image_paths]
     
     messages = [
@@ -107,7 +129,15 @@ def call_gpt4v(image_paths, text_input, model="openai/gpt-4o", max_tokens=2000):
                 "url": f"data:image/jpeg;base64,{img}"
             }
         })
-    
+    return messages
+
+def request_bytes(messages):
+    """Size of the JSON body carrying `messages`."""
+    return len(json.dumps(messages).encode("utf-8"))
+
+def call_gpt4v(image_paths, text_input, model=GPT_MODEL, max_tokens=2000, client=None, payload=None):
+    messages = build_messages(image_paths, text_input, payload)
+    client = client or get_client()
     try:
         response = client.chat.completions.create(
             model=model,
@@ -119,25 +149,79 @@ def call_gpt4v(image_paths, text_input, model="openai/gpt-4o", max_tokens=2000):
         raise Exception(f"API request failed: {str(e)}")
 
 
-def eval(scene_dir, id):
-    image_paths = [
-        os.path.join(scene_dir, "image_000.png"),
-        os.path.join(scene_dir, "image_090.png"),
-        os.path.join(scene_dir, "image_180.png"),
-        os.path.join(scene_dir, "image_270.png")
-    ]
+def overall_score(rating):
+    """Mean score over the five dimensions of a parsed rating, or None."""
+    scores = [rating[d]["Score"] for d in DIMENSIONS if isinstance(rating, dict) and isinstance(rating.get(d), dict) and "Score" in rating[d]]
+    return float(sum(scores) / len(scores)) if scores else None
+
+def cache_key(cache, scene_dir, input_text, model=GPT_MODEL, payload=None):
+    """
+    MetricCache key of a scene's rating: the rendered views, the full prompt
+    text, the model and the image preprocessing, if any.
+    """
+    params = {"prompt": input_text, "model": model}
+    if payload is not None:
+        params["images"] = payload.params()
+    return cache.key("gpt", GPT_VERSION, [os.path.join(scene_dir, view) for view in VIEW_FILES], params)
+
+
+def rating_params(scene_dir, input_text, model=GPT_MODEL, payload=None):
+    """
+    What a rating was made from: the rendered views, the prompt text, the model
+    and the image preprocessing. Recorded next to the persisted rating.
+    """
+    return {
+        "version": GPT_VERSION,
+        "views": [file_content_hash(os.path.join(scene_dir, view)) for view in VIEW_FILES],
+        "prompt": hashlib.sha1(input_text.encode("utf-8")).hexdigest(),
+        "model": model,
+        "images": payload.params() if payload is not None else None
+    }
+
+def load_scene_rating(output_path, params):
+    """The rating persisted in `output_path` if it was made with `params`, else None."""
+    if not os.path.exists(output_path):
+        return None
+    try:
+        data = read_json_file(output_path)
+    except (OSError, ValueError):
+        return None
+    if isinstance(data, dict) and data.get("params") == params:
+        return data.get("rating")
+    return None
+
+def save_scene_rating(output_path, params, rating):
+    write_json_atomic({"params": params, "rating": rating}, output_path)
+
 
-    prompt_dir = scene_dir.split("/")[-2]
-    prompt_path = os.path.join("infer_res/prompt", f"{prompt_dir}.json")
+def scene_input_text(scene_dir, id, prompt_root="infer_res/prompt"):
+    prompt_dir = os.path.normpath(scene_dir).split(os.sep)[-2]
+    prompt_path = os.path.join(prompt_root, f"{prompt_dir}.json")
     prompts = read_json_file(prompt_path)
-    prompt = prompts[int(id)]["description"]
-    input_text = get_prompt(prompt)
+    return get_prompt(prompts[int(id)]["description"])
+
+
+def eval(scene_dir, id, cache=None, model=GPT_MODEL, prompt_root="infer_res/prompt", client=None, payload=None):
+    image_paths = [os.path.join(scene_dir, view) for view in VIEW_FILES]
+    input_text = scene_input_text(scene_dir, id, prompt_root)
+
+    key = cache_key(cache, scene_dir, input_text, model, payload) if cache is not None else None
+    if key is not None:
+        cached = cache.get("gpt", key)
+        if cached is not None:
+            return cached
 
     output_path = os.path.join(scene_dir, "gpt_rating.json")
+    params = rating_params(scene_dir, input_text, model, payload)
 
-    if not os.path.exists(output_path):
-        result = call_gpt4v(image_paths, input_text)
+    result_dict = load_scene_rating(output_path, params)
+    if result_dict is None:
+        result = call_gpt4v(image_paths, input_text, model, client=client, payload=payload)
         result_dict = json_str_to_dict(result)
+        if result_dict is not None:
+            save_scene_rating(output_path, params, result_dict)
+    if key is not None and result_dict is not None:
+        cache.put("gpt", key, result_dict)
     return result_dict
 
 
@@ -0,0 +1,241 @@
+import os
+import time
+import random
+import asyncio
+import argparse
+import traceback
+import numpy as np
+from tqdm import tqdm
+from openai import AsyncOpenAI, APIConnectionError, APIStatusError
+import gpt_rating
+from image_payload import ImagePayloads
+from metric_cache import MetricCache
+
+
+# rate limited, request timeout / conflict and transient server errors
+RETRY_STATUSES = (408, 409, 429, 500, 502, 503, 504)
+
+
+class UnparsableRating(ValueError):
+    pass
+
+
+class TokenBucket:
+    """
+    Rate limiter refilled with `rate` tokens per second up to `capacity`.
+    acquire() waits for a token; waiters are served in arrival order.
+    """
+
+    def __init__(self, rate, capacity=1.0):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self, tokens=1.0):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self.tokens) / self.rate)
+
+
+def is_retryable(error):
+    if isinstance(error, (APIConnectionError, UnparsableRating)):
+        return True
+    return isinstance(error, APIStatusError) and error.status_code in RETRY_STATUSES
+
+
+def retry_delay(error, attempt, base_delay=1.0, max_delay=60.0):
+    """The server's Retry-After if it sent one, else full-jitter exponential backoff."""
+    response = getattr(error, "response", None)
+    if response is not None:
+        try:
+            return min(float(response.headers.get("retry-after")), max_delay)
+        except (TypeError, ValueError):
+            pass
+    return random.uniform(0.0, min(max_delay, base_delay * 2 ** attempt))
+
+
+class RatingRunner:
+    """
+    Rates scenes concurrently on one AsyncOpenAI client: at most `concurrency`
+    requests in flight, started no faster than `requests_per_minute`, and
+    retried with backoff on rate limits, connection / server errors and
+    unparsable answers. Every rating is written to <scene_dir>/gpt_rating.json
+    as soon as it arrives, with the views, prompt, model and image settings
+    it was made from, so an interrupted run resumes where it stopped while a
+    change of any of them re-rates the scene.
+    Views are sent preprocessed by `payload` (an ImagePayloads) when given.
+    """
+
+    def __init__(self, client, model=gpt_rating.GPT_MODEL, concurrency=8, requests_per_minute=60, burst=1,
+                 max_retries=5, base_delay=1.0, max_delay=60.0, max_tokens=2000, cache=None, overwrite=False, payload=None):
+        self.client = client
+        self.model = model
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.bucket = TokenBucket(requests_per_minute / 60.0, burst)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_tokens = max_tokens
+        self.cache = cache
+        self.overwrite = overwrite
+        self.payload = payload
+        self.requests = 0
+        self.retries = 0
+
+    async def request(self, messages):
+        self.requests += 1
+        response = await self.client.chat.completions.create(model=self.model, messages=messages, max_tokens=self.max_tokens)
+        rating = gpt_rating.json_str_to_dict(response.choices[0].message.content or "")
+        if rating is None:
+            raise UnparsableRating("Unparsable rating response")
+        return rating
+
+    async def request_with_retries(self, image_paths, input_text):
+        # images are encoded inside the concurrency slot, bounding the payloads held in memory
+        messages = await asyncio.to_thread(gpt_rating.build_messages, image_paths, input_text, self.payload)
+        attempt = 0
+        while True:
+            await self.bucket.acquire()
+            try:
+                return await self.request(messages)
+            except Exception as error:
+                if attempt >= self.max_retries or not is_retryable(error):
+                    raise
+                self.retries += 1
+                await asyncio.sleep(retry_delay(error, attempt, self.base_delay, self.max_delay))
+                attempt += 1
+
+    async def rate(self, scene_dir, input_text, key=None):
+        output_path = os.path.join(scene_dir, "gpt_rating.json")
+        params = gpt_rating.rating_params(scene_dir, input_text, self.model, self.payload)
+        rating = None if self.overwrite else gpt_rating.load_scene_rating(output_path, params)
+        if rating is None:
+            image_paths = [os.path.join(scene_dir, view) for view in gpt_rating.VIEW_FILES]
+            async with self.semaphore:
+                rating = await self.request_with_retries(image_paths, input_text)
+            gpt_rating.save_scene_rating(output_path, params, rating)
+        if self.cache is not None and key is not None:
+            self.cache.put("gpt", key, rating)
+        return rating
+
+    async def rate_all(self, jobs):
+        """Rating or raised exception for each (scene_dir, input_text, cache key) job, in order."""
+        progress = tqdm(total=len(jobs), desc="gpt")
+
+        async def run(job):
+            try:
+                return await self.rate(*job)
+            except Exception as error:
+                return error
+            finally:
+                progress.update()
+
+        results = await asyncio.gather(*(run(job) for job in jobs))
+        progress.close()
+        return results
+
+
+def rate_scenes(jobs, model=gpt_rating.GPT_MODEL, base_url=None, api_key=None, timeout=120.0, **options):
+    """
+    Synchronous entry point: runs a RatingRunner (see there for `options`)
+    over the jobs and returns its results and request / retry counts.
+    """
+    async def main():
+        # retries are handled by the runner, so they share its rate limit
+        async with AsyncOpenAI(**gpt_rating.client_settings(base_url, api_key), max_retries=0, timeout=timeout) as client:
+            runner = RatingRunner(client, model, **options)
+            results = await runner.rate_all(jobs)
+            if runner.payload is not None:
+                runner.payload.flush()
+            return results, {"requests": runner.requests, "retries": runner.retries}
+
+    return asyncio.run(main())
+
+
+def payload_report(jobs, payload):
+    """
+    Mean request body size and message build time per (scene_dir, input_text,
+    key) job, with the original image encoding and with `payload`, plus a
+    second pass served from its cache when it has a cache_dir.
+    """
+    runs = [("original", None), ("preprocessed", payload)] + ([("cached", payload)] if payload.cache_dir else [])
+    report = {}
+    for name, run_payload in runs:
+        start = time.perf_counter()
+        sizes = [
+            gpt_rating.request_bytes(gpt_rating.build_messages(
+                [os.path.join(scene_dir, view) for view in gpt_rating.VIEW_FILES], input_text, run_payload
+            ))
+            for scene_dir, input_text, _ in jobs
+        ]
+        report[name] = {"bytes_per_request": float(np.mean(sizes)), "ms_per_request": 1000 * (time.perf_counter() - start) / len(jobs)}
+        print(f"{name}: {report[name]['bytes_per_request'] / 1024:.1f} KiB/request, {report[name]['ms_per_request']:.1f} ms/request to build")
+    payload.flush()
+    print(f"{payload.params()}: {report['original']['bytes_per_request'] / report['preprocessed']['bytes_per_request']:.2f}x smaller requests")
+    return report
+
+
+def format_error(error):
+    return "".join(traceback.format_exception(type(error), error, error.__traceback__))
+
+
+def find_scene_dirs(root):
+    """Folders below `root` holding all rendered views."""
+    scene_dirs = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        if all(view in filenames for view in gpt_rating.VIEW_FILES):
+            scene_dirs.append(dirpath)
+    return scene_dirs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rate rendered scenes with GPT, concurrently and rate limited")
+    parser.add_argument("--root", type=str, default="infer_res", help="Rate every <model>/<room>/<id> scene with rendered views below this folder")
+    parser.add_argument("--prompt_root", type=str, default="infer_res/prompt")
+    parser.add_argument("--model", type=str, default=gpt_rating.GPT_MODEL)
+    parser.add_argument("--base_url", type=str, default=None, help="OpenAI-compatible endpoint, default OPENAI_BASE_URL")
+    parser.add_argument("--concurrency", type=int, default=8, help="Requests in flight")
+    parser.add_argument("--rpm", type=float, default=60.0, help="Requests started per minute")
+    parser.add_argument("--burst", type=float, default=1.0, help="Requests that may start back to back")
+    parser.add_argument("--max_retries", type=int, default=5)
+    parser.add_argument("--overwrite", action="store_true", help="Re-rate scenes even if gpt_rating.json matches the current settings")
+    parser.add_argument("--cache_dir", type=str, default=None, help="Metric result cache shared with evaluate.py")
+    parser.add_argument("--image_size", type=int, default=384, help="Longest side of each sent view in pixels, 0 keeps the render size")
+    parser.add_argument("--image_quality", type=int, default=75, help="JPEG quality of the sent views")
+    parser.add_argument("--tile", action="store_true", help="Send the four views tiled 2x2 into one image")
+    parser.add_argument("--detail", type=str, default=None, choices=["low", "high", "auto"], help="image_url detail level")
+    parser.add_argument("--payload_cache", type=str, default=None, help="Directory caching the encoded views")
+    parser.add_argument("--payload_report", type=int, default=0, metavar="N", help="Report bytes per request before / after preprocessing on N scenes, then exit")
+    args = parser.parse_args()
+
+    payload = ImagePayloads(args.image_size, args.image_quality, args.tile, args.detail, args.payload_cache)
+    cache = MetricCache(args.cache_dir) if args.cache_dir else None
+    jobs = []
+    for scene_dir in find_scene_dirs(args.root):
+        input_text = gpt_rating.scene_input_text(scene_dir, os.path.basename(scene_dir), args.prompt_root)
+        key = gpt_rating.cache_key(cache, scene_dir, input_text, args.model, payload) if cache is not None else None
+        jobs.append((scene_dir, input_text, key))
+    if args.payload_report:
+        payload_report(jobs[:args.payload_report], payload)
+        raise SystemExit
+    start = time.perf_counter()
+    results, stats = rate_scenes(
+        jobs, args.model, args.base_url, concurrency=args.concurrency, requests_per_minute=args.rpm, burst=args.burst,
+        max_retries=args.max_retries, cache=cache, overwrite=args.overwrite, payload=payload
+    )
+    if cache is not None:
+        cache.flush()
+    failures = [(job[0], result) for job, result in zip(jobs, results) if isinstance(result, Exception)]
+    for scene_dir, error in failures:
+        print(f"{scene_dir}: {error!r}")
+    print(f"Rated {len(jobs) - len(failures)}/{len(jobs)} scenes with {stats['requests']} requests "
+          f"({stats['retries']} retries) in {time.perf_counter() - start:.1f}s")
@@ -0,0 +1,109 @@
+import os
+import base64
+import hashlib
+import json
+import threading
+from io import BytesIO
+from PIL import Image
+from metric_cache import FileHashIndex
+
+
+# bump when the encoding changes, invalidating cached payloads
+PAYLOAD_VERSION = 1
+
+
+def load_rgb(image_path):
+    with Image.open(image_path) as image:
+        return image.convert("RGB")
+
+
+def downsize(image, max_size):
+    """Image scaled so its longest side is at most `max_size` pixels."""
+    if max_size and max(image.size) > max_size:
+        scale = max_size / max(image.size)
+        image = image.resize((max(1, round(image.width * scale)), max(1, round(image.height * scale))), Image.LANCZOS)
+    return image
+
+
+def tile_images(images):
+    """Up to four images on a 2x2 grid (row-major), cells sized to the largest image."""
+    width, height = max(image.width for image in images), max(image.height for image in images)
+    tiled = Image.new("RGB", (2 * width, 2 * height), (255, 255, 255))
+    for i, image in enumerate(images):
+        tiled.paste(image, ((i % 2) * width, (i // 2) * height))
+    return tiled
+
+
+def jpeg_base64(image, quality):
+    buffered = BytesIO()
+    image.save(buffered, format="JPEG", quality=quality, optimize=True)
+    return base64.b64encode(buffered.getvalue()).decode("utf-8")
+
+
+class ImagePayloads:
+    """
+    Base64 JPEG payloads of the rendered views sent with a rating request:
+    each view downsized to at most `max_size` pixels and compressed at
+    `quality`, or, with `tile`, all views in one 2x2 image. `detail` is passed
+    on as the image_url detail level when set.
+
+    With `cache_dir`, payloads are stored as <cache_dir>/<key[:2]>/<key>.b64,
+    keyed by the content hash of the source views and the settings, so a view
+    is only decoded and re-encoded once across runs; call flush() to persist
+    the file digests.
+    """
+
+    def __init__(self, max_size=384, quality=75, tile=False, detail=None, cache_dir=None):
+        self.max_size = max_size
+        self.quality = quality
+        self.tile = tile
+        self.detail = detail
+        self.cache_dir = cache_dir
+        self.hashes = FileHashIndex(os.path.join(cache_dir, "file_hashes.json")) if cache_dir else None
+
+    def params(self):
+        return {"max_size": self.max_size, "quality": self.quality, "tile": self.tile, "detail": self.detail}
+
+    def key(self, image_paths):
+        raw = f"{PAYLOAD_VERSION}|{json.dumps(self.params(), sort_keys=True)}"
+        raw += "".join(f"|{self.hashes.file_hash(path)}" for path in image_paths)
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + ".b64")
+
+    def encode_uncached(self, image_paths):
+        images = [downsize(load_rgb(path), self.max_size) for path in image_paths]
+        if self.tile:
+            images = [tile_images(images)]
+        return [jpeg_base64(image, self.quality) for image in images]
+
+    def encode(self, image_paths):
+        """Base64 JPEGs for one request: one per view, or a single tiled image."""
+        if not self.cache_dir:
+            return self.encode_uncached(image_paths)
+        path = self.path(self.key(image_paths))
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                return f.read().split("\n")
+        payloads = self.encode_uncached(image_paths)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write("\n".join(payloads))
+        os.replace(tmp_path, path)
+        return payloads
+
+    def flush(self):
+        if self.hashes is not None:
+            self.hashes.flush()
+
+    def image_parts(self, image_paths):
+        """image_url message parts for the views."""
+        parts = []
+        for payload in self.encode(image_paths):
+            image_url = {"url": f"data:image/jpeg;base64,{payload}"}
+            if self.detail:
+                image_url["detail"] = self.detail
+            parts.append({"type": "image_url", "image_url": image_url})
+        return parts
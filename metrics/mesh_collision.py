@@ -0,0 +1,202 @@
+import os
+import sys
+import hashlib
+import numpy as np
+from pxr import Usd, UsdGeom
+
+# metrics scripts run with metrics/ as their path root; the shared USD helpers live in the repo-level utils package
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from utils.usd_geometry import gf_matrix_to_numpy, transform_points, triangulate_faces, get_asset_reference
+
+
+MESH_CACHE_VERSION = 2
+# occupancy samples used to estimate the enclosed volume of one asset
+VOLUME_SAMPLES = 1 << 18
+# upper bound on occupancy samples spent on one candidate pair
+PAIR_SAMPLES = 1 << 18
+
+
+def read_asset_mesh(asset_path):
+    """
+    Triangles of every visible default-purpose mesh of a .usdz asset, in the
+    space of its default prim, i.e. the local space of a prim referencing it.
+    """
+    stage = Usd.Stage.Open(asset_path)
+    if not stage:
+        raise ValueError(f"Cannot open asset: {asset_path}")
+    root = stage.GetDefaultPrim() or stage.GetPseudoRoot()
+    xform_cache = UsdGeom.XformCache()
+    to_root = np.linalg.inv(gf_matrix_to_numpy(xform_cache.GetLocalToWorldTransform(root))) if root.IsA(UsdGeom.Xformable) else np.eye(4)
+
+    all_vertices, all_triangles, offset = [], [], 0
+    for prim in Usd.PrimRange(root):
+        if not prim.IsA(UsdGeom.Mesh):
+            continue
+        imageable = UsdGeom.Imageable(prim)
+        if imageable.ComputeVisibility() == UsdGeom.Tokens.invisible or imageable.ComputePurpose() not in (UsdGeom.Tokens.default_, UsdGeom.Tokens.render):
+            continue
+        mesh = UsdGeom.Mesh(prim)
+        points = mesh.GetPointsAttr().Get()
+        counts = mesh.GetFaceVertexCountsAttr().Get()
+        indices = mesh.GetFaceVertexIndicesAttr().Get()
+        if not points or not counts or not indices:
+            continue
+        matrix = gf_matrix_to_numpy(xform_cache.GetLocalToWorldTransform(prim)) @ to_root
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        all_vertices.append(transform_points(points, matrix))
+        all_triangles.append(triangulate_faces(counts, indices) + offset)
+        offset += len(points)
+    if not all_vertices:
+        return np.zeros((0, 3)), np.zeros((0, 3), dtype=np.int64)
+    return np.concatenate(all_vertices), np.concatenate(all_triangles)
+
+
+def grid_points(lower, upper, num_samples):
+    """
+    Centers of a regular grid of about `num_samples` cubic-ish cells covering
+    [lower, upper], and the volume of one cell.
+    """
+    extent = np.maximum(upper - lower, 1e-9)
+    cell = np.cbrt(np.prod(extent) / num_samples)
+    counts = np.maximum(np.ceil(extent / cell), 1).astype(np.int64)
+    step = extent / counts
+    axes = [lower[k] + (np.arange(counts[k]) + 0.5) * step[k] for k in range(3)]
+    points = np.stack(np.meshgrid(*axes, indexing="ij"), axis=-1).reshape(-1, 3)
+    return points, float(np.prod(step))
+
+
+def is_watertight(vertices, triangles, decimals=4):
+    """
+    Whether the triangles form closed surfaces: with coincident vertices welded
+    (split UV / normal seams), every edge is shared by an even number of
+    triangles (two, or four where closed parts touch along it).
+    """
+    if len(triangles) == 0:
+        return False
+    _, weld = np.unique(np.round(np.asarray(vertices, dtype=np.float64), decimals), axis=0, return_inverse=True)
+    triangles = weld.reshape(-1)[np.asarray(triangles, dtype=np.int64)]
+    triangles = triangles[(triangles[:, 0] != triangles[:, 1]) & (triangles[:, 1] != triangles[:, 2]) & (triangles[:, 2] != triangles[:, 0])]
+    edges = np.sort(triangles[:, [[0, 1], [1, 2], [2, 0]]].reshape(-1, 2), axis=1)
+    _, counts = np.unique(edges, axis=0, return_counts=True)
+    return len(counts) > 0 and bool(np.all(counts % 2 == 0))
+
+
+class AssetMesh:
+    """
+    One asset's triangles in local space with an Open3D BVH over them. Placed
+    objects share it and are queried through the inverse of their transform.
+    The inside test of an open mesh is meaningless (its volume comes out near
+    zero), so a mesh that is not watertight stands in as its local AABB.
+    """
+
+    def __init__(self, vertices, triangles, volume=None, watertight=None):
+        self.vertices = np.asarray(vertices, dtype=np.float32)
+        self.triangles = np.asarray(triangles, dtype=np.uint32)
+        self.aabb_min = self.vertices.min(axis=0).astype(np.float64) if len(self.vertices) else np.zeros(3)
+        self.aabb_max = self.vertices.max(axis=0).astype(np.float64) if len(self.vertices) else np.zeros(3)
+        self.watertight = is_watertight(self.vertices, self.triangles) if watertight is None else bool(watertight)
+        self.scene = None
+        if len(self.triangles) and self.watertight:
+            import open3d as o3d
+            self.scene = o3d.t.geometry.RaycastingScene()
+            self.scene.add_triangles(o3d.core.Tensor(self.vertices), o3d.core.Tensor(self.triangles))
+        self.volume = self.compute_volume() if volume is None else float(volume)
+
+    def occupancy(self, local_points):
+        """Boolean inside test of (N, 3) local-space points."""
+        if len(self.triangles) == 0 or len(local_points) == 0:
+            return np.zeros(len(local_points), dtype=bool)
+        if self.scene is None:
+            return np.all((local_points >= self.aabb_min) & (local_points <= self.aabb_max), axis=1)
+        import open3d as o3d
+        result = self.scene.compute_occupancy(o3d.core.Tensor(np.ascontiguousarray(local_points, dtype=np.float32)))
+        return result.numpy() > 0.5
+
+    def compute_volume(self):
+        if len(self.triangles) == 0:
+            return 0.0
+        if self.scene is None:
+            return float(np.prod(self.aabb_max - self.aabb_min))
+        points, cell_volume = grid_points(self.aabb_min, self.aabb_max, VOLUME_SAMPLES)
+        return float(self.occupancy(points).sum()) * cell_volume
+
+
+class AssetMeshCache:
+    """
+    Asset meshes stored on disk as <cache_dir>/<key[:2]>/<key>.npz (local
+    vertices, triangles, enclosed volume and watertightness), keyed by the asset path and its
+    modification time and size. BVHs are rebuilt from the cached arrays once per
+    process, which is much cheaper than re-reading the usdz.
+    """
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir
+        self.memory = {}
+
+    def key(self, asset_path):
+        stat = os.stat(asset_path)
+        raw = f"{MESH_CACHE_VERSION}|{os.path.realpath(asset_path)}|{stat.st_mtime_ns}|{stat.st_size}|{VOLUME_SAMPLES}"
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+    def get(self, asset_path):
+        key = self.key(asset_path)
+        if key in self.memory:
+            return self.memory[key]
+        file_path = os.path.join(self.cache_dir, key[:2], key + '.npz') if self.cache_dir else None
+        if file_path and os.path.exists(file_path):
+            with np.load(file_path) as data:
+                mesh = AssetMesh(data["vertices"], data["triangles"], data["volume"], data["watertight"])
+        else:
+            mesh = AssetMesh(*read_asset_mesh(asset_path))
+            if file_path:
+                os.makedirs(os.path.dirname(file_path), exist_ok=True)
+                tmp_path = f"{file_path}.{os.getpid()}.tmp.npz"
+                np.savez(tmp_path, vertices=mesh.vertices, triangles=mesh.triangles, volume=mesh.volume, watertight=mesh.watertight)
+                os.replace(tmp_path, file_path)
+        if len(mesh.triangles) and not mesh.watertight:
+            print(f"Warning: {asset_path} is not watertight, using its bounding box for mesh collisions")
+        self.memory[key] = mesh
+        return mesh
+
+
+def world_aabb(mesh, matrix):
+    """AABB of the eight transformed corners of a mesh's local AABB, as a (2, 3) array."""
+    corners = np.array([[x, y, z] for x in (mesh.aabb_min[0], mesh.aabb_max[0])
+                        for y in (mesh.aabb_min[1], mesh.aabb_max[1])
+                        for z in (mesh.aabb_min[2], mesh.aabb_max[2])])
+    corners = corners @ matrix[:3, :3] + matrix[3, :3]
+    return np.stack([corners.min(axis=0), corners.max(axis=0)])
+
+
+def to_local(points, matrix):
+    return (points - matrix[3, :3]) @ np.linalg.inv(matrix[:3, :3])
+
+
+def mesh_intersection_volume(mesh_a, matrix_a, mesh_b, matrix_b, lower, upper, max_samples=PAIR_SAMPLES):
+    """
+    Volume inside both placed meshes, estimated on a grid over the overlap
+    [lower, upper] of their world AABBs. Points outside the first mesh are
+    never tested against the second.
+    """
+    points, cell_volume = grid_points(lower, upper, max_samples)
+    inside = mesh_a.occupancy(to_local(points, matrix_a))
+    if not inside.any():
+        return 0.0
+    inside[inside] = mesh_b.occupancy(to_local(points[inside], matrix_b))
+    return float(inside.sum()) * cell_volume
+
+
+def mesh_collision_volumes(meshes, matrices, pairs, max_samples=PAIR_SAMPLES):
+    """
+    Mesh-mesh intersection volume of every candidate pair (i, j). Pairs whose
+    transformed mesh bounds do not overlap are skipped without any occupancy query.
+    """
+    bounds = [world_aabb(mesh, matrix) for mesh, matrix in zip(meshes, matrices)]
+    volumes = np.zeros(len(pairs[0]))
+    for k, (i, j) in enumerate(zip(*pairs)):
+        lower = np.maximum(bounds[i][0], bounds[j][0])
+        upper = np.minimum(bounds[i][1], bounds[j][1])
+        if np.any(upper <= lower):
+            continue
+        volumes[k] = mesh_intersection_volume(meshes[i], matrices[i], meshes[j], matrices[j], lower, upper, max_samples)
+    return volumes
@@ -0,0 +1,100 @@
+import os
+import json
+import hashlib
+
+
+def file_content_hash(file_path, chunk_size=1 << 20):
+    digest = hashlib.sha1()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def write_json_atomic(data, file_path):
+    os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+    tmp_path = f"{file_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(json.dumps(data, indent=4))
+    os.replace(tmp_path, file_path)
+
+
+class FileHashIndex:
+    """
+    Content digests of files, remembered in a JSON index by real path,
+    modification time and size so unchanged files are not re-read on every
+    run; call flush() to persist new digests.
+    """
+
+    def __init__(self, index_path):
+        self.index_path = index_path
+        self.file_hashes = {}
+        self.dirty = False
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, "r") as f:
+                    self.file_hashes = json.load(f)
+            except (OSError, ValueError):
+                self.file_hashes = {}
+
+    def file_hash(self, file_path):
+        real_path = os.path.realpath(file_path)
+        stat = os.stat(real_path)
+        known = self.file_hashes.get(real_path)
+        if known is not None and known[:2] == [stat.st_mtime_ns, stat.st_size]:
+            return known[2]
+        digest = file_content_hash(real_path)
+        self.file_hashes[real_path] = [stat.st_mtime_ns, stat.st_size, digest]
+        self.dirty = True
+        return digest
+
+    def flush(self):
+        if self.dirty:
+            write_json_atomic(self.file_hashes, self.index_path)
+            self.dirty = False
+
+
+class MetricCache:
+    """
+    Metric results stored as <cache_dir>/<metric>/<key[:2]>/<key>.json. A key
+    hashes the metric name and version, the content of every input file and any
+    extra parameters (prompt text, model, method), so a result is reused
+    whenever the same inputs are scored again, wherever the scene lives.
+
+    File digests are remembered in <cache_dir>/file_hashes.json (see
+    FileHashIndex); call flush() to persist them.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.hashes = FileHashIndex(os.path.join(cache_dir, "file_hashes.json"))
+
+    def file_hash(self, file_path):
+        return self.hashes.file_hash(file_path)
+
+    def key(self, metric, version, files=(), params=None):
+        digest = hashlib.sha1(f"{metric}|{version}".encode())
+        for file_path in files:
+            digest.update(f"|{os.path.basename(file_path)}:{self.file_hash(file_path)}".encode())
+        digest.update(("|" + json.dumps(params or {}, sort_keys=True)).encode())
+        return digest.hexdigest()
+
+    def path(self, metric, key):
+        return os.path.join(self.cache_dir, metric, key[:2], key + ".json")
+
+    def get(self, metric, key):
+        """The stored result, or None if it is missing or unreadable."""
+        path = self.path(metric, key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, metric, key, value):
+        write_json_atomic(value, self.path(metric, key))
+
+    def flush(self):
+        self.hashes.flush()
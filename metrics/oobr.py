@@ -1,14 +1,61 @@
 import pxr
 import os
+import time
+import numpy as np
 from pxr import Usd, UsdGeom, Gf
 import argparse
+from box_overlap import (
+    SWEEP_MIN_OBJECTS, bbox_volumes, outside_mask, pair_intersection_volumes, intersection_volume_matrix,
+    sweep_and_prune_pairs, total_intersection_volume
+)
+from metric_cache import MetricCache
 
-def get_bbox(prim):
-    bbox_cache = UsdGeom.BBoxCache(Usd.TimeCode.Default(), ["default"])
-    bbox = bbox_cache.ComputeWorldBound(prim)
+
+OBJECT_PREDICATE = Usd.PrimIsActive & Usd.PrimIsDefined & ~Usd.PrimIsAbstract
+# bump when a change alters OOB / OOR values, invalidating cached results
+OOBR_VERSION = 1
+SCENE_FILES = ("object.usda", "floor.usda")
+
+
+def new_bbox_cache():
+    # extentsHint is read by get_extents_hint: BBoxCache only honours it on a valid model hierarchy
+    return UsdGeom.BBoxCache(Usd.TimeCode.Default(), ["default"])
+
+
+def get_extents_hint(prim):
+    """Authored default-purpose extentsHint of `prim` as a Gf.Range3d, or None."""
+    attr = UsdGeom.ModelAPI(prim).GetExtentsHintAttr()
+    hint = attr.Get() if attr and attr.HasAuthoredValue() else None
+    if hint is None or len(hint) < 2:
+        return None
+    return Gf.Range3d(Gf.Vec3d(hint[0]), Gf.Vec3d(hint[1]))
+
+
+def get_bbox(prim, bbox_cache=None, xform_cache=None):
+    """
+    World AABB of `prim`. An authored extentsHint is transformed directly, so
+    the asset's meshes are never traversed; otherwise the bound is computed
+    by `bbox_cache`. Pass one bbox_cache / xform_cache per stage to share work
+    across objects.
+    """
+    hint = get_extents_hint(prim)
+    if hint is not None:
+        xform_cache = xform_cache or UsdGeom.XformCache()
+        bbox = Gf.BBox3d(hint, xform_cache.GetLocalToWorldTransform(prim))
+    else:
+        bbox_cache = bbox_cache or new_bbox_cache()
+        bbox = bbox_cache.ComputeWorldBound(prim)
     range_box = bbox.ComputeAlignedBox()
     return (range_box.min, range_box.max)
 
+
+def open_objects_stage(objects_file):
+    """Open the objects stage and find its placed usdz objects."""
+    stage = Usd.Stage.Open(objects_file)
+    if not stage:
+        return stage, []
+    return stage, get_usdz_objects(stage)
+
 def is_outside(bbox, floor_bounds, margin=5.0):
     b_min, b_max = bbox
     x_min, x_max, y_min, y_max, floor_z = floor_bounds
@@ -58,21 +105,60 @@ def calculate_intersection_volume(bbox1, bbox2):
                          (intersect_max[2] - intersect_min[2])
     return max(intersection_volume, 0.0)
 
+def stack_bboxes(bboxes):
+    """(min, max) pairs -> (N, 2, 3) float64 array."""
+    return np.array([[tuple(b_min), tuple(b_max)] for b_min, b_max in bboxes], dtype=np.float64).reshape(-1, 2, 3)
+
+
+def mesh_overlap(usdz_objects, xform_cache, mesh_cache=None):
+    """
+    Exact-mode OOR terms: summed mesh-mesh intersection volume and summed
+    enclosed mesh volume. Candidate pairs come from sweep and prune over the
+    transformed mesh bounds, so only overlapping AABBs pay for occupancy queries.
+    """
+    from mesh_collision import AssetMeshCache, get_asset_reference, world_aabb, mesh_collision_volumes
+
+    mesh_cache = mesh_cache or AssetMeshCache()
+    meshes, matrices = [], []
+    for prim in usdz_objects:
+        asset_path = get_asset_reference(prim)
+        if asset_path is None or not os.path.exists(asset_path):
+            raise ValueError(f"Cannot resolve the usdz asset of {prim.GetPath()}")
+        meshes.append(mesh_cache.get(asset_path))
+        matrices.append(np.array(xform_cache.GetLocalToWorldTransform(prim), dtype=np.float64).reshape(4, 4))
+    boxes = np.stack([world_aabb(mesh, matrix) for mesh, matrix in zip(meshes, matrices)])
+    i, j = sweep_and_prune_pairs(boxes)
+    keep = pair_intersection_volumes(boxes[i], boxes[j]) > 0
+    volumes = mesh_collision_volumes(meshes, matrices, (i[keep], j[keep]))
+    return float(volumes.sum()), float(sum(mesh.volume for mesh in meshes))
+
+
 def get_usdz_objects(stage):
+    """
+    Prims placing a .usdz asset. Unloaded prims are visited too, and the
+    inside of an asset is not traversed.
+    """
     usdz_objects = []
     
-    for prim in stage.Traverse():
+    prim_range = iter(Usd.PrimRange(stage.GetPseudoRoot(), OBJECT_PREDICATE))
+    for prim in prim_range:
         refs = prim.GetMetadata('references')
         if refs:
             for ref in refs.GetAddedOrExplicitItems():
                 if str(ref.assetPath).endswith('.usdz'):
                     usdz_objects.append(prim)
+                    prim_range.PruneChildren()
                     break
     
     return usdz_objects
 
-def analyze_usd_files(objects_file, floor_file):
-    objects_stage = Usd.Stage.Open(objects_file)
+def analyze_usd_files(objects_file, floor_file, method="auto", mesh_cache=None):
+    """
+    OOB and OOR ratios of a scene. With method="mesh", OOR is the summed
+    mesh-mesh intersection volume over the summed mesh volume instead of the
+    AABB ratio; `mesh_cache` (an AssetMeshCache) shares asset meshes across scenes.
+    """
+    objects_stage, usdz_objects = open_objects_stage(objects_file)
     floor_stage = Usd.Stage.Open(floor_file)
     
     if not objects_stage:
@@ -80,18 +166,16 @@ def analyze_usd_files(objects_file, floor_file):
     if not floor_stage:
         raise ValueError(f"Cannot open floor file: {floor_file}")
     
-    usdz_objects = get_usdz_objects(objects_stage)
     total_objects = len(usdz_objects)
     
     if total_objects == 0:
         print("Warning: No usdz objects found")
-        return 0, 0, 0.0
+        return 0.0, 0.0
     
-    object_bboxes = [get_bbox(prim) for prim in usdz_objects]
-    
-    total_bbox_volume = 0.0
-    for bbox in object_bboxes:
-        total_bbox_volume += calculate_bbox_volume(bbox)
+    bbox_cache, xform_cache = new_bbox_cache(), UsdGeom.XformCache()
+    boxes = stack_bboxes(get_bbox(prim, bbox_cache, xform_cache) for prim in usdz_objects)
+    volumes = bbox_volumes(boxes)
+    total_bbox_volume = float(np.cumsum(volumes)[-1])
     
     floor_prim = None
     for prim in floor_stage.Traverse():
@@ -112,41 +196,66 @@ def analyze_usd_files(objects_file, floor_file):
     if not points_attr:
         raise ValueError("Floor prim has no points attribute")
     
-    points = points_attr.Get()
-    x_coords = [p[0] for p in points]
-    y_coords = [p[2] for p in points]
-    z_coords = [p[1] for p in points]
-    
-    x_min, x_max = min(x_coords), max(x_coords)
-    y_min, y_max = min(y_coords), max(y_coords)
-    floor_z = max(z_coords)
+    points = np.array(points_attr.Get(), dtype=np.float64).reshape(-1, 3)
+    x_min, x_max = float(points[:, 0].min()), float(points[:, 0].max())
+    y_min, y_max = float(points[:, 2].min()), float(points[:, 2].max())
+    floor_z = float(points[:, 1].max())
     floor_bounds = (x_min, x_max, y_min, y_max, floor_z)
     
-    oob_count = 0
-    for bbox in object_bboxes:
-        if is_outside(bbox, floor_bounds):
-            oob_count += 1
-    
-    total_intersection_volume = 0.0
-    for i in range(total_objects):
-        for j in range(i + 1, total_objects):
-            intersection_vol = calculate_intersection_volume(object_bboxes[i], object_bboxes[j])
-            total_intersection_volume += intersection_vol
+    oob_count = int(outside_mask(boxes, floor_bounds).sum())
+    if method == "mesh":
+        intersection_volume, total_volume = mesh_overlap(usdz_objects, xform_cache, mesh_cache)
+    else:
+        intersection_volume, total_volume = total_intersection_volume(boxes, method), total_bbox_volume
     
     oor_ratio = 0.0
-    if total_bbox_volume > 1e-9:
-        oor_ratio = total_intersection_volume / total_bbox_volume
+    if total_volume > 1e-9:
+        oor_ratio = intersection_volume / total_volume
     
     return oob_count/total_objects, oor_ratio
 
+def cache_key(cache, scene_dir, method="auto"):
+    """MetricCache key of a scene's OOB / OOR: object.usda, floor.usda and the method."""
+    return cache.key("oobr", OOBR_VERSION, [os.path.join(scene_dir, f) for f in SCENE_FILES], {"method": method})
+
+
+def score_scene(scene_dir, method="auto", cache=None, mesh_cache=None):
+    """{"oob", "oor"} of a scene folder, reused from / stored in `cache` (a MetricCache) when given."""
+    key = cache_key(cache, scene_dir, method) if cache is not None else None
+    if key is not None:
+        cached = cache.get("oobr", key)
+        if cached is not None:
+            return cached
+    oob, oor = analyze_usd_files(
+        os.path.join(scene_dir, SCENE_FILES[0]), os.path.join(scene_dir, SCENE_FILES[1]), method, mesh_cache
+    )
+    result = {"oob": float(oob), "oor": float(oor)}
+    if key is not None:
+        cache.put("oobr", key, result)
+        cache.flush()
+    return result
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Check USD object BBOX: OOB count & OOR volume ratio")
     parser.add_argument("--scene_dir", type=str, default="infer_res/sft_FRONT3d_1.7b/balcony/2", help="Path to scene directory (contains object.usda and floor.usda)")
+    parser.add_argument("--method", type=str, default="auto", choices=["auto", "matrix", "sweep", "mesh"], help="Pairwise overlap strategy: full broadcast matrix or sweep and prune (auto switches at %d objects), or exact mesh-mesh intersection" % SWEEP_MIN_OBJECTS)
+    parser.add_argument("--mesh_cache", type=str, default=None, help="Directory caching asset meshes for --method mesh")
+    parser.add_argument("--cache_dir", type=str, default=None, help="Metric result cache shared with evaluate.py")
     args = parser.parse_args()
 
-    object_path = os.path.join(args.scene_dir, "object.usda")
-    floor_path = os.path.join(args.scene_dir, "floor.usda")
-    oob_ratio, oor_ratio = analyze_usd_files(object_path, floor_path)
+    start = time.perf_counter()
+    mesh_cache = None
+    if args.method == "mesh":
+        from mesh_collision import AssetMeshCache
+        mesh_cache = AssetMeshCache(args.mesh_cache)
+    cache = MetricCache(args.cache_dir) if args.cache_dir else None
+    result = score_scene(args.scene_dir, args.method, cache, mesh_cache)
+    oob_ratio, oor_ratio = result["oob"], result["oor"]
+    print(f"Scored in {time.perf_counter() - start:.3f}s")
     
     print(f"OOB ratio (outside floor or below floor): {oob_ratio:.4f}")
-    print(f"OOR ratio (intersection volume / total BBOX volume): {oor_ratio:.4f}")
+    if args.method == "mesh":
+        print(f"OOR ratio (mesh intersection volume / total mesh volume): {oor_ratio:.4f}")
+    else:
+        print(f"OOR ratio (intersection volume / total BBOX volume): {oor_ratio:.4f}")
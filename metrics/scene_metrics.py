@@ -0,0 +1,267 @@
+import os
+import json
+import time
+import argparse
+import numpy as np
+from box_overlap import bbox_volumes, total_intersection_volume
+
+
+# scene.json floors are quads written as these two triangles (see llm_design.create_floor)
+FLOOR_FACES = np.array([[0, 1, 2], [1, 3, 2]])
+# the 12 edges of a box whose 8 corners are ordered as in box_corners
+BOX_EDGES = np.array([[0, 1], [2, 3], [4, 5], [6, 7], [0, 2], [1, 3], [4, 6], [5, 7], [0, 4], [1, 5], [2, 6], [3, 7]])
+BOX_CORNERS = np.array([[x, y, z] for x in (0, 1) for y in (0, 1) for z in (0, 1)])
+
+
+def boundary_edges(faces):
+    """Vertex index pairs of the edges used by a single face."""
+    edges = np.sort(faces[:, [[0, 1], [1, 2], [2, 0]]].reshape(-1, 2), axis=1)
+    unique, counts = np.unique(edges, axis=0, return_counts=True)
+    return unique[counts == 1]
+
+
+FLOOR_BOUNDARY = boundary_edges(FLOOR_FACES)
+
+
+def euler_xyz_matrices(angles):
+    """Row-vector rotations of xformOp:rotateXYZ for (N, 3) degrees: X first, then Y, then Z."""
+    rx, ry, rz = np.radians(np.asarray(angles, dtype=np.float64).reshape(-1, 3)).T
+    cx, sx, cy, sy, cz, sz = np.cos(rx), np.sin(rx), np.cos(ry), np.sin(ry), np.cos(rz), np.sin(rz)
+    return np.stack([
+        np.stack([cy * cz, cy * sz, -sy], axis=-1),
+        np.stack([sx * sy * cz - cx * sz, sx * sy * sz + cx * cz, sx * cy], axis=-1),
+        np.stack([cx * sy * cz + sx * sz, cx * sy * sz - sx * cz, cx * cy], axis=-1)
+    ], axis=1)
+
+
+def quaternion_matrices(quats):
+    """Row-vector rotations of xformOp:orient for (N, 4) scene.json quaternions [x, y, z, w]."""
+    quats = np.asarray(quats, dtype=np.float64).reshape(-1, 4)
+    x, y, z, w = (quats / np.linalg.norm(quats, axis=1, keepdims=True)).T
+    return np.stack([
+        np.stack([1 - 2 * (y * y + z * z), 2 * (x * y + w * z), 2 * (x * z - w * y)], axis=-1),
+        np.stack([2 * (x * y - w * z), 1 - 2 * (x * x + z * z), 2 * (y * z + w * x)], axis=-1),
+        np.stack([2 * (x * z + w * y), 2 * (y * z - w * x), 1 - 2 * (x * x + y * y)], axis=-1)
+    ], axis=1)
+
+
+def object_matrices(positions, rotations):
+    """
+    (N, 4, 4) row-vector local-to-world matrices of scene.json objects, as
+    authored by llm_design.create_scene (meters -> cm, translate then rotate,
+    unit scale). Rotations are Euler XYZ degrees or [x, y, z, w] quaternions.
+    """
+    matrices = np.tile(np.eye(4), (len(positions), 1, 1))
+    matrices[:, 3, :3] = np.asarray(positions, dtype=np.float64).reshape(-1, 3) * 100
+    lengths = np.array([len(r) for r in rotations])
+    if np.any((lengths != 3) & (lengths != 4)):
+        raise ValueError(f"Unsupported rotation: {rotations[int(np.argmax((lengths != 3) & (lengths != 4)))]}")
+    euler, quat = np.flatnonzero(lengths == 3), np.flatnonzero(lengths == 4)
+    if len(euler):
+        matrices[euler, :3, :3] = euler_xyz_matrices([rotations[k] for k in euler])
+    if len(quat):
+        matrices[quat, :3, :3] = quaternion_matrices([rotations[k] for k in quat])
+    return matrices
+
+
+def load_extents_index(index_path):
+    """Asset path (as in scene.json) -> (2, 3) local [min, max] in cm."""
+    with open(index_path, "r") as f:
+        return {path: np.asarray(box, dtype=np.float64).reshape(2, 3) for path, box in json.load(f).items()}
+
+
+def extents_from_meta_data(meta_data_path):
+    """
+    Approximate extents from the width / length / height (meters, along the
+    asset's x / y / z) of assets.json, assuming each asset is centered on its
+    origin in x and z and rests on y = 0. Prefer an index from build_extents_index.
+    """
+    with open(meta_data_path, "r") as f:
+        meta_data = json.load(f)
+    extents = {}
+    for item in meta_data:
+        meta = item["meta_data"]
+        if not all(k in meta for k in ("width", "length", "height")):
+            continue
+        size = np.array([meta["width"], meta["length"], meta["height"]], dtype=np.float64) * 100
+        extents[item["path"]] = np.array([[-size[0] / 2, 0.0, -size[2] / 2], [size[0] / 2, size[1], size[2] / 2]])
+    return extents
+
+
+def build_extents_index(meta_data_path, data_dir, index_path):
+    """
+    One-off pass over the asset catalog with pxr: the local bound of every
+    asset's default prim, i.e. the space of the prim that references it.
+    """
+    from pxr import Usd, UsdGeom
+
+    with open(meta_data_path, "r") as f:
+        meta_data = json.load(f)
+    bbox_cache = UsdGeom.BBoxCache(Usd.TimeCode.Default(), ["default"])
+    index = {}
+    for item in meta_data:
+        stage = Usd.Stage.Open(os.path.join(data_dir, item["path"]))
+        if not stage:
+            print(f"Can't open asset: {item['path']}")
+            continue
+        root = stage.GetDefaultPrim() or stage.GetPseudoRoot()
+        bound = bbox_cache.ComputeUntransformedBound(root).ComputeAlignedRange()
+        if bound.IsEmpty():
+            continue
+        index[item["path"]] = [list(bound.GetMin()), list(bound.GetMax())]
+        bbox_cache.Clear()
+    with open(index_path, "w") as f:
+        f.write(json.dumps(index, indent=4))
+    return index
+
+
+def box_corners(boxes):
+    """(N, 2, 3) [min, max] boxes -> (N, 8, 3) corners."""
+    return boxes[:, BOX_CORNERS, [0, 1, 2]]
+
+
+def transform_corners(corners, matrices):
+    return corners @ matrices[:, :3, :3] + matrices[:, None, 3, :3]
+
+
+def floor_geometry(mesh):
+    """
+    Floor triangles projected to the (x, z) plane, the polygon's boundary edges
+    (edges used by a single triangle) and the floor height, all in cm.
+    """
+    points = np.asarray(mesh["xyz"], dtype=np.float64).reshape(-1, 3) * 100
+    if points.shape[0] != 4:
+        raise ValueError(f"Floor mesh must be a quad with 4 vertices, got {points.shape[0]}")
+    return points[FLOOR_FACES][:, :, [0, 2]], points[FLOOR_BOUNDARY][:, :, [0, 2]], float(points[:, 1].max())
+
+
+def cross2(a, b):
+    return a[..., 0] * b[..., 1] - a[..., 1] * b[..., 0]
+
+
+def points_in_triangles(points, triangles, eps=1e-9):
+    """(..., 2) points inside (or on) any of the (T, 3, 2) triangles."""
+    p = points[..., None, :]
+    a, b, c = triangles[:, 0], triangles[:, 1], triangles[:, 2]
+    d1, d2, d3 = cross2(b - a, p - a), cross2(c - b, p - b), cross2(a - c, p - c)
+    negative = (d1 < -eps) | (d2 < -eps) | (d3 < -eps)
+    positive = (d1 > eps) | (d2 > eps) | (d3 > eps)
+    return np.any(~(negative & positive), axis=-1)
+
+
+def segments_cross(p0, p1, q0, q1):
+    """Proper crossings between broadcastable (..., 2) segments p0p1 and q0q1."""
+    d = p1 - p0
+    e = q1 - q0
+    o1, o2 = cross2(d, q0 - p0), cross2(d, q1 - p0)
+    o3, o4 = cross2(e, p0 - q0), cross2(e, p1 - q0)
+    return (o1 * o2 < 0) & (o3 * o4 < 0)
+
+
+def outside_floor_polygon(local_boxes, matrices, floor, margin=5.0, corners=None):
+    """
+    Objects whose footprint leaves the floor polygon or that sit entirely below
+    the floor. The footprint is the (x, z) projection of the box shrunk by
+    `margin`; it lies in the polygon iff all its corners do and none of its
+    edges crosses the polygon boundary, which also holds for concave floors.
+    `corners` are the already transformed corners of `local_boxes`, if known.
+    """
+    triangles, boundary, floor_y = floor
+    center = local_boxes.mean(axis=1, keepdims=True)
+    half = np.maximum((local_boxes[:, 1:] - local_boxes[:, :1]) / 2 - margin, 0.0)
+    shrunk = np.concatenate([center - half, center + half], axis=1)
+    footprint = transform_corners(box_corners(shrunk), matrices)[..., [0, 2]]
+    inside = points_in_triangles(footprint, triangles).all(axis=1)
+    edges = footprint[:, BOX_EDGES]
+    crossing = segments_cross(
+        edges[:, :, None, 0], edges[:, :, None, 1], boundary[None, None, :, 0], boundary[None, None, :, 1]
+    ).any(axis=(1, 2))
+    if corners is None:
+        corners = transform_corners(box_corners(local_boxes), matrices)
+    top = corners[..., 1].max(axis=1)
+    return ~inside | crossing | (top < floor_y - margin)
+
+
+def placed_objects(scene, extents):
+    """Local boxes (N, 2, 3) and matrices (N, 4, 4) of every placed scene.json object."""
+    boxes, positions, rotations = [], [], []
+    for objects in scene["objects"].values():
+        for obj in objects:
+            if "position" not in obj or "rotation" not in obj:
+                continue
+            if obj["path"] not in extents:
+                raise ValueError(f"No extents for asset {obj['path']}")
+            boxes.append(extents[obj["path"]])
+            positions.append(obj["position"])
+            rotations.append(obj["rotation"])
+    return np.asarray(boxes, dtype=np.float64).reshape(-1, 2, 3), object_matrices(positions, rotations)
+
+
+def analyze_scene_json(scene, extents, method="auto", margin=5.0):
+    """
+    OOB and OOR ratios of a scene.json dict without pxr. OOR uses the world
+    AABBs of the transformed asset extents, as oobr does for objects with an
+    extentsHint; OOB tests oriented footprints against the floor polygon.
+    """
+    local_boxes, matrices = placed_objects(scene, extents)
+    if len(local_boxes) == 0:
+        return 0.0, 0.0
+    corners = transform_corners(box_corners(local_boxes), matrices)
+    boxes = np.stack([corners.min(axis=1), corners.max(axis=1)], axis=1)
+    total_volume = float(np.cumsum(bbox_volumes(boxes))[-1])
+    oor_ratio = total_intersection_volume(boxes, method) / total_volume if total_volume > 1e-9 else 0.0
+    oob = outside_floor_polygon(local_boxes, matrices, floor_geometry(scene["meshes"]), margin, corners)
+    return float(oob.mean()), oor_ratio
+
+
+def find_scene_files(root):
+    scene_files = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        if "scene.json" in filenames:
+            scene_files.append(os.path.join(dirpath, "scene.json"))
+    return scene_files
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="OOB / OOR straight from scene.json files and asset extents, without pxr")
+    parser.add_argument("--root", type=str, default="infer_res", help="Folder searched recursively for scene.json files")
+    parser.add_argument("--extents", type=str, default="data/asset_extents.json", help="Extents index written by --build_index")
+    parser.add_argument("--meta_data", type=str, default="data/assets.json", help="Fallback extents from width / length / height")
+    parser.add_argument("--build_index", action="store_true", help="Build --extents from the asset catalog (needs pxr) and exit")
+    parser.add_argument("--data_dir", type=str, default="data", help="Asset root the scene.json paths are relative to")
+    parser.add_argument("--method", type=str, default="auto", choices=["auto", "matrix", "sweep"])
+    parser.add_argument("--report", type=str, default=None, help="Write per-scene ratios to this JSON file")
+    args = parser.parse_args()
+
+    if args.build_index:
+        index = build_extents_index(args.meta_data, args.data_dir, args.extents)
+        print(f"Indexed {len(index)} assets -> {args.extents}")
+        raise SystemExit
+    if os.path.exists(args.extents):
+        extents = load_extents_index(args.extents)
+    else:
+        print(f"Warning: {args.extents} not found, approximating extents from {args.meta_data}")
+        extents = extents_from_meta_data(args.meta_data)
+
+    scene_files = find_scene_files(args.root)
+    results, failed = [], 0
+    start = time.perf_counter()
+    for scene_file in scene_files:
+        try:
+            with open(scene_file, "r") as f:
+                oob, oor = analyze_scene_json(json.load(f), extents, args.method)
+        except (ValueError, KeyError) as e:
+            print(f"{scene_file}: {e}")
+            failed += 1
+            continue
+        results.append({"scene": os.path.dirname(scene_file), "oob": oob, "oor": oor})
+    elapsed = time.perf_counter() - start
+
+    if results:
+        print(f"OOB ratio mean: {np.mean([r['oob'] for r in results]):.4f}")
+        print(f"OOR ratio mean: {np.mean([r['oor'] for r in results]):.4f}")
+    print(f"Scored {len(results)} scenes ({failed} failed) in {elapsed:.2f}s, {len(results) / max(elapsed, 1e-9):.0f} scenes/s")
+    if args.report:
+        with open(args.report, "w") as f:
+            f.write(json.dumps(results, indent=4))
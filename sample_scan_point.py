@@ -1,47 +1,49 @@
 import argparse
 import os
+import json
+import time
+import zlib
+import hashlib
+import traceback
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import numpy as np
-from pxr import Usd, UsdGeom, Gf
-import open3d as o3d
-from open3d.geometry import TriangleMesh
-import matplotlib.cm as cm
+from pxr import Usd, UsdGeom, Sdf
+from tqdm import tqdm
+from utils.point_io import BBOX_FILES, BOX_DTYPE, point_file_names, save_point_cloud, load_point_cloud, save_bboxes
+from utils.usd_geometry import gf_matrix_to_numpy, transform_points, triangulate_faces, get_asset_reference
 
 
-def read_point_cloud_from_txt(file_path):
-    try:
-        if not os.path.exists(file_path):
-            raise FileNotFoundError(f"File not found: {file_path}")
-        if not file_path.endswith('.txt'):
-            raise ValueError("Please provide a file in txt format")
-        point_cloud = np.loadtxt(file_path)
-        if point_cloud.ndim != 2 or point_cloud.shape[1] != 4:
-            raise ValueError(f"Invalid point cloud format. Expected n*4 array, got {point_cloud.shape}")
-        return point_cloud
-    except Exception as e:
-        print(f"Error reading point cloud file: {str(e)}")
-        return None
+ASSET_CACHE_VERSION = 2
+# scene (x, y, z) in cm, Y-up -> output (-x, z, y) in m
+OUTPUT_AXES = np.array([[-1.0, 0.0, 0.0], [0.0, 0.0, 1.0], [0.0, 1.0, 0.0]])
+GEOMETRY_PREDICATE = Usd.PrimIsActive & Usd.PrimIsDefined & Usd.PrimIsLoaded & ~Usd.PrimIsAbstract
+PROFILE_PHASES = ("compose", "traverse", "transform", "sample", "write")
+# a generated scene folder; batch mode skips folders holding other .usda files
+SCENE_FILES = ("object.usda", "floor.usda")
+# weighted sample elimination (Yuksel 2015): weight falloff exponent and weight limiting
+ELIMINATION_ALPHA = 8.0
+ELIMINATION_BETA = 0.65
+ELIMINATION_GAMMA = 1.5
 
 
 def get_colors_for_labels(labels):
-    unique_labels = np.unique(labels)
-    num_labels = len(unique_labels)
-    cmap = cm.get_cmap('tab10', num_labels)
-    label_to_color = {}
-    for i, label in enumerate(unique_labels):
-        color = cmap(i)[:3]
-        label_to_color[label] = color
-    point_colors = np.array([label_to_color[label] for label in labels])
-    return point_colors
-
-
-def visualize_with_open3d(point_cloud, bboxes, title="Labeled Point Cloud with Bounding Boxes"):
-    if point_cloud is None:
+    import matplotlib.cm as cm
+    unique_labels, inverse = np.unique(labels, return_inverse=True)
+    cmap = cm.get_cmap('tab10', len(unique_labels))
+    palette = np.array([cmap(i)[:3] for i in range(len(unique_labels))])
+    return palette[inverse.reshape(-1)]
+
+
+def visualize_with_open3d(points, labels, boxes, title="Labeled Point Cloud with Bounding Boxes"):
+    # only needed for --vis, so batch sampling runs without open3d / matplotlib
+    import open3d as o3d
+    import matplotlib.cm as cm
+    if points is None or len(points) == 0:
         print("Cannot visualize, point cloud data is empty")
         return
-    coordinates = point_cloud[:, :3]
-    labels = point_cloud[:, 3]
     pcd = o3d.geometry.PointCloud()
-    pcd.points = o3d.utility.Vector3dVector(coordinates)
+    pcd.points = o3d.utility.Vector3dVector(np.asarray(points, dtype=np.float64))
     colors = get_colors_for_labels(labels)
     pcd.colors = o3d.utility.Vector3dVector(colors)
     
@@ -53,14 +55,14 @@ def visualize_with_open3d(point_cloud, bboxes, title="Labeled Point Cloud with B
     cmap = cm.get_cmap('tab10', len(unique_labels))
     label_color_map = {label: cmap(i)[:3] for i, label in enumerate(unique_labels)}
     
-    for bbox in bboxes:
-        label, min_x, min_y, min_z, max_x, max_y, max_z = bbox
-        aabb = o3d.geometry.AxisAlignedBoundingBox(
-            min_bound=[min_x, min_y, min_z],
-            max_bound=[max_x, max_y, max_z]
+    for box in boxes:
+        obb = o3d.geometry.OrientedBoundingBox(
+            np.asarray(box['center'], dtype=np.float64),
+            np.asarray(box['rotation'], dtype=np.float64),
+            np.asarray(box['size'], dtype=np.float64)
         )
-        aabb.color = label_color_map.get(label, [1, 0, 0])
-        vis.add_geometry(aabb)
+        obb.color = label_color_map.get(box['instance'], [1, 0, 0])
+        vis.add_geometry(obb)
     
     opt = vis.get_render_option()
     opt.background_color = [1.0, 1.0, 1.0]
@@ -69,181 +71,855 @@ def visualize_with_open3d(point_cloud, bboxes, title="Labeled Point Cloud with B
     vis.destroy_window()
 
 
-def compute_mesh_surface_area(mesh):
-    mesh.compute_triangle_normals()
-    triangles = np.asarray(mesh.triangles)
-    vertices = np.asarray(mesh.vertices)
-    areas = []
-    for tri in triangles:
-        v0, v1, v2 = vertices[tri[0]], vertices[tri[1]], vertices[tri[2]]
-        a = np.linalg.norm(v1 - v0)
-        b = np.linalg.norm(v2 - v1)
-        c = np.linalg.norm(v2 - v0)
-        s = (a + b + c) / 2
-        area = np.sqrt(s * (s - a) * (s - b) * (s - c))
-        areas.append(area)
-    return sum(areas)
+def triangle_areas(vertices, triangles):
+    v0 = vertices[triangles[:, 0]]
+    return 0.5 * np.linalg.norm(np.cross(vertices[triangles[:, 1]] - v0, vertices[triangles[:, 2]] - v0), axis=1)
+
+
+def area_cdf(areas):
+    cdf = np.cumsum(areas, dtype=np.float64)
+    if len(cdf) == 0 or cdf[-1] <= 0:
+        return cdf
+    return cdf / cdf[-1]
+
+
+def compute_mesh_surface_area(vertices, triangles):
+    return float(triangle_areas(vertices, triangles).sum())
+
+
+def allocate_points(areas, num_points, min_points=1):
+    """
+    Largest-remainder apportionment of `num_points` proportional to `areas`.
+    The result always sums to exactly `num_points` (or 0 if all areas are 0).
+    Every mesh with a positive area gets at least `min_points` when the budget
+    allows it.
+    """
+    areas = np.asarray(areas, dtype=np.float64)
+    allocation = np.zeros(len(areas), dtype=np.int64)
+    total_area = areas.sum()
+    if total_area <= 0 or num_points <= 0:
+        return allocation
+    positive = areas > 0
+    if min_points > 0 and min_points * positive.sum() <= num_points:
+        allocation[positive] = min_points
+    remaining = num_points - allocation.sum()
+    quotas = remaining * areas / total_area
+    base = np.floor(quotas).astype(np.int64)
+    allocation += base
+    leftover = remaining - base.sum()
+    if leftover > 0:
+        order = np.argsort(-(quotas - base), kind="stable")
+        allocation[order[:leftover]] += 1
+    return allocation
+
+
+def sample_triangles(vertices, triangles, cdf, u, rng=np.random, tri_mesh=None, sample_mesh=None):
+    """
+    Surface points for uniform variates `u` mapped through a per-triangle area
+    CDF (see area_cdf): inverse-CDF triangle lookup, then uniform barycentric
+    coordinates. With `tri_mesh` and the intended `sample_mesh` of every
+    variate, lookups that left their mesh (round-off at slice borders,
+    zero-area triangles) fall back to the mesh's first triangle. Returns the
+    points and the index of the source triangle.
+    """
+    tri_idx = np.clip(np.searchsorted(cdf, u, side="right"), 0, len(cdf) - 1)
+    if tri_mesh is not None:
+        wrong = tri_mesh[tri_idx] != sample_mesh
+        if wrong.any():
+            tri_idx[wrong] = np.searchsorted(tri_mesh, sample_mesh[wrong], side="left")
+    return barycentric_points(vertices, triangles, tri_idx, rng), tri_idx
+
+
+def barycentric_points(vertices, triangles, tri_idx, rng=np.random):
+    u, v = rng.random(len(tri_idx)), rng.random(len(tri_idx))
+    flip = u + v > 1
+    u[flip], v[flip] = 1 - u[flip], 1 - v[flip]
+    tri = triangles[tri_idx]
+    v0 = vertices[tri[:, 0]]
+    return v0 + u[:, None] * (vertices[tri[:, 1]] - v0) + v[:, None] * (vertices[tri[:, 2]] - v0)
+
+
+def to_output_frame(points):
+    return points @ OUTPUT_AXES / 100.0
+
+
+def oriented_box(aabb_min, aabb_max, matrix):
+    """
+    Oriented box, in the output frame, of a local-space AABB placed by the
+    row-vector `matrix`. Returns (center, size, rotation) where the columns of
+    `rotation` are the box axes and `size` the full extent along each of them.
+    """
+    aabb_min, aabb_max = np.asarray(aabb_min, dtype=np.float64), np.asarray(aabb_max, dtype=np.float64)
+    center = transform_points(((aabb_min + aabb_max) / 2)[None], matrix)[0]
+    axes = matrix[:3, :3]
+    scale = np.linalg.norm(axes, axis=1)
+    axes = axes / np.where(scale > 0, scale, 1.0)[:, None]
+    rotation = (axes @ OUTPUT_AXES).T
+    if np.linalg.det(rotation) < 0:
+        # mirrored instance: flip one axis to keep a proper rotation
+        rotation[:, 2] = -rotation[:, 2]
+    return to_output_frame(center[None])[0], (aabb_max - aabb_min) * scale / 100.0, rotation
+
+
+def build_scene_geometry(meshes):
+    """
+    Concatenate per-mesh (vertices, triangles) into scene arrays. Returns the
+    stacked vertices, the re-indexed triangles and the mesh index of every
+    triangle.
+    """
+    vertex_counts = np.array([len(v) for v, _ in meshes], dtype=np.int64)
+    triangle_counts = np.array([len(t) for _, t in meshes], dtype=np.int64)
+    vertex_offsets = np.cumsum(vertex_counts) - vertex_counts
+    vertices = np.concatenate([v for v, _ in meshes]) if meshes else np.zeros((0, 3))
+    triangles = np.concatenate([t for _, t in meshes]) if meshes else np.zeros((0, 3), dtype=np.int64)
+    tri_mesh = np.repeat(np.arange(len(meshes)), triangle_counts)
+    triangles = triangles + np.repeat(vertex_offsets, triangle_counts)[:, None]
+    return vertices, triangles, tri_mesh
+
+
+def sample_stratified(vertices, triangles, tri_mesh, areas, allocation, rng):
+    """
+    Draw exactly allocation[m] area-weighted points from every mesh m in one
+    pass: each sample's uniform variate is mapped into its mesh's slice of the
+    scene-wide triangle area CDF.
+    """
+    cdf = area_cdf(areas)
+    mesh_share = np.bincount(tri_mesh, weights=areas, minlength=len(allocation))
+    if mesh_share.sum() > 0:
+        mesh_share /= mesh_share.sum()
+    mesh_start = np.cumsum(mesh_share) - mesh_share
+    sample_mesh = np.repeat(np.arange(len(allocation)), allocation)
+    u = mesh_start[sample_mesh] + rng.random(len(sample_mesh)) * mesh_share[sample_mesh]
+    return sample_triangles(vertices, triangles, cdf, u, rng, tri_mesh, sample_mesh)
+
+
+# cell offsets covering each pair of neighbouring cells once
+HALF_NEIGHBOURHOOD = [(dx, dy, dz) for dx in (-1, 0, 1) for dy in (-1, 0, 1) for dz in (-1, 0, 1) if (dx, dy, dz) >= (0, 0, 0)]
+
+
+def neighbour_pairs(points, groups, max_distance):
+    """
+    Every unordered pair (i, j) of points in the same group that are closer
+    than `max_distance`, with their distance. Points are bucketed into cells of
+    that size and each occupied cell is matched against its 13 forward
+    neighbours and itself, so every candidate pair is generated once.
+    """
+    cells = np.floor((points - points.min(axis=0)) / max_distance).astype(np.int64) + 1
+    dims = cells.max(axis=0) + 2
+    keys = (cells[:, 0] * dims[1] + cells[:, 1]) * dims[2] + cells[:, 2]
+    order = np.argsort(keys, kind="stable")
+    cell_keys, cell_start, cell_count = np.unique(keys[order], return_index=True, return_counts=True)
+    all_i, all_j, all_dist = [], [], []
+    for dx, dy, dz in HALF_NEIGHBOURHOOD:
+        target = cell_keys + (dx * dims[1] + dy) * dims[2] + dz
+        b = np.minimum(np.searchsorted(cell_keys, target), len(cell_keys) - 1)
+        a = np.flatnonzero(cell_keys[b] == target)
+        b = b[a]
+        size_a, size_b = cell_count[a], cell_count[b]
+        num_pairs = size_a * size_b
+        pair_cell = np.repeat(np.arange(len(a)), num_pairs)
+        k = np.arange(num_pairs.sum()) - np.repeat(np.cumsum(num_pairs) - num_pairs, num_pairs)
+        ia, ib = k // size_b[pair_cell], k % size_b[pair_cell]
+        i = order[cell_start[a][pair_cell] + ia]
+        j = order[cell_start[b][pair_cell] + ib]
+        candidate = groups[i] == groups[j]
+        if (dx, dy, dz) == (0, 0, 0):
+            candidate &= ia < ib
+        i, j = i[candidate], j[candidate]
+        offset = points[i] - points[j]
+        dist2 = np.einsum('ij,ij->i', offset, offset)
+        close = dist2 < max_distance * max_distance
+        all_i.append(i[close])
+        all_j.append(j[close])
+        all_dist.append(np.sqrt(dist2[close]))
+    return np.concatenate(all_i), np.concatenate(all_j), np.concatenate(all_dist)
+
+
+def eliminate_samples(points, sample_mesh, allocation, radius, rng):
+    """
+    Weighted sample elimination (Yuksel 2015, the scheme behind Open3D's
+    Poisson-disk sampling): candidates of mesh m are removed until exactly
+    allocation[m] remain, always the ones most crowded by neighbours of the
+    same mesh within 2 * `radius`, where `radius` is the Poisson-disk r_max
+    of the target count. Rather than one candidate at a time, each round
+    removes every candidate that is heavier than all its remaining neighbours
+    and among the heaviest its mesh still has to lose. Returns the sorted
+    indices of the kept candidates.
+    """
+    num_points = len(points)
+    allocation = np.asarray(allocation, dtype=np.int64)
+    excess = np.bincount(sample_mesh, minlength=len(allocation)) - allocation
+    if not (excess > 0).any():
+        return np.arange(num_points)
+    d_max = 2.0 * radius
+    pair_i, pair_j, dist = neighbour_pairs(points, sample_mesh, d_max)
+    # weight limiting keeps already well-spaced candidates from dominating
+    d_min = d_max * ELIMINATION_BETA * (1.0 - (allocation.sum() / num_points) ** ELIMINATION_GAMMA)
+    pair_weight = (1.0 - np.maximum(dist, d_min) / d_max) ** ELIMINATION_ALPHA
+    shuffle = rng.permutation(num_points)
+    active = np.ones(num_points, dtype=bool)
+    while (excess > 0).any():
+        live = active[pair_i] & active[pair_j]
+        pair_i, pair_j, pair_weight = pair_i[live], pair_j[live], pair_weight[live]
+        weight = np.bincount(pair_i, pair_weight, num_points) + np.bincount(pair_j, pair_weight, num_points)
+        # active candidates of each mesh, heaviest first (ties in shuffled order)
+        alive = shuffle[active[shuffle]]
+        alive = alive[np.argsort(-weight[alive])]
+        alive = alive[np.argsort(sample_mesh[alive], kind="stable")]
+        rank = np.empty(num_points, dtype=np.int64)
+        rank[alive] = np.arange(len(alive))
+        beaten = np.zeros(num_points, dtype=bool)
+        beaten[np.where(rank[pair_i] > rank[pair_j], pair_i, pair_j)] = True
+        # restricting to the `excess` heaviest keeps sparse local maxima from going early
+        group_start = np.searchsorted(sample_mesh[alive], np.arange(len(allocation)), side="left")
+        within = np.arange(len(alive)) - group_start[sample_mesh[alive]]
+        removed = alive[(within < excess[sample_mesh[alive]]) & ~beaten[alive]]
+        active[removed] = False
+        excess -= np.bincount(sample_mesh[removed], minlength=len(allocation))
+    return np.flatnonzero(active)
+
+
+def sample_scene(vertices, triangles, tri_mesh, num_points, sampler="blue_noise", oversample=4, rng=None, allocation=None):
+    """
+    Sample `num_points` points over all meshes of a scene at once.
+
+    uniform:    area-weighted triangle choice plus uniform barycentric coordinates,
+                with an exact largest-remainder split of the budget across meshes.
+    blue_noise: the same with `oversample` times more candidates, thinned by
+                weighted sample elimination to Poisson-disk spacing.
+
+    A precomputed per-mesh `allocation` overrides the split of `num_points`.
+    Returns the points and the mesh index of every point.
+    """
+    rng = np.random.default_rng(rng)
+    areas = triangle_areas(vertices, triangles)
+    num_meshes = int(tri_mesh.max()) + 1 if len(tri_mesh) else 0
+    mesh_area = np.bincount(tri_mesh, weights=areas, minlength=num_meshes)
+    if allocation is None:
+        allocation = allocate_points(mesh_area, num_points)
+    else:
+        allocation = np.asarray(allocation, dtype=np.int64)
+        num_points = int(allocation.sum())
+    if num_points == 0:
+        return np.zeros((0, 3)), np.zeros(0, dtype=np.int64)
+
+    if sampler == "uniform":
+        points, tri_idx = sample_stratified(vertices, triangles, tri_mesh, areas, allocation, rng)
+        return points, tri_mesh[tri_idx]
+    if sampler != "blue_noise":
+        raise ValueError(f"Unknown sampler: {sampler}")
+
+    candidates = allocate_points(mesh_area, num_points * oversample)
+    candidates = np.maximum(candidates, allocation)
+    points, tri_idx = sample_stratified(vertices, triangles, tri_mesh, areas, candidates, rng)
+    sample_mesh = tri_mesh[tri_idx]
+    # r_max: the Poisson-disk radius of num_points samples packed densely over the total area
+    radius = np.sqrt(mesh_area.sum() / (2 * np.sqrt(3) * max(num_points, 1)))
+    keep = eliminate_samples(points, sample_mesh, allocation, radius, rng)
+    return points[keep], sample_mesh[keep]
+
+
+def farthest_point_order(points, count, rng):
+    """
+    Greedy farthest-point ordering of the first `count` points from a random
+    start; the remaining points follow in random order. Every prefix of the
+    result is a well-spread subset.
+    """
+    n = len(points)
+    count = min(count, n)
+    coords = [np.ascontiguousarray(points[:, i], dtype=np.float32) for i in range(3)]
+    nearest = np.full(n, np.inf, dtype=np.float32)
+    dist, tmp = np.empty(n, dtype=np.float32), np.empty(n, dtype=np.float32)
+    order = np.empty(n, dtype=np.int64)
+    selected = np.zeros(n, dtype=bool)
+    current = int(rng.integers(n)) if n else 0
+    for i in range(count):
+        order[i] = current
+        selected[current] = True
+        np.subtract(coords[0], coords[0][current], out=dist)
+        np.multiply(dist, dist, out=dist)
+        for c in coords[1:]:
+            np.subtract(c, c[current], out=tmp)
+            np.multiply(tmp, tmp, out=tmp)
+            dist += tmp
+        np.minimum(nearest, dist, out=nearest)
+        current = int(np.argmax(nearest))
+    rest = np.flatnonzero(~selected)
+    order[count:] = rest[rng.permutation(len(rest))]
+    return order
+
+
+def nested_subset_order(points, count, subset_order="random", rng=None):
+    """
+    Ordering of `points` whose prefixes are the nested lower-resolution subsets:
+    a random permutation (every prefix is a uniform subsample) or farthest-point
+    ordering of the first `count` points.
+    """
+    rng = np.random.default_rng(rng)
+    if subset_order == "random":
+        return rng.permutation(len(points))
+    if subset_order == "fps":
+        return farthest_point_order(points, count, rng)
+    raise ValueError(f"Unknown subset order: {subset_order}")
+
+
+def read_mesh_geometry(prim, matrix):
+    mesh = UsdGeom.Mesh(prim)
+    points = np.array(mesh.GetPointsAttr().Get(), dtype=np.float64).reshape(-1, 3)
+    face_indices = np.array(mesh.GetFaceVertexIndicesAttr().Get(), dtype=np.int32)
+    face_counts = np.array(mesh.GetFaceVertexCountsAttr().Get(), dtype=np.int32)
+    return transform_points(points, matrix), triangulate_faces(face_counts, face_indices)
+
+
+class PhaseTimer:
+    """
+    Exclusive wall time per phase: entering a nested phase pauses the enclosing
+    one, so the phases add up to the total time spent inside them.
+    """
+
+    def __init__(self, seconds=None):
+        self.seconds = seconds if seconds is not None else {}
+        for phase in PROFILE_PHASES:
+            self.seconds.setdefault(phase, 0.0)
+        self.stack = []
+        self.mark = None
+
+    @contextmanager
+    def phase(self, name):
+        now = time.perf_counter()
+        if self.stack:
+            self.seconds[self.stack[-1]] += now - self.mark
+        self.stack.append(name)
+        self.mark = now
+        try:
+            yield
+        finally:
+            now = time.perf_counter()
+            self.seconds[self.stack.pop()] += now - self.mark
+            self.mark = now
+
+
+def compose_scene_stage(input_folder, usda_files, population_mask=None):
+    """
+    One stage referencing every .usda file of a scene under /imported_<name>.
+    With `population_mask` (prim paths on that stage, e.g. /imported_object),
+    only those subtrees and their ancestors are composed.
+    """
+    layer = Sdf.Layer.CreateAnonymous('.usda')
+    for usda_file in usda_files:
+        prim_name = os.path.splitext(usda_file)[0]
+        spec = Sdf.CreatePrimInLayer(layer, f'/imported_{prim_name}')
+        spec.specifier = Sdf.SpecifierDef
+        spec.typeName = 'Xform'
+        spec.referenceList.Prepend(Sdf.Reference(os.path.abspath(os.path.join(input_folder, usda_file))))
+    if population_mask:
+        return Usd.Stage.OpenMasked(layer, Usd.StagePopulationMask(list(population_mask)))
+    return Usd.Stage.Open(layer)
+
+
+def is_geometry_subtree(prim):
+    """
+    False for subtrees that cannot contribute scene geometry: typed prims that
+    are not imageable (materials, shaders), invisible prims, guides and proxies.
+    Untyped prims (e.g. a scene's /Root) are traversed.
+    """
+    if not prim.GetTypeName():
+        return True
+    if not prim.IsA(UsdGeom.Imageable):
+        return False
+    imageable = UsdGeom.Imageable(prim)
+    return (imageable.GetVisibilityAttr().Get() != UsdGeom.Tokens.invisible
+            and imageable.GetPurposeAttr().Get() not in (UsdGeom.Tokens.guide, UsdGeom.Tokens.proxy))
+
+
+def file_content_hash(file_path, chunk_size=1 << 20):
+    digest = hashlib.sha1()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def sample_asset_local(asset_path, density, min_points, rng):
+    """
+    Densely sample one asset in its local space, i.e. relative to the asset's
+    default prim, which is the prim an instance's transform is applied to.
+    """
+    stage = Usd.Stage.Open(asset_path)
+    if not stage:
+        raise ValueError(f"Cannot open asset: {asset_path}")
+    root = stage.GetDefaultPrim() or stage.GetPseudoRoot()
+    xform_cache = UsdGeom.XformCache()
+    to_local = np.linalg.inv(gf_matrix_to_numpy(xform_cache.GetLocalToWorldTransform(root)))
+    meshes = []
+    for prim in Usd.PrimRange(root):
+        if prim.IsA(UsdGeom.Mesh):
+            matrix = gf_matrix_to_numpy(xform_cache.GetLocalToWorldTransform(prim)) @ to_local
+            meshes.append(read_mesh_geometry(prim, matrix))
+
+    vertices, triangles, tri_mesh = build_scene_geometry(meshes)
+    area = compute_mesh_surface_area(vertices, triangles)
+    num_points = max(min_points, int(np.ceil(area / 1e4 * density))) if area > 0 else 0
+    points, point_mesh = sample_scene(vertices, triangles, tri_mesh, num_points, sampler="uniform", rng=rng)
+    order = rng.permutation(len(points))
+    return {
+        "points": points[order].astype(np.float32),
+        "aabb_min": vertices.min(axis=0) if len(vertices) else np.zeros(3),
+        "aabb_max": vertices.max(axis=0) if len(vertices) else np.zeros(3),
+        "area": np.float64(area)
+    }
+
+
+class AssetPointCache:
+    """
+    Per-asset point samples in local space, stored on disk as
+    <cache_dir>/<key[:2]>/<key>.npz with the key derived from the asset path,
+    its content hash and the sampling density. Points are stored shuffled, so
+    any window of them is a uniform subsample; the local AABB of the asset is
+    stored alongside for box extraction. Loaded entries are also kept in
+    memory for the lifetime of the process.
+    """
+
+    def __init__(self, cache_dir, density=10000.0, min_points=4096, seed=0):
+        self.cache_dir = cache_dir
+        self.density = density
+        self.min_points = min_points
+        self.seed = seed
+        self.memory = {}
+        self.hashes = {}
+
+    def key(self, asset_path):
+        stat = os.stat(asset_path)
+        memo_key = (asset_path, stat.st_mtime_ns, stat.st_size)
+        if memo_key not in self.hashes:
+            self.hashes[memo_key] = file_content_hash(asset_path)
+        raw = f"{ASSET_CACHE_VERSION}|{os.path.realpath(asset_path)}|{self.hashes[memo_key]}|{self.density}|{self.min_points}"
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+    def get(self, asset_path):
+        key = self.key(asset_path)
+        if key in self.memory:
+            return self.memory[key]
+        file_path = os.path.join(self.cache_dir, key[:2], key + '.npz')
+        if os.path.exists(file_path):
+            with np.load(file_path) as data:
+                entry = {k: data[k] for k in data.files}
+        else:
+            rng = np.random.default_rng([self.seed, int(key[:8], 16)])
+            entry = sample_asset_local(asset_path, self.density, self.min_points, rng)
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            tmp_path = f"{file_path}.{os.getpid()}.tmp.npz"
+            np.savez(tmp_path, **entry)
+            os.replace(tmp_path, file_path)
+        self.memory[key] = entry
+        return entry
+
+
+def sample_instances(instances, allocation, rng, sampler="uniform", areas=None, oversample=4):
+    """
+    Subsample each cached asset and move it into place with its instance matrix.
+    `instances` holds (instance_id, cache_entry, matrix) tuples. With the
+    blue_noise sampler every instance places `oversample` times more cached
+    points, which are thinned like sample_scene's candidates at the spacing of
+    sum(allocation) points over the instances' world-space `areas`.
+    """
+    blue_noise = sampler == "blue_noise"
+    all_points, all_instances, sample_instance = [], [], []
+    for k, ((instance_id, entry, matrix), count) in enumerate(zip(instances, allocation)):
+        cached = entry["points"]
+        if count == 0 or len(cached) == 0:
+            continue
+        num_candidates = max(count, min(count * oversample, len(cached))) if blue_noise else count
+        idx = (rng.integers(len(cached)) + np.arange(num_candidates)) % len(cached)
+        all_points.append(transform_points(cached[idx].astype(np.float64), matrix))
+        all_instances.append(np.full(num_candidates, instance_id, dtype=np.int64))
+        sample_instance.append(np.full(num_candidates, k, dtype=np.int64))
+    if not all_points:
+        return np.zeros((0, 3)), np.zeros(0, dtype=np.int64)
+    points, instance_ids = np.concatenate(all_points), np.concatenate(all_instances)
+    if blue_noise:
+        allocation = np.asarray(allocation, dtype=np.int64)
+        radius = np.sqrt(float(np.sum(areas)) / (2 * np.sqrt(3) * max(int(allocation.sum()), 1)))
+        keep = eliminate_samples(points, np.concatenate(sample_instance), allocation, radius, rng)
+        points, instance_ids = points[keep], instance_ids[keep]
+    return points, instance_ids
+
+
+def load_label_maps(meta_data_path, labels_path):
+    """
+    Asset id -> label name from assets.json and the ordered class names of
+    labels.json. Geometry that is not a referenced asset (the room's floor) gets
+    the extra class "Floor".
+    """
+    asset_labels, label_names = {}, []
+    if meta_data_path and os.path.exists(meta_data_path):
+        with open(meta_data_path, 'r') as f:
+            asset_labels = {item["model_id"]: item["label"] for item in json.load(f)}
+    if labels_path and os.path.exists(labels_path):
+        with open(labels_path, 'r') as f:
+            label_names = json.load(f)
+    if "Floor" not in label_names:
+        label_names = label_names + ["Floor"]
+    return asset_labels, label_names
+
+
+def find_instance(prim, instance_of_prim):
+    while prim:
+        if prim.GetPath() in instance_of_prim:
+            return instance_of_prim[prim.GetPath()]
+        prim = prim.GetParent()
+    return None
+
+
+def load_scene(input_folder, asset_labels=None, label_names=None, asset_cache=None, population_mask=None, timer=None):
+    """
+    Compose a scene folder and collect its geometry in world space (cm, Y-up).
+
+    Traversal only visits active, defined, loaded geometry subtrees of the
+    composed stage, optionally limited by a population mask. Every referenced
+    asset prim is one object instance: its meshes share one instance id, the
+    class id of the asset's assets.json label, and one oriented box built from
+    the instance transform and the asset's local AABB. Meshes outside any asset
+    (the floor) are instances of class "Floor". With an `asset_cache`, assets
+    are not traversed but listed in `cached_instances` instead.
+
+    Returns a dict with the (vertices, triangles) `meshes` and their
+    `mesh_instances`, `cached_instances`, the per-instance `objects` records,
+    their BOX_DTYPE `boxes` and the `label_names`, or None for an empty folder.
+    """
+    if label_names is None:
+        asset_labels, label_names = load_label_maps(None, None)
+    asset_labels = asset_labels or {}
+    class_ids = {name: i for i, name in enumerate(label_names)}
+
+    timer = timer or PhaseTimer()
+    usda_files = sorted(f for f in os.listdir(input_folder) if f.endswith('.usda'))
+    if not usda_files:
+        print("No USDA files found in the input folder.")
+        return None
+    with timer.phase("compose"):
+        stage = compose_scene_stage(input_folder, usda_files, population_mask)
 
+    meshes = []
+    mesh_instances = []
+    cached_instances = []
+    objects = []
+    local_bounds = []
+
+    def add_object(prim, asset_id, label, matrix, aabb_min=None, aabb_max=None):
+        objects.append({
+            "instance": len(objects), "prim_path": str(prim.GetPath()), "asset_id": asset_id,
+            "label": label, "class_id": class_ids.get(label, -1)
+        })
+        local_bounds.append([
+            np.full(3, np.inf) if aabb_min is None else np.asarray(aabb_min, dtype=np.float64),
+            np.full(3, -np.inf) if aabb_max is None else np.asarray(aabb_max, dtype=np.float64),
+            matrix
+        ])
+        return len(objects) - 1
+
+    xform_cache = UsdGeom.XformCache()
+    instance_of_prim = {}
+    with timer.phase("traverse"):
+        prim_range = iter(Usd.PrimRange(stage.GetPseudoRoot(), GEOMETRY_PREDICATE))
+        for prim in prim_range:
+            if not is_geometry_subtree(prim):
+                prim_range.PruneChildren()
+                continue
+            asset_path = get_asset_reference(prim)
+            if asset_path is not None:
+                with timer.phase("transform"):
+                    matrix = gf_matrix_to_numpy(xform_cache.GetLocalToWorldTransform(prim))
+                asset_id = os.path.splitext(os.path.basename(asset_path))[0]
+                label = asset_labels.get(asset_id)
+                if asset_cache is not None:
+                    prim_range.PruneChildren()
+                    with timer.phase("sample"):
+                        entry = asset_cache.get(asset_path)
+                    instance_id = add_object(prim, asset_id, label, matrix, entry["aabb_min"], entry["aabb_max"])
+                    cached_instances.append((instance_id, entry, matrix))
+                else:
+                    # local AABB is accumulated from the instance's meshes below
+                    instance_of_prim[prim.GetPath()] = add_object(prim, asset_id, label, matrix)
+                continue
+
+            if prim.IsA(UsdGeom.Mesh):
+                with timer.phase("transform"):
+                    world_transform = gf_matrix_to_numpy(xform_cache.GetLocalToWorldTransform(prim))
+                transformed_points, triangles = read_mesh_geometry(prim, world_transform)
+                if len(transformed_points) == 0:
+                    continue
+                instance_id = find_instance(prim, instance_of_prim)
+                if instance_id is None:
+                    instance_id = add_object(prim, None, "Floor", np.eye(4))
+                with timer.phase("transform"):
+                    bounds = local_bounds[instance_id]
+                    local_points = transform_points(transformed_points, np.linalg.inv(bounds[2]))
+                    bounds[0] = np.minimum(bounds[0], local_points.min(axis=0))
+                    bounds[1] = np.maximum(bounds[1], local_points.max(axis=0))
+                meshes.append((transformed_points, triangles))
+                mesh_instances.append(instance_id)
+
+    with timer.phase("transform"):
+        box_array = np.zeros(len(objects), dtype=BOX_DTYPE)
+        for i, (obj, (aabb_min, aabb_max, matrix)) in enumerate(zip(objects, local_bounds)):
+            box_array[i]['instance'], box_array[i]['label'] = i, obj["class_id"]
+            if np.all(aabb_min <= aabb_max):
+                box_array[i]['center'], box_array[i]['size'], box_array[i]['rotation'] = oriented_box(aabb_min, aabb_max, matrix)
+    return {
+        "meshes": meshes, "mesh_instances": mesh_instances, "cached_instances": cached_instances,
+        "objects": objects, "boxes": box_array, "label_names": label_names
+    }
+
+
+def main(input_folder, num_points, output_dir, vis, sampler="blue_noise", seed=None, output_format="txt", asset_cache=None,
+         asset_labels=None, label_names=None, subset_order="random", population_mask=None, profile=None):
+    """
+    Sample a labeled point cloud and per-instance oriented boxes of the scene
+    (see load_scene). Wall time per phase (compose / traverse / transform /
+    sample / write) is accumulated into the `profile` dict when given.
+
+    `num_points` may also be a list of budgets: the largest one is sampled once
+    and every smaller one is written as a nested prefix of it (see
+    nested_subset_order), one scene_<n> file per budget.
+    """
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    budgets = sorted(set(np.atleast_1d(num_points).tolist()))
+    num_points = budgets[-1]
+    timer = PhaseTimer(profile)
+    scene = load_scene(input_folder, asset_labels, label_names, asset_cache, population_mask, timer)
+    if scene is None:
+        return
+    meshes, mesh_instances, cached_instances = scene["meshes"], scene["mesh_instances"], scene["cached_instances"]
+    objects, box_array, label_names = scene["objects"], scene["boxes"], scene["label_names"]
+
+    with timer.phase("write"):
+        save_bboxes(os.path.join(output_dir, BBOX_FILES[output_format]), box_array)
+        with open(os.path.join(output_dir, 'instances.json'), 'w') as f:
+            f.write(json.dumps({"labels": label_names, "instances": objects}, indent=4))
+
+    with timer.phase("sample"):
+        vertices, triangles, tri_mesh = build_scene_geometry(meshes)
+        mesh_area = np.bincount(tri_mesh, weights=triangle_areas(vertices, triangles), minlength=len(meshes))
+        # |det|^(2/3) rescales surface area exactly for uniform instance scales
+        instance_area = np.array([
+            float(entry["area"]) * abs(np.linalg.det(matrix[:3, :3])) ** (2.0 / 3.0) for _, entry, matrix in cached_instances
+        ])
+        if mesh_area.sum() + instance_area.sum() == 0:
+            print("Total surface area is zero, cannot allocate points.")
+            return
+        allocation = allocate_points(np.concatenate([mesh_area, instance_area]), num_points)
+
+        rng = np.random.default_rng(seed)
+        combined_points, point_mesh = sample_scene(
+            vertices, triangles, tri_mesh, num_points, sampler=sampler, rng=rng, allocation=allocation[:len(meshes)]
+        )
+        combined_instances = np.asarray(mesh_instances, dtype=np.int64)[point_mesh]
+        if cached_instances:
+            instance_points, instance_ids = sample_instances(
+                cached_instances, allocation[len(meshes):], rng, sampler, instance_area
+            )
+            combined_points = np.concatenate([combined_points, instance_points])
+            combined_instances = np.concatenate([combined_instances, instance_ids])
+        combined_points = to_output_frame(combined_points)
+        combined_labels = box_array['label'][combined_instances]
+
+        if len(budgets) > 1:
+            order = nested_subset_order(combined_points, budgets[-2], subset_order, rng)
+            combined_points, combined_labels, combined_instances = (
+                combined_points[order], combined_labels[order], combined_instances[order]
+            )
+
+    output_files = [os.path.join(output_dir, f) for f in point_file_names(output_format, budgets)]
+    with timer.phase("write"):
+        for budget, output_file in zip(budgets, output_files):
+            save_point_cloud(output_file, combined_points[:budget], combined_labels[:budget], combined_instances[:budget])
+    output_file = output_files[-1]
 
-def compute_bounding_box(points):
-    min_x, min_y, min_z = np.min(points, axis=0)
-    max_x, max_y, max_z = np.max(points, axis=0)
-    return min_x, min_y, min_z, max_x, max_y, max_z
+    if vis:
+        points, _, instances = load_point_cloud(output_file, return_instances=True)
+        visualize_with_open3d(points, instances, box_array, title="Labeled Point Cloud with Bounding Boxes")
 
+    return len(combined_points)
 
-def main(input_folder, num_points, output_dir, vis):
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
 
-    stage = Usd.Stage.CreateInMemory()
-    usda_files = [f for f in os.listdir(input_folder) if f.endswith('.usda')]
-    if not usda_files:
-        print("No USDA files found in the input folder.")
-        return
+def print_profile(profile):
+    total = sum(profile.values())
+    print(" | ".join(f"{phase} {profile[phase]:.3f}s ({profile[phase] / total * 100 if total else 0:.0f}%)"
+                     for phase in PROFILE_PHASES))
 
-    meshes = []
-    surface_areas = []
-    bboxes = []
-    for usda_file in usda_files:
-        file_path = os.path.join(input_folder, usda_file)
-        prim_name = os.path.splitext(usda_file)[0]
-        ref_prim = stage.DefinePrim(f'/imported_{prim_name}', 'Xform')
-        ref_prim.GetReferences().AddReference(file_path)
 
-    all_points = []
-    all_labels = []
-    semantic_label = 0
+def find_scene_folders(input_root):
+    """Folders below `input_root` holding a complete scene (all SCENE_FILES)."""
+    scenes = []
+    for dirpath, dirnames, filenames in os.walk(input_root):
+        dirnames.sort()
+        if all(f in filenames for f in SCENE_FILES):
+            scenes.append(dirpath)
+    return scenes
 
-    for prim in stage.Traverse():
-        if prim.IsA(UsdGeom.Mesh):
-            mesh = UsdGeom.Mesh(prim)
-
-            xform_cache = UsdGeom.XformCache()
-            world_transform = xform_cache.GetLocalToWorldTransform(prim)
-
-            points = np.array(mesh.GetPointsAttr().Get(), dtype=np.float64)
-            transformed_points = []
-            for point in points:
-                gf_point = Gf.Vec3d(point[0], point[1], point[2])
-                transformed = world_transform.Transform(gf_point)
-                transformed_points.append([transformed[0], transformed[1], transformed[2]])
-            transformed_points = np.array(transformed_points)
-
-            face_indices = np.array(mesh.GetFaceVertexIndicesAttr().Get(), dtype=np.int32)
-            face_counts = np.array(mesh.GetFaceVertexCountsAttr().Get(), dtype=np.int32)
-
-            o3d_mesh = TriangleMesh()
-            o3d_mesh.vertices = o3d.utility.Vector3dVector(transformed_points)
-
-            triangles = []
-            idx = 0
-            for count in face_counts:
-                if count == 3:
-                    triangles.append([face_indices[idx], face_indices[idx+1], face_indices[idx+2]])
-                elif count == 4:
-                    triangles.append([face_indices[idx], face_indices[idx+1], face_indices[idx+2]])
-                    triangles.append([face_indices[idx], face_indices[idx+2], face_indices[idx+3]])
-                idx += count
-            o3d_mesh.triangles = o3d.utility.Vector3iVector(triangles)
-
-            surface_area = compute_mesh_surface_area(o3d_mesh)
-            meshes.append((o3d_mesh, semantic_label))
-            surface_areas.append(surface_area)
-
-            min_x, min_y, min_z, max_x, max_y, max_z = compute_bounding_box(transformed_points)
-            bboxes.append((semantic_label, min_x, min_y, min_z, max_x, max_y, max_z))
-
-            semantic_label += 1
-
-    bbox_output_file = os.path.join(output_dir, 'bounding_boxes.txt')
-    with open(bbox_output_file, 'w') as f:
-        for bbox in bboxes:
-            f.write(' '.join(map(str, bbox)) + '\n')
-
-    total_area = sum(surface_areas)
-    if total_area == 0:
-        print("Total surface area is zero, cannot allocate points.")
-        return
-    point_allocations = [
-        int(num_points * (area / total_area)) for area in surface_areas
-    ]
-    point_allocations = [max(1, n) for n in point_allocations]
-    total_allocated = sum(point_allocations)
-    if total_allocated > num_points:
-        point_allocations = [
-            int(n * (num_points / total_allocated)) for n in point_allocations
-        ]
-        point_allocations = [max(1, n) for n in point_allocations]
-    elif total_allocated < num_points:
-        remaining = num_points - total_allocated
-        for i in range(remaining):
-            point_allocations[i % len(point_allocations)] += 1
-
-    transformed_bboxes = []
-    for (label, orig_min_x, orig_min_y, orig_min_z, orig_max_x, orig_max_y, orig_max_z) in bboxes:
-        x1 = -orig_min_x / 100.0
-        x2 = -orig_max_x / 100.0
-        new_min_x = min(x1, x2)
-        new_max_x = max(x1, x2)
-        
-        z1 = orig_min_y / 100.0
-        z2 = orig_max_y / 100.0
-        new_min_z = min(z1, z2)
-        new_max_z = max(z1, z2)
-        
-        y1 = orig_min_z / 100.0
-        y2 = orig_max_z / 100.0
-        new_min_y = min(y1, y2)
-        new_max_y = max(y1, y2)
-        
-        transformed_bboxes.append((label, new_min_x, new_min_y, new_min_z, new_max_x, new_max_y, new_max_z))
-
-    for (o3d_mesh, label), num_points_mesh in zip(meshes, point_allocations):
-        try:
-            pcd = o3d_mesh.sample_points_poisson_disk(number_of_points=num_points_mesh)
-        except Exception as e:
-            print(f"Poisson sampling failed for mesh {label}: {str(e)}, falling back to uniform sampling")
-            pcd = o3d_mesh.sample_points_uniformly(number_of_points=num_points_mesh)
 
-        points_np = np.asarray(pcd.points)
-        points_np[:, [1, 2]] = points_np[:, [2, 1]]
-        points_np[:, 0] = -points_np[:, 0]
-        points_np = points_np / 100.0
+def is_scene_complete(output_dir, output_format="txt", num_points=None):
+    files = point_file_names(output_format, num_points) + [BBOX_FILES[output_format], 'instances.json']
+    return all(os.path.exists(os.path.join(output_dir, f)) for f in files)
 
-        all_points.append(points_np)
-        all_labels.append(np.full(points_np.shape[0], label, dtype=int))
 
-    combined_points = np.vstack(all_points)
-    combined_labels = np.hstack(all_labels)
+_worker_state = {}
 
-    if len(combined_points) > num_points:
-        pcd = o3d.geometry.PointCloud()
-        pcd.points = o3d.utility.Vector3dVector(combined_points)
-        indices = np.random.choice(len(combined_points), num_points, replace=False)
-        combined_points = combined_points[indices]
-        combined_labels = combined_labels[indices]
 
-    labeled_point_cloud = np.column_stack((combined_points, combined_labels))
+def init_worker(num_points, sampler, output_format, cache_dir=None, cache_density=10000.0, meta_data=None, labels=None,
+                subset_order="random", population_mask=None):
+    asset_cache = AssetPointCache(cache_dir, density=cache_density) if cache_dir is not None else None
+    asset_labels, label_names = load_label_maps(meta_data, labels)
+    _worker_state.update(num_points=num_points, sampler=sampler, output_format=output_format, asset_cache=asset_cache,
+                         asset_labels=asset_labels, label_names=label_names, subset_order=subset_order,
+                         population_mask=population_mask)
 
-    output_file = os.path.join(output_dir, 'scene.txt')
-    np.savetxt(output_file, labeled_point_cloud)
 
-    if vis:
-        point_cloud = read_point_cloud_from_txt(output_file)
-        if point_cloud is not None:
-            visualize_with_open3d(point_cloud, transformed_bboxes, title="Labeled Point Cloud with Bounding Boxes")
+def process_scene(scene_dir, output_dir, scene_seed):
+    start = time.perf_counter()
+    profile = {}
+    try:
+        num_written = main(
+            input_folder=scene_dir,
+            num_points=_worker_state["num_points"],
+            output_dir=output_dir,
+            vis=False,
+            sampler=_worker_state["sampler"],
+            seed=scene_seed,
+            output_format=_worker_state["output_format"],
+            asset_cache=_worker_state["asset_cache"],
+            asset_labels=_worker_state["asset_labels"],
+            label_names=_worker_state["label_names"],
+            subset_order=_worker_state["subset_order"],
+            population_mask=_worker_state["population_mask"],
+            profile=profile
+        )
+        error = None if num_written else "no points written"
+    except Exception:
+        num_written = 0
+        error = traceback.format_exc()
+    return {
+        "scene": scene_dir, "points": num_written or 0, "seconds": time.perf_counter() - start,
+        "profile": profile, "error": error
+    }
+
+
+def run_batch(input_root, output_root, num_points, workers=None, sampler="blue_noise", seed=None, overwrite=False,
+              output_format="txt", cache_dir=None, cache_density=10000.0, meta_data=None, labels=None, subset_order="random",
+              population_mask=None):
+    """
+    Sample every scene folder (see find_scene_folders) below `input_root`
+    on a process pool, mirroring the folder layout under `output_root`. Scenes
+    whose outputs already exist are skipped unless `overwrite` is set. A summary
+    with throughput, the per-scene phase breakdown and failures is written to
+    output_root/batch_summary.json.
+    """
+    scenes = find_scene_folders(input_root)
+    tasks = []
+    skipped = 0
+    for scene_dir in scenes:
+        rel = os.path.relpath(scene_dir, input_root)
+        output_dir = os.path.normpath(os.path.join(output_root, rel))
+        if not overwrite and is_scene_complete(output_dir, output_format, num_points):
+            skipped += 1
+            continue
+        scene_seed = None if seed is None else [seed, zlib.crc32(rel.encode())]
+        tasks.append((scene_dir, output_dir, scene_seed))
+
+    results = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(num_points, sampler, output_format, cache_dir, cache_density, meta_data, labels,
+                                       subset_order, population_mask)) as pool:
+        futures = [pool.submit(process_scene, *task) for task in tasks]
+        for future in tqdm(as_completed(futures), total=len(futures)):
+            results.append(future.result())
+    elapsed = time.perf_counter() - start
+
+    failures = [r for r in results if r["error"] is not None]
+    total_points = sum(r["points"] for r in results)
+    summary = {
+        "input_root": input_root,
+        "num_scenes": len(scenes),
+        "processed": len(results) - len(failures),
+        "skipped": skipped,
+        "failed": len(failures),
+        "total_points": total_points,
+        "elapsed_seconds": elapsed,
+        "points_per_second": total_points / elapsed if elapsed > 0 else 0.0,
+        "scenes_per_second": len(results) / elapsed if elapsed > 0 else 0.0,
+        "phase_seconds": {phase: sum(r["profile"].get(phase, 0.0) for r in results) for phase in PROFILE_PHASES},
+        "scenes": [{"scene": r["scene"], "seconds": r["seconds"], "profile": r["profile"]} for r in results],
+        "failures": [{"scene": r["scene"], "error": r["error"]} for r in failures]
+    }
+    os.makedirs(output_root, exist_ok=True)
+    with open(os.path.join(output_root, 'batch_summary.json'), 'w') as f:
+        f.write(json.dumps(summary, indent=4))
+    print(f"Processed {summary['processed']} scenes, skipped {skipped}, failed {len(failures)}, "
+          f"{summary['points_per_second']:.0f} points/s")
+    print_profile(summary["phase_seconds"])
+    return summary
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Sample labeled point clouds from USDA files with 3D bounding boxes')
-    parser.add_argument('--input_folder', type=str, required=True, help='Path to input USDA folder')
-    parser.add_argument('--num_points', default=8192, type=int, help='Total number of points to sample from all objects')
+    parser.add_argument('--input_folder', type=str, default=None, help='Path to input USDA folder')
+    parser.add_argument('--input_root', type=str, default=None, help='Batch mode: sample every scene folder found recursively under this path')
+    parser.add_argument('--num_points', default=[8192], type=int, nargs='+', help='Total number of points to sample from all objects; several values export nested multi-resolution subsets in one pass')
+    parser.add_argument('--subset_order', type=str, default='random', choices=['random', 'fps'], help='Multi-resolution mode: random prefixes or farthest-point ordering of the nested subsets')
     parser.add_argument('--output_dir', type=str, required=True, help='Output directory for point clouds and bounding boxes')
     parser.add_argument('--vis', action='store_true', help='Visualize labeled point clouds with bounding boxes')
+    parser.add_argument('--sampler', type=str, default='blue_noise', choices=['uniform', 'blue_noise'], help='Surface sampling strategy')
+    parser.add_argument('--seed', type=int, default=None, help='Random seed for sampling')
+    parser.add_argument('--workers', type=int, default=None, help='Batch mode: number of worker processes')
+    parser.add_argument('--overwrite', action='store_true', help='Batch mode: resample scenes whose outputs already exist')
+    parser.add_argument('--format', type=str, default='txt', choices=['txt', 'npy', 'npz', 'ply'], help='Point cloud output format; binary formats write bounding_boxes.npy')
+    parser.add_argument('--asset_cache', type=str, default=None, help='Directory of per-asset local-space samples reused across scenes')
+    parser.add_argument('--cache_density', type=float, default=10000.0, help='Asset cache sampling density in points per square meter')
+    parser.add_argument('--population_mask', type=str, nargs='*', default=None, help='Only compose these prim paths of the scene stage, e.g. /imported_object')
+    parser.add_argument('--profile', action='store_true', help='Print the compose / traverse / transform / sample / write breakdown')
+    parser.add_argument('--meta_data', type=str, default='data/assets.json', help='Asset metadata providing the label of every asset id')
+    parser.add_argument('--labels', type=str, default='data/labels.json', help='Ordered class names; class ids index into this list')
     args = parser.parse_args()
-    main(
-        input_folder=args.input_folder,
-        num_points=args.num_points,
-        output_dir=args.output_dir,
-        vis=args.vis
-    )
+    if (args.input_folder is None) == (args.input_root is None):
+        parser.error('Exactly one of --input_folder and --input_root is required')
+
+    if args.input_root is not None:
+        run_batch(
+            input_root=args.input_root,
+            output_root=args.output_dir,
+            num_points=args.num_points,
+            workers=args.workers,
+            sampler=args.sampler,
+            seed=args.seed,
+            overwrite=args.overwrite,
+            output_format=args.format,
+            cache_dir=args.asset_cache,
+            cache_density=args.cache_density,
+            meta_data=args.meta_data,
+            labels=args.labels,
+            subset_order=args.subset_order,
+            population_mask=args.population_mask
+        )
+    else:
+        asset_labels, label_names = load_label_maps(args.meta_data, args.labels)
+        profile = {}
+        main(
+            input_folder=args.input_folder,
+            num_points=args.num_points,
+            output_dir=args.output_dir,
+            vis=args.vis,
+            sampler=args.sampler,
+            seed=args.seed,
+            output_format=args.format,
+            asset_cache=AssetPointCache(args.asset_cache, density=args.cache_density) if args.asset_cache else None,
+            asset_labels=asset_labels,
+            label_names=label_names,
+            subset_order=args.subset_order,
+            population_mask=args.population_mask,
+            profile=profile
+        )
+        if args.profile:
+            print_profile(profile)
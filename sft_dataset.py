@@ -1,5 +1,7 @@
 import os
 from utils.meta_data import read_json_file, save_json_file
+from utils.layout_dedup import cluster_near_duplicates, dedup_report, print_report
+from utils.layout_store import LayoutStore
 import numpy as np
 from tqdm import tqdm
 import json
@@ -45,11 +47,225 @@ Important Notes about Coordinate System:
 """
     return res
 
+def euler_to_matrix(euler):
+    # xformOp:rotateXYZ convention, column vectors: R = Rz @ Ry @ Rx
+    a, b, c = np.moveaxis(np.radians(euler), -1, 0)
+    ca, sa = np.cos(a), np.sin(a)
+    cb, sb = np.cos(b), np.sin(b)
+    cc, sc = np.cos(c), np.sin(c)
+    return np.stack([
+        np.stack([cc * cb, cc * sb * sa - sc * ca, cc * sb * ca + sc * sa], axis=-1),
+        np.stack([sc * cb, sc * sb * sa + cc * ca, sc * sb * ca - cc * sa], axis=-1),
+        np.stack([-sb, cb * sa, cb * ca], axis=-1)
+    ], axis=-2)
+
+
+def matrix_to_euler(mat):
+    sb = np.clip(-mat[..., 2, 0], -1.0, 1.0)
+    b = np.arcsin(sb)
+    gimbal = np.abs(sb) > 1.0 - 1e-9
+    a = np.where(gimbal, np.arctan2(-mat[..., 1, 2], mat[..., 1, 1]), np.arctan2(mat[..., 2, 1], mat[..., 2, 2]))
+    c = np.where(gimbal, 0.0, np.arctan2(mat[..., 1, 0], mat[..., 0, 0]))
+    return np.degrees(np.stack([a, b, c], axis=-1))
+
+
+def quat_multiply(q1, q2):
+    # quaternions stored as [x, y, z, w], same as the layout files
+    x1, y1, z1, w1 = np.moveaxis(q1, -1, 0)
+    x2, y2, z2, w2 = np.moveaxis(q2, -1, 0)
+    return np.stack([
+        w1 * x2 + x1 * w2 + y1 * z2 - z1 * y2,
+        w1 * y2 - x1 * z2 + y1 * w2 + z1 * x2,
+        w1 * z2 + x1 * y2 - y1 * x2 + z1 * w2,
+        w1 * w2 - x1 * x2 - y1 * y2 - z1 * z2
+    ], axis=-1)
+
+
+def sample_transforms(num_rooms, num_variants, rng, any_angle=False, mirror=True, translate=0.0):
+    shape = (num_rooms, num_variants)
+    if any_angle:
+        theta = rng.uniform(0.0, 2 * np.pi, size=shape)
+    else:
+        theta = rng.integers(0, 4, size=shape) * (np.pi / 2)
+    flip = rng.random(shape) < 0.5 if mirror else np.zeros(shape, dtype=bool)
+    offset = rng.uniform(0.0, translate, size=shape + (2,)) if translate > 0 else np.zeros(shape + (2,))
+    return theta, flip, offset
+
+
+def augment_rooms(rooms, num_variants, rng, any_angle=False, mirror=True, translate=0.0):
+    """
+    Apply K random rigid transforms (rotation about +Y, optional mirror across X,
+    optional translation) to every room at once.
+
+    Floor vertices and object positions are transformed as (N, 3) arrays, object
+    rotations are composed with the room transform and written back in the form
+    they were stored in (XYZ euler degrees or [x, y, z, w] quaternion). bbox and
+    scale live in the asset frame and are left untouched. Each variant is shifted
+    so that the floor starts at the origin again, then offset by up to `translate`
+    meters on X/Z.
+
+    Returns a list (one entry per room) of K augmented room dicts.
+    """
+    num_rooms = len(rooms)
+    theta, flip, offset = sample_transforms(num_rooms, num_variants, rng, any_angle, mirror, translate)
+
+    cos, sin = np.cos(theta), np.sin(theta)
+    sign = np.where(flip, -1.0, 1.0)
+    # A = Ry(theta) @ diag(sign, 1, 1)
+    transforms = np.zeros((num_rooms, num_variants, 3, 3))
+    transforms[..., 0, 0] = cos * sign
+    transforms[..., 0, 2] = sin
+    transforms[..., 1, 1] = 1.0
+    transforms[..., 2, 0] = -sin * sign
+    transforms[..., 2, 2] = cos
+    rot_y = transforms.copy()
+    rot_y[..., :, 0] *= sign[..., None]
+
+    mesh_xyz = [np.asarray(m["xyz"], dtype=np.float64).reshape(-1, 3) for room in rooms for m in room["meshes"]]
+    mesh_counts = np.array([len(xyz) for xyz in mesh_xyz], dtype=int)
+    mesh_room = np.repeat(np.arange(num_rooms), [len(room["meshes"]) for room in rooms])
+    vert_room = np.repeat(mesh_room, mesh_counts)
+    verts = np.concatenate(mesh_xyz) if mesh_xyz else np.zeros((0, 3))
+    verts = np.einsum('vkij,vj->vki', transforms[vert_room], verts)
+
+    # rooms without floor vertices are not re-anchored; reduceat needs non-empty segments
+    room_verts = np.bincount(vert_room, minlength=num_rooms)
+    has_verts = room_verts > 0
+    shift = np.zeros((num_rooms, num_variants, 3))
+    if has_verts.any():
+        room_starts = np.cumsum(room_verts) - room_verts
+        shift[has_verts] = -np.minimum.reduceat(verts, room_starts[has_verts], axis=0)
+    shift[..., 1] = 0.0
+    shift[..., [0, 2]] += offset
+    verts += shift[vert_room]
+
+    objects = [obj for room in rooms for obj in room["objects"]]
+    obj_room = np.repeat(np.arange(num_rooms), [len(room["objects"]) for room in rooms])
+    positions = np.asarray([obj["position"] for obj in objects], dtype=np.float64).reshape(-1, 3)
+    positions = np.einsum('okij,oj->oki', transforms[obj_room], positions) + shift[obj_room]
+
+    rot_len = np.array([len(obj["rotation"]) for obj in objects], dtype=int)
+    rotations = np.full((len(objects), num_variants, 4), np.nan)
+
+    is_euler = np.flatnonzero(rot_len == 3)
+    if len(is_euler):
+        euler = np.asarray([objects[i]["rotation"] for i in is_euler], dtype=np.float64)
+        room_idx = obj_room[is_euler]
+        # diag(-1, 1, 1) @ R @ diag(-1, 1, 1) negates the Y and Z euler angles
+        euler = euler[:, None, :] * np.where(flip[room_idx][..., None], [1.0, -1.0, -1.0], 1.0)
+        rotations[is_euler, :, :3] = matrix_to_euler(rot_y[room_idx] @ euler_to_matrix(euler))
+
+    is_quat = np.flatnonzero(rot_len == 4)
+    if len(is_quat):
+        quat = np.asarray([objects[i]["rotation"] for i in is_quat], dtype=np.float64)
+        room_idx = obj_room[is_quat]
+        quat = quat[:, None, :] * np.where(flip[room_idx][..., None], [1.0, -1.0, -1.0, 1.0], 1.0)
+        half = theta[room_idx] / 2
+        quat_y = np.stack([np.zeros_like(half), np.sin(half), np.zeros_like(half), np.cos(half)], axis=-1)
+        rotations[is_quat] = quat_multiply(quat_y, quat)
+
+    res = []
+    vert_offsets = np.concatenate([[0], np.cumsum(mesh_counts)])
+    mesh_idx = 0
+    obj_idx = 0
+    for r, room in enumerate(rooms):
+        variants = []
+        for k in range(num_variants):
+            meshes = []
+            for i, mesh in enumerate(room["meshes"]):
+                m = mesh_idx + i
+                new_mesh = dict(mesh, xyz=verts[vert_offsets[m]:vert_offsets[m + 1], k].tolist())
+                if flip[r, k] and "faces" in mesh:
+                    new_mesh["faces"] = [face[::-1] for face in mesh["faces"]]
+                meshes.append(new_mesh)
+            objs = [
+                dict(obj, position=pos, rotation=rot[:n] if n in (3, 4) else obj["rotation"])
+                for obj, pos, rot, n in zip(
+                    room["objects"],
+                    positions[obj_idx:obj_idx + len(room["objects"]), k].tolist(),
+                    rotations[obj_idx:obj_idx + len(room["objects"]), k].tolist(),
+                    rot_len[obj_idx:obj_idx + len(room["objects"])]
+                )
+            ]
+            variants.append(dict(room, meshes=meshes, objects=objs))
+        res.append(variants)
+        mesh_idx += len(room["meshes"])
+        obj_idx += len(room["objects"])
+    return res
+
+
+def iter_chunks(items, chunk_size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def build_sample(room, query):
+    obj = {}
+    inf = {}
+
+    floor = room["meshes"][0]["xyz"]
+    mesh = []
+    for i in range(len(floor)):
+        mesh.append([round(num, 2) for num in floor[i]])
+    obj["Floor"] = {"xyz": mesh}
+    random.shuffle(room["objects"])
+    for d in room["objects"]:
+        id = d["roomId"]
+        label = d['category']
+        path = d['object_path']
+        obj_name = d['object_name']
+        if label == None:
+            continue
+        pos = d["position"]
+        rot = d["rotation"]
+        bbox = d["bbox"]
+        scale = d["scale"]
+        pos = [round(num, 2) for num in pos]
+        rot = [round(num, 2) for num in rot]
+        bbox = [round(bbox[num] * scale[num], 2) for num in range(len(bbox))]
+        description = query[d["assetId"]]["meta_data"]["description"]
+
+        if not label in obj.keys():
+            obj[label] = []
+        if not label in inf.keys():
+            inf[label] = []
+        inf[label].append({"bbox": bbox, "description": description})
+        obj[label].append({"position": pos, "rotation": rot})
+
+    mes = {"messages": []}
+    room_type = room["objects"][0]["roomId"]
+    if room_type == "OtherRoom":
+        return None
+
+    prompt = get_prompt(inf, room_type)
+    res2 = {"role": "user", "content": str(prompt)}
+    res3 = {"role": "assistant", "content": str(obj)}
+    mes["messages"].append(res2)
+    mes["messages"].append(res3)
+    return mes
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument('--input_folder', type=str, default="data/layout")
+    parser.add_argument('--store', type=str, default=None, help="Read layouts from a packed layout store instead of --input_folder")
     parser.add_argument('--meta_data', default="data/assets.json")
     parser.add_argument('--dataset', type=str, default='IL3D', choices=['FRONT3d', 'HSSD', 'IL3D'])
+    parser.add_argument('--augment', type=int, default=0, help="Number of augmented variants to emit per room")
+    parser.add_argument('--aug_any_angle', action='store_true', help="Rotate by arbitrary angles instead of multiples of 90 degrees")
+    parser.add_argument('--aug_no_mirror', action='store_true', help="Disable mirrored variants")
+    parser.add_argument('--aug_translate', type=float, default=0.0, help="Max random X/Z offset of augmented rooms in meters")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--chunk_size', type=int, default=1024, help="Rooms read and augmented at a time")
+    parser.add_argument('--dedup', action='store_true', help="Keep one representative per cluster of near-duplicate layouts")
+    parser.add_argument('--dedup_threshold', type=float, default=0.8, help="Estimated Jaccard similarity to merge two layouts")
+    parser.add_argument('--dedup_report', type=str, default=None, help="Path to save the dedup report")
     args = parser.parse_args()
 
     dataset = "SFT_" + args.dataset
@@ -70,52 +286,51 @@ if __name__ == "__main__":
 
     os.makedirs(dataset, exist_ok=True)
 
-    rooms = os.listdir(room_path)
-    for r in tqdm(rooms):
-        room = read_json_file(os.path.join(room_path, r))
-        if room["dataset"] in det:
-            obj = {}
-            inf = {}
-
-            floor = room["meshes"][0]["xyz"]
-            mesh = []
-            for i in range(len(floor)):
-                mesh.append([round(num, 2) for num in floor[i]])
-            obj["Floor"] = {"xyz": mesh}
-            random.shuffle(room["objects"])
-            for d in room["objects"]:
-                id = d["roomId"]
-                label = d['category']
-                path = d['object_path']
-                obj_name = d['object_name']
-                if label == None:
+    def iter_rooms():
+        if args.store is not None:
+            with LayoutStore(args.store, readonly=True) as store:
+                yield from tqdm(store.iter_rooms(dataset=det), total=store.count(dataset=det))
+        else:
+            for r in tqdm(sorted(os.listdir(room_path))):
+                room = read_json_file(os.path.join(room_path, r))
+                if room["dataset"] in det:
+                    yield r.split(".")[0], room
+
+    # dedup needs every layout, but only its shingles are held in memory
+    kept = None
+    if args.dedup:
+        names, datasets = [], []
+
+        def scan():
+            for name, room in iter_rooms():
+                names.append(name)
+                datasets.append(room["dataset"])
+                yield room
+
+        labels = cluster_near_duplicates(scan(), threshold=args.dedup_threshold, seed=args.seed)
+        report = dedup_report(names, datasets, labels)
+        print_report(report)
+        if args.dedup_report is not None:
+            save_json_file(report, args.dedup_report)
+        kept = {names[i] for i in np.flatnonzero(labels == np.arange(len(names)))}
+
+    rng = np.random.default_rng(args.seed)
+    rooms = ((name, room) for name, room in iter_rooms() if kept is None or name in kept)
+    for chunk in iter_chunks(rooms, args.chunk_size):
+        samples = [[(name, room)] for name, room in chunk]
+        if args.augment > 0:
+            variants = augment_rooms(
+                [room for _, room in chunk], args.augment, rng,
+                any_angle=args.aug_any_angle,
+                mirror=not args.aug_no_mirror,
+                translate=args.aug_translate
+            )
+            for group, (name, _), room_variants in zip(samples, chunk, variants):
+                group += [(f"{name}_aug{k}", v) for k, v in enumerate(room_variants)]
+
+        for group in samples:
+            for name, room in group:
+                mes = build_sample(room, query)
+                if mes is None:
                     continue
-                pos = d["position"]
-                rot = d["rotation"]
-                bbox = d["bbox"]
-                scale = d["scale"]
-                pos = [round(num, 2) for num in pos]
-                rot = [round(num, 2) for num in rot]
-                bbox = [round(bbox[num] * scale[num], 2) for num in range(len(bbox))]
-                description = query[d["assetId"]]["meta_data"]["description"]
-
-                if not label in obj.keys():
-                    obj[label] = []
-                if not label in inf.keys():
-                    inf[label] = []
-                inf[label].append({"bbox": bbox, "description": description})
-                obj[label].append({"position": pos, "rotation": rot})
-
-            
-            mes = {"messages": []}
-            room_type = room["objects"][0]["roomId"]
-            if room_type == "OtherRoom":
-                continue
-            
-            prompt = get_prompt(inf, room_type)
-            res2 = {"role": "user", "content": str(prompt)}
-            res3 = {"role": "assistant", "content": str(obj)}
-            mes["messages"].append(res2)
-            mes["messages"].append(res3)
-            mes_name = r.split(".")[0] + ".json"
-            save_json_file(mes, os.path.join(dataset, mes_name))
+                save_json_file(mes, os.path.join(dataset, name + ".json"))
@@ -0,0 +1,200 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import base64
+import threading
+import pytest
+from io import BytesIO
+
+pytest.importorskip("openai")
+web = pytest.importorskip("aiohttp.web")
+from PIL import Image
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+# metrics modules import each other script-style
+sys.path.insert(0, os.path.join(ROOT, "metrics"))
+import gpt_rating
+import gpt_runner
+from image_payload import ImagePayloads
+
+RATING = {d: {"Score": 7, "Comment": "ok"} for d in gpt_rating.DIMENSIONS}
+
+
+class MockServer:
+    """
+    OpenAI-compatible /v1/chat/completions on a background event loop. The
+    reply to each request is taken from `script(prompt text, attempt)`: an HTTP
+    status, or the message content to return with 200.
+    """
+
+    def __init__(self, script, delay=0.02):
+        self.script = script
+        self.delay = delay
+        self.attempts = {}
+        self.bodies = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.loop = asyncio.new_event_loop()
+        self.ready = threading.Event()
+        self.thread = threading.Thread(target=self.serve, daemon=True)
+
+    async def completions(self, request):
+        body = await request.json()
+        self.bodies.append(body)
+        text = body["messages"][0]["content"][0]["text"]
+        attempt = self.attempts[text] = self.attempts.get(text, -1) + 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        reply = self.script(text, attempt)
+        if isinstance(reply, int):
+            return web.json_response({"error": {"message": "mock error"}}, status=reply, headers={"retry-after": "0"})
+        return web.json_response({
+            "id": "mock", "object": "chat.completion", "created": 0, "model": body["model"],
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": reply}}]
+        })
+
+    def serve(self):
+        asyncio.set_event_loop(self.loop)
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", self.completions)
+        self.runner = web.AppRunner(app)
+        self.loop.run_until_complete(self.runner.setup())
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        self.loop.run_until_complete(site.start())
+        self.port = site._server.sockets[0].getsockname()[1]
+        self.ready.set()
+        self.loop.run_forever()
+
+    def __enter__(self):
+        self.thread.start()
+        self.ready.wait(10)
+        return f"http://127.0.0.1:{self.port}/v1"
+
+    def __exit__(self, *exc):
+        asyncio.run_coroutine_threadsafe(self.runner.cleanup(), self.loop).result(10)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(10)
+
+
+def make_scenes(root, count):
+    jobs = []
+    for i in range(count):
+        scene_dir = os.path.join(root, "model", "bedroom", str(i))
+        os.makedirs(scene_dir)
+        for view in gpt_rating.VIEW_FILES:
+            Image.new("RGB", (64, 64), (i, 0, 0)).save(os.path.join(scene_dir, view))
+        jobs.append((scene_dir, f"scene {i}", None))
+    return jobs
+
+
+def rate(jobs, base_url, **options):
+    options = dict(dict(concurrency=3, requests_per_minute=6000, burst=10, base_delay=0.01), **options)
+    return gpt_runner.rate_scenes(jobs, base_url=base_url, api_key="test", **options)
+
+
+def test_retries_rate_limits_and_persists(tmp_path):
+    def script(text, attempt):
+        # every scene is rate limited once and answers unparsable text once
+        return [429, "not json", "```json\n" + json.dumps(RATING) + "\n```"][min(attempt, 2)]
+
+    jobs = make_scenes(str(tmp_path), 8)
+    with MockServer(script) as base_url:
+        results, stats = rate(jobs, base_url)
+    assert results == [RATING] * len(jobs)
+    assert stats == {"requests": 3 * len(jobs), "retries": 2 * len(jobs)}
+    for scene_dir, input_text, _ in jobs:
+        with open(os.path.join(scene_dir, "gpt_rating.json")) as f:
+            assert json.load(f) == {"params": gpt_rating.rating_params(scene_dir, input_text), "rating": RATING}
+
+    # persisted ratings are not requested again
+    with MockServer(lambda text, attempt: 500) as base_url:
+        results, stats = rate(jobs, base_url)
+    assert results == [RATING] * len(jobs) and stats["requests"] == 0
+
+
+def test_persisted_rating_needs_matching_inputs(tmp_path):
+    other = dict(RATING, **{"Object Pose": {"Score": 3, "Comment": "new"}})
+    jobs = make_scenes(str(tmp_path), 3)
+    with MockServer(lambda text, attempt: json.dumps(RATING)) as base_url:
+        rate(jobs, base_url)
+
+    # a bare rating without the inputs it was made from is not trusted
+    with open(os.path.join(jobs[0][0], "gpt_rating.json"), "w") as f:
+        json.dump(RATING, f)
+    # another prompt or another model re-rates the scene
+    jobs[1] = (jobs[1][0], "scene 1, reworded", None)
+    with MockServer(lambda text, attempt: json.dumps(other)) as base_url:
+        results, stats = rate(jobs, base_url)
+    assert results == [other, other, RATING] and stats["requests"] == 2
+    with MockServer(lambda text, attempt: json.dumps(other)) as base_url:
+        results, stats = rate(jobs, base_url, model="another-model")
+    assert results == [other] * 3 and stats["requests"] == 3
+
+
+def test_bounded_concurrency_and_failures(tmp_path):
+    def script(text, attempt):
+        return 400 if text == "scene 0" else json.dumps(RATING)
+
+    jobs = make_scenes(str(tmp_path), 10)
+    server = MockServer(script, delay=0.05)
+    with server as base_url:
+        results, stats = rate(jobs, base_url, concurrency=3)
+    assert 1 < server.max_in_flight <= 3
+    # client errors are not retried
+    assert isinstance(results[0], Exception) and stats["requests"] == len(jobs)
+    assert not os.path.exists(os.path.join(jobs[0][0], "gpt_rating.json"))
+    assert results[1:] == [RATING] * (len(jobs) - 1)
+
+
+def test_token_bucket_spaces_requests():
+    async def acquire_all(bucket, count):
+        start = time.monotonic()
+        for _ in range(count):
+            await bucket.acquire()
+        return time.monotonic() - start
+
+    # a burst of 2, then one token every 50 ms
+    elapsed = asyncio.run(acquire_all(gpt_runner.TokenBucket(20.0, 2.0), 6))
+    assert 0.19 <= elapsed < 0.5
+
+
+def test_tiled_payloads_are_cached(tmp_path):
+    jobs = make_scenes(str(tmp_path / "scenes"), 3)
+    payload = ImagePayloads(max_size=16, quality=60, tile=True, cache_dir=str(tmp_path / "payloads"))
+    server = MockServer(lambda text, attempt: json.dumps(RATING))
+    with server as base_url:
+        results, _ = rate(jobs, base_url, payload=payload)
+    assert results == [RATING] * len(jobs)
+    for body in server.bodies:
+        content = body["messages"][0]["content"]
+        assert [part["type"] for part in content] == ["text", "text", "image_url"]
+        assert content[1]["text"] == gpt_rating.TILE_NOTE
+        image = Image.open(BytesIO(base64.b64decode(content[2]["image_url"]["url"].split(",", 1)[1])))
+        assert image.size == (32, 32)
+
+    image_paths = [os.path.join(jobs[0][0], view) for view in gpt_rating.VIEW_FILES]
+    assert os.path.exists(tmp_path / "payloads" / "file_hashes.json")
+    cached = ImagePayloads(max_size=16, quality=60, tile=True, cache_dir=str(tmp_path / "payloads"))
+    # served from disk without decoding the views again
+    cached.encode_uncached = None
+    assert cached.encode(image_paths) == payload.encode_uncached(image_paths)
+
+
+def test_changed_image_settings_rerate(tmp_path):
+    jobs = make_scenes(str(tmp_path), 2)
+    with MockServer(lambda text, attempt: json.dumps(RATING)) as base_url:
+        _, stats = rate(jobs, base_url, payload=ImagePayloads(max_size=32))
+        assert stats["requests"] == 2
+        _, stats = rate(jobs, base_url, payload=ImagePayloads(max_size=32))
+        assert stats["requests"] == 0
+        for payload in (ImagePayloads(max_size=16), ImagePayloads(max_size=16, tile=True),
+                        ImagePayloads(max_size=16, tile=True, detail="low")):
+            _, stats = rate(jobs, base_url, payload=payload)
+            assert stats["requests"] == 2
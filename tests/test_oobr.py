@@ -0,0 +1,192 @@
+import os
+import sys
+import numpy as np
+import pytest
+
+pytest.importorskip("pxr")
+from pxr import Gf, Sdf, Usd, UsdGeom, UsdUtils
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+# metrics modules import each other script-style
+sys.path.insert(0, os.path.join(ROOT, "metrics"))
+from metrics import oobr
+
+
+def reference_ratios(bboxes, floor_bounds):
+    """The original per-object / double-loop implementation of analyze_usd_files."""
+    total_bbox_volume = 0.0
+    for bbox in bboxes:
+        total_bbox_volume += oobr.calculate_bbox_volume(bbox)
+    oob_count = sum(1 for bbox in bboxes if oobr.is_outside(bbox, floor_bounds))
+    total_intersection_volume = 0.0
+    for i in range(len(bboxes)):
+        for j in range(i + 1, len(bboxes)):
+            total_intersection_volume += oobr.calculate_intersection_volume(bboxes[i], bboxes[j])
+    oor_ratio = total_intersection_volume / total_bbox_volume if total_bbox_volume > 1e-9 else 0.0
+    return oob_count / len(bboxes), oor_ratio
+
+
+def vectorized_ratios(bboxes, floor_bounds, method):
+    boxes = oobr.stack_bboxes(bboxes)
+    total_bbox_volume = float(np.cumsum(oobr.bbox_volumes(boxes))[-1])
+    intersection_volume = oobr.total_intersection_volume(boxes, method)
+    oor_ratio = intersection_volume / total_bbox_volume if total_bbox_volume > 1e-9 else 0.0
+    return int(oobr.outside_mask(boxes, floor_bounds).sum()) / len(bboxes), oor_ratio
+
+
+def random_bboxes(rng, n):
+    lower = rng.uniform(-400, 400, size=(n, 3))
+    size = rng.uniform(0, 150, size=(n, 3))
+    # exact duplicates, touching faces and zero-thickness boxes
+    lower[1::7], size[1::7] = lower[0:n - 1:7], size[0:n - 1:7]
+    lower[3::11, 0] = lower[2:n - 1:11, 0] + size[2:n - 1:11, 0]
+    size[4::13, 1] = 0.0
+    upper = lower + size
+    return [(Gf.Vec3d(*lo), Gf.Vec3d(*hi)) for lo, hi in zip(lower, upper)]
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("method", ["matrix", "sweep"])
+def test_vectorized_ratios_match_reference(seed, method):
+    rng = np.random.default_rng(seed)
+    bboxes = random_bboxes(rng, 80)
+    floor_bounds = (-300.0, 300.0, -250.0, 250.0, 0.0)
+    assert vectorized_ratios(bboxes, floor_bounds, method) == reference_ratios(bboxes, floor_bounds)
+
+
+def test_sweep_finds_all_overlapping_pairs():
+    rng = np.random.default_rng(7)
+    boxes = oobr.stack_bboxes(random_bboxes(rng, 300))
+    i, j = oobr.sweep_and_prune_pairs(boxes)
+    volumes = oobr.intersection_volume_matrix(boxes)
+    expected = set(zip(*np.nonzero(np.triu(volumes, k=1))))
+    assert expected <= set(zip(i.tolist(), j.tolist()))
+
+
+def make_asset(path, size):
+    stage = Usd.Stage.CreateNew(path)
+    root = UsdGeom.Xform.Define(stage, "/Root")
+    stage.SetDefaultPrim(root.GetPrim())
+    mesh = UsdGeom.Mesh.Define(stage, "/Root/box")
+    points = [(x * size[0], y * size[1], z * size[2]) for x in (0, 1) for y in (0, 1) for z in (0, 1)]
+    mesh.CreatePointsAttr([Gf.Vec3f(*p) for p in points])
+    faces = [[0, 1, 3, 2], [4, 6, 7, 5], [0, 4, 5, 1], [2, 3, 7, 6], [0, 2, 6, 4], [1, 5, 7, 3]]
+    mesh.CreateFaceVertexCountsAttr([4] * 6)
+    mesh.CreateFaceVertexIndicesAttr([i for f in faces for i in f])
+    stage.Save()
+    usdz = path.replace(".usdc", ".usdz")
+    UsdUtils.CreateNewUsdzPackage(Sdf.AssetPath(path), usdz)
+    return usdz
+
+
+def test_analyze_usd_files_matches_reference(tmp_path):
+    asset = make_asset(str(tmp_path / "box.usdc"), (60.0, 80.0, 40.0))
+    rng = np.random.default_rng(3)
+    stage = Usd.Stage.CreateNew(str(tmp_path / "object.usda"))
+    stage.SetDefaultPrim(stage.DefinePrim("/Root"))
+    for k in range(25):
+        prim = stage.DefinePrim(f"/Root/obj_{k}")
+        prim.GetReferences().AddReference(asset)
+        xform = UsdGeom.Xformable(prim)
+        xform.AddTranslateOp().Set(Gf.Vec3d(*rng.uniform(-250, 250, size=3)))
+        xform.AddRotateXYZOp().Set(Gf.Vec3f(0, float(rng.uniform(0, 360)), 0))
+    stage.Save()
+    floor = Usd.Stage.CreateNew(str(tmp_path / "floor.usda"))
+    mesh = UsdGeom.Mesh.Define(floor, "/Root/floor")
+    mesh.CreatePointsAttr([Gf.Vec3f(-200, 0, -150), Gf.Vec3f(200, 0, -150), Gf.Vec3f(-200, 0, 150), Gf.Vec3f(200, 0, 150)])
+    mesh.CreateFaceVertexCountsAttr([3, 3])
+    mesh.CreateFaceVertexIndicesAttr([0, 1, 2, 1, 3, 2])
+    floor.Save()
+
+    objects_stage = Usd.Stage.Open(str(tmp_path / "object.usda"))
+    objects = oobr.get_usdz_objects(objects_stage)
+    bboxes = [oobr.get_bbox(prim) for prim in objects]
+    assert len(bboxes) == 25
+    expected = reference_ratios(bboxes, (-200.0, 200.0, -150.0, 150.0, 0.0))
+    for method in ("matrix", "sweep"):
+        assert oobr.analyze_usd_files(str(tmp_path / "object.usda"), str(tmp_path / "floor.usda"), method) == expected
+
+
+def test_mesh_mode_ignores_empty_aabb_overlap(tmp_path):
+    pytest.importorskip("open3d")
+    from mesh_collision import AssetMeshCache
+
+    # an L-shaped asset (two 100 x 20 x 20 arms) and a copy turned 180 degrees into its notch:
+    # the AABBs overlap by half, the meshes only in two 20^3 corners
+    asset_stage = Usd.Stage.CreateNew(str(tmp_path / "l.usdc"))
+    asset_stage.SetDefaultPrim(UsdGeom.Xform.Define(asset_stage, "/Root").GetPrim())
+    faces = [[0, 1, 3, 2], [4, 6, 7, 5], [0, 4, 5, 1], [2, 3, 7, 6], [0, 2, 6, 4], [1, 5, 7, 3]]
+    for name, lower, upper in (("a", (0, 0, 0), (100, 20, 20)), ("b", (0, 0, 20), (20, 20, 100))):
+        mesh = UsdGeom.Mesh.Define(asset_stage, f"/Root/{name}")
+        mesh.CreatePointsAttr([Gf.Vec3f(x, y, z) for x in (lower[0], upper[0]) for y in (lower[1], upper[1]) for z in (lower[2], upper[2])])
+        mesh.CreateFaceVertexCountsAttr([4] * 6)
+        mesh.CreateFaceVertexIndicesAttr([i for f in faces for i in f])
+    asset_stage.Save()
+    asset = str(tmp_path / "l.usdz")
+    UsdUtils.CreateNewUsdzPackage(Sdf.AssetPath(str(tmp_path / "l.usdc")), asset)
+
+    stage = Usd.Stage.CreateNew(str(tmp_path / "object.usda"))
+    stage.SetDefaultPrim(stage.DefinePrim("/Root"))
+    for k, (translate, angle) in enumerate((((0, 0, 0), 0), ((100, 0, 100), 180))):
+        prim = stage.DefinePrim(f"/Root/obj_{k}")
+        prim.GetReferences().AddReference(asset)
+        xform = UsdGeom.Xformable(prim)
+        xform.AddTranslateOp().Set(Gf.Vec3d(*translate))
+        xform.AddRotateXYZOp().Set(Gf.Vec3f(0, angle, 0))
+    stage.Save()
+    floor = Usd.Stage.CreateNew(str(tmp_path / "floor.usda"))
+    mesh = UsdGeom.Mesh.Define(floor, "/Root/floor")
+    mesh.CreatePointsAttr([Gf.Vec3f(-200, 0, -200), Gf.Vec3f(200, 0, -200), Gf.Vec3f(-200, 0, 200), Gf.Vec3f(200, 0, 200)])
+    mesh.CreateFaceVertexCountsAttr([3, 3])
+    mesh.CreateFaceVertexIndicesAttr([0, 1, 2, 1, 3, 2])
+    floor.Save()
+
+    objects_file, floor_file = str(tmp_path / "object.usda"), str(tmp_path / "floor.usda")
+    assert oobr.analyze_usd_files(objects_file, floor_file)[1] == pytest.approx(0.5)
+    cache = AssetMeshCache(str(tmp_path / "cache"))
+    _, oor = oobr.analyze_usd_files(objects_file, floor_file, "mesh", cache)
+    assert oor == pytest.approx(2 * 20 ** 3 / (2 * 72000), rel=0.05)
+    assert os.listdir(tmp_path / "cache")
+    _, cached_oor = oobr.analyze_usd_files(objects_file, floor_file, "mesh", AssetMeshCache(str(tmp_path / "cache")))
+    assert cached_oor == oor
+
+
+def test_mesh_mode_uses_aabb_of_open_meshes(tmp_path, capsys):
+    from mesh_collision import AssetMeshCache, is_watertight, triangulate_faces
+
+    faces = [[0, 1, 3, 2], [4, 6, 7, 5], [0, 4, 5, 1], [2, 3, 7, 6], [0, 2, 6, 4], [1, 5, 7, 3]]
+    vertices = np.array([(x, y, z) for x in (0, 1) for y in (0, 1) for z in (0, 1)], dtype=float)
+    assert is_watertight(vertices, triangulate_faces([4] * 6, [i for f in faces for i in f]))
+    # a 100 x 20 x 20 box without its top encloses nothing, so it is scored by its AABB
+    open_faces = faces[:3] + faces[4:]
+    assert not is_watertight(vertices, triangulate_faces([4] * 5, [i for f in open_faces for i in f]))
+    asset_stage = Usd.Stage.CreateNew(str(tmp_path / "open.usdc"))
+    asset_stage.SetDefaultPrim(UsdGeom.Xform.Define(asset_stage, "/Root").GetPrim())
+    mesh = UsdGeom.Mesh.Define(asset_stage, "/Root/box")
+    mesh.CreatePointsAttr([Gf.Vec3f(100 * x, 20 * y, 20 * z) for x, y, z in vertices])
+    mesh.CreateFaceVertexCountsAttr([4] * 5)
+    mesh.CreateFaceVertexIndicesAttr([i for f in open_faces for i in f])
+    asset_stage.Save()
+    asset = str(tmp_path / "open.usdz")
+    UsdUtils.CreateNewUsdzPackage(Sdf.AssetPath(str(tmp_path / "open.usdc")), asset)
+
+    stage = Usd.Stage.CreateNew(str(tmp_path / "object.usda"))
+    stage.SetDefaultPrim(stage.DefinePrim("/Root"))
+    for k in range(2):
+        prim = stage.DefinePrim(f"/Root/obj_{k}")
+        prim.GetReferences().AddReference(asset)
+        UsdGeom.Xformable(prim).AddTranslateOp().Set(Gf.Vec3d(50 * k, 0, 0))
+    stage.Save()
+    floor = Usd.Stage.CreateNew(str(tmp_path / "floor.usda"))
+    mesh = UsdGeom.Mesh.Define(floor, "/Root/floor")
+    mesh.CreatePointsAttr([Gf.Vec3f(-200, 0, -200), Gf.Vec3f(200, 0, -200), Gf.Vec3f(-200, 0, 200), Gf.Vec3f(200, 0, 200)])
+    mesh.CreateFaceVertexCountsAttr([3, 3])
+    mesh.CreateFaceVertexIndicesAttr([0, 1, 2, 1, 3, 2])
+    floor.Save()
+
+    cache = AssetMeshCache(str(tmp_path / "cache"))
+    _, oor = oobr.analyze_usd_files(str(tmp_path / "object.usda"), str(tmp_path / "floor.usda"), "mesh", cache)
+    assert oor == pytest.approx(50 * 20 * 20 / (2 * 100 * 20 * 20), rel=0.01)
+    assert "not watertight" in capsys.readouterr().out
+    assert not AssetMeshCache(str(tmp_path / "cache")).get(asset).watertight
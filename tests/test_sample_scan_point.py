@@ -0,0 +1,36 @@
+import os
+import sys
+import numpy as np
+import pytest
+
+pytest.importorskip("pxr")
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+import sample_scan_point as ssp
+
+
+def nearest_neighbour_distances(points):
+    d2 = ((points[:, None] - points[None]) ** 2).sum(axis=-1)
+    np.fill_diagonal(d2, np.inf)
+    return np.sqrt(d2.min(axis=1))
+
+
+def test_blue_noise_has_poisson_disk_spacing():
+    # a 100 x 100 plane
+    vertices = np.array([[0, 0, 0], [100, 0, 0], [0, 100, 0], [100, 100, 0]], dtype=float)
+    triangles = np.array([[0, 1, 2], [1, 3, 2]])
+    uniform, _ = ssp.sample_scene(vertices, triangles, np.array([0, 0]), 4000, sampler="uniform", rng=0)
+    blue_noise, _ = ssp.sample_scene(vertices, triangles, np.array([0, 0]), 4000, sampler="blue_noise", rng=0)
+    assert len(blue_noise) == 4000
+
+    # 2 * r_max, the spacing of 4000 points packed densely on the plane
+    d_max = 2 * np.sqrt(100 * 100 / (2 * np.sqrt(3) * 4000))
+    uniform_nn, blue_noise_nn = nearest_neighbour_distances(uniform), nearest_neighbour_distances(blue_noise)
+    assert blue_noise_nn.min() > 0.6 * d_max > 100 * uniform_nn.min()
+    assert np.percentile(blue_noise_nn, 1) > 0.6 * d_max > 5 * np.percentile(uniform_nn, 1)
+    assert blue_noise_nn.std() / blue_noise_nn.mean() < 0.5 * uniform_nn.std() / uniform_nn.mean()
+
+    # split into two meshes, each keeps exactly its share
+    _, point_mesh = ssp.sample_scene(vertices, triangles, np.array([0, 1]), 4001, sampler="blue_noise", rng=0)
+    assert np.bincount(point_mesh).tolist() == [2001, 2000]
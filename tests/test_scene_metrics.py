@@ -0,0 +1,56 @@
+import os
+import sys
+import json
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+# metrics modules import each other script-style
+sys.path.insert(0, os.path.join(ROOT, "metrics"))
+import scene_metrics
+
+# an assets.json entry as written by the asset pipeline (see retrieve/insert_asset.py)
+ARMCHAIR = {
+    "dataset": "3D-FRONT",
+    "model_id": "f89da2db-ad8c-4582-b186-ed2a46f3cb15",
+    "category": "armchair",
+    "meta_data": {
+        "category": "chair", "synset": "chair.n.01",
+        "width": 0.641075998544693, "length": 0.9789590239524841, "height": 0.7714189887046814,
+        "volume": 0.4841326320913875, "mass": 5, "frontview": 0,
+        "description": "A modern armchair with a tufted backrest and metal legs.",
+        "materials": ["fabric", "metal"],
+        "onCeiling": False, "onWall": False, "onFloor": True, "onObject": False,
+        "scale": [1.222649450397238, 1.0, 1.0656980473776703]
+    },
+    "label": "Armchairs",
+    "path": "3D-FRONT/Armchairs/f89da2db-ad8c-4582-b186-ed2a46f3cb15.usdz"
+}
+
+
+def test_meta_data_fallback_scores_scene(tmp_path):
+    meta_data_path = tmp_path / "assets.json"
+    meta_data_path.write_text(json.dumps([ARMCHAIR]))
+    extents = scene_metrics.extents_from_meta_data(str(meta_data_path))
+    assert list(extents) == [ARMCHAIR["path"]]
+    meta = ARMCHAIR["meta_data"]
+    assert extents[ARMCHAIR["path"]][1] - extents[ARMCHAIR["path"]][0] == pytest.approx(
+        [meta["width"] * 100, meta["length"] * 100, meta["height"] * 100]
+    )
+
+    # two armchairs 30 cm apart on a 4 m x 4 m floor, a third far outside it
+    chair = lambda position: {"object_name": "armchair", "path": ARMCHAIR["path"], "position": position, "rotation": [0, 0, 0]}
+    scene = {
+        "meshes": {"xyz": [[0, 0, 0], [4, 0, 0], [0, 0, 4], [4, 0, 4]]},
+        "objects": {"armchair": [chair([1.0, 0, 1.0]), chair([1.3, 0, 1.0]), chair([10.0, 0, 10.0])]}
+    }
+    oob, oor = scene_metrics.analyze_scene_json(scene, extents)
+    width = meta["width"] * 100
+    assert oob == pytest.approx(1 / 3)
+    assert oor == pytest.approx((width - 30.0) / (3 * width))
+
+
+def test_non_quad_floor_is_rejected():
+    # a triangle floor, counted as a failed scene by the CLI instead of aborting it
+    with pytest.raises(ValueError):
+        scene_metrics.floor_geometry({"xyz": [[0, 0, 0], [4, 0, 0], [0, 0, 4]]})
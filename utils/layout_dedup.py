@@ -0,0 +1,176 @@
+import os
+import hashlib
+import argparse
+import numpy as np
+from tqdm import tqdm
+from utils.meta_data import read_json_file, save_json_file
+from utils.layout_store import LayoutStore
+
+
+MERSENNE_PRIME = (1 << 31) - 1
+# offsets of the position quantization grids, in cells; none puts a boundary
+# on round coordinates (multiples of a quarter cell)
+GRID_SHIFTS = (0.125, 0.375, 0.625, 0.875)
+
+
+def grid_cells(values, quant):
+    """Cell index of `values` on each grid of size `quant`, shifted by GRID_SHIFTS of a cell."""
+    values = np.asarray(values, dtype=np.float64) / quant
+    return [np.floor(values + shift).astype(int) for shift in GRID_SHIFTS]
+
+
+def layout_tokens(room, quant=0.05):
+    """
+    Shingles of a layout: the asset-id multiset plus every asset at its
+    position quantized to `quant` meters, plus the quantized floor extent.
+    The layout is shingled once per grid shifted by GRID_SHIFTS, so a nudge
+    across one grid's cell boundary changes only that grid's position token.
+    """
+    cells = [grid_cells(obj["position"], quant) for obj in room["objects"]]
+    floor = np.asarray(room["meshes"][0]["xyz"], dtype=np.float64).reshape(-1, 3)
+    sizes = grid_cells(np.ptp(floor, axis=0), quant)
+    tokens = []
+    for g in range(len(GRID_SHIFTS)):
+        counts = {}
+        for obj, obj_cells in zip(room["objects"], cells):
+            asset = obj["assetId"]
+            counts[asset] = counts.get(asset, 0) + 1
+            q = obj_cells[g]
+            tokens += [f"{g}:{asset}#{counts[asset]}", f"{g}:{asset}@{q[0]},{q[1]},{q[2]}"]
+        tokens.append(f"{g}:floor:{sizes[g][0]},{sizes[g][2]}")
+    return tokens
+
+
+def hash_tokens(tokens):
+    return np.array(
+        [int.from_bytes(hashlib.blake2b(t.encode(), digest_size=4).digest(), "little") for t in tokens],
+        dtype=np.uint64
+    )
+
+
+def minhash_signatures(token_lists, num_perm=128, seed=0, chunk_size=4096):
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+    b = rng.integers(0, MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+
+    signatures = np.full((len(token_lists), num_perm), MERSENNE_PRIME, dtype=np.uint64)
+    for start in range(0, len(token_lists), chunk_size):
+        chunk = token_lists[start:start + chunk_size]
+        lengths = np.array([len(t) for t in chunk])
+        non_empty = np.flatnonzero(lengths)
+        if len(non_empty) == 0:
+            continue
+        hashes = hash_tokens([tok for t in chunk for tok in t])
+        perm = (hashes[:, None] * a[None, :] + b[None, :]) % np.uint64(MERSENNE_PRIME)
+        offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+        signatures[start + non_empty] = np.minimum.reduceat(perm, offsets[non_empty], axis=0)
+    return signatures
+
+
+def find(parent, i):
+    root = i
+    while parent[root] != root:
+        root = parent[root]
+    while parent[i] != root:
+        parent[i], i = root, parent[i]
+    return root
+
+
+def cluster_signatures(signatures, threshold=0.8, bands=16):
+    """
+    LSH banding over MinHash signatures. Rooms sharing a band bucket are merged
+    when their estimated Jaccard similarity reaches `threshold`.
+
+    Returns the cluster id of every room (the index of its representative, i.e.
+    the first room of the cluster in input order).
+    """
+    num_rooms, num_perm = signatures.shape
+    if bands <= 0 or num_perm % bands:
+        raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+    rows = num_perm // bands
+    parent = list(range(num_rooms))
+    for band in range(bands):
+        block = signatures[:, band * rows:(band + 1) * rows]
+        _, inverse, counts = np.unique(block, axis=0, return_inverse=True, return_counts=True)
+        inverse = inverse.reshape(-1)
+        shared = np.flatnonzero(counts[inverse] > 1)
+        if len(shared) == 0:
+            continue
+        order = shared[np.argsort(inverse[shared], kind="stable")]
+        buckets = np.split(order, np.flatnonzero(np.diff(inverse[order])) + 1)
+        for bucket in buckets:
+            leader = bucket[0]
+            similarity = (signatures[bucket[1:]] == signatures[leader]).mean(axis=1)
+            for i in bucket[1:][similarity >= threshold]:
+                ri, rl = find(parent, i), find(parent, leader)
+                if ri != rl:
+                    parent[max(ri, rl)] = min(ri, rl)
+    return np.array([find(parent, i) for i in range(num_rooms)])
+
+
+def cluster_near_duplicates(rooms, threshold=0.8, num_perm=128, bands=16, quant=0.05, seed=0):
+    # checked again by cluster_signatures, but before the corpus is tokenized
+    if bands <= 0 or num_perm % bands:
+        raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+    token_lists = [layout_tokens(room, quant) for room in rooms]
+    signatures = minhash_signatures(token_lists, num_perm=num_perm, seed=seed)
+    return cluster_signatures(signatures, threshold=threshold, bands=bands)
+
+
+def dedup_report(names, datasets, labels):
+    keep = labels == np.arange(len(labels))
+    cluster_ids, inverse, sizes = np.unique(labels, return_inverse=True, return_counts=True)
+    # members of every cluster in input order, from one stable sort
+    members = np.split(np.argsort(inverse.reshape(-1), kind="stable"), np.cumsum(sizes)[:-1])
+    per_dataset = {}
+    for dataset, kept in zip(datasets, keep):
+        stats = per_dataset.setdefault(dataset, {"total": 0, "removed": 0})
+        stats["total"] += 1
+        stats["removed"] += int(not kept)
+    duplicates = {
+        names[c]: [names[i] for i in cluster if i != c]
+        for c, cluster in zip(cluster_ids, members) if len(cluster) > 1
+    }
+    return {
+        "total": len(labels),
+        "kept": int(keep.sum()),
+        "removed": int((~keep).sum()),
+        "removed_ratio": float((~keep).mean()) if len(labels) else 0.0,
+        "clusters": int(len(cluster_ids)),
+        "largest_cluster": int(sizes.max()) if len(sizes) else 0,
+        "per_dataset": per_dataset,
+        "duplicates": duplicates
+    }
+
+
+def print_report(report):
+    print(f"Near-duplicate layouts: removed {report['removed']} / {report['total']} "
+          f"({report['removed_ratio'] * 100:.2f}%), {report['clusters']} clusters, "
+          f"largest cluster {report['largest_cluster']}")
+    for dataset, stats in report["per_dataset"].items():
+        print(f"  {dataset}: removed {stats['removed']} / {stats['total']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Detect near-duplicate layouts with MinHash/LSH")
+    parser.add_argument('--input_folder', type=str, default="data/layout")
+    parser.add_argument('--store', type=str, default=None, help="Read layouts from a packed layout store instead of --input_folder")
+    parser.add_argument('--threshold', type=float, default=0.8, help="Estimated Jaccard similarity to merge two layouts")
+    parser.add_argument('--quant', type=float, default=0.05, help="Position quantization in meters")
+    parser.add_argument('--num_perm', type=int, default=128)
+    parser.add_argument('--bands', type=int, default=16)
+    parser.add_argument('--report', type=str, default="dedup_report.json")
+    args = parser.parse_args()
+
+    if args.store is not None:
+        with LayoutStore(args.store, readonly=True) as store:
+            rows = list(tqdm(store.iter_rooms(), total=len(store)))
+        names = [name for name, _ in rows]
+        rooms = [room for _, room in rows]
+    else:
+        names = sorted(os.listdir(args.input_folder))
+        rooms = [read_json_file(os.path.join(args.input_folder, r)) for r in tqdm(names)]
+    labels = cluster_near_duplicates(rooms, args.threshold, args.num_perm, args.bands, args.quant)
+    report = dedup_report(names, [room["dataset"] for room in rooms], labels)
+    print_report(report)
+    save_json_file(report, args.report)
@@ -0,0 +1,189 @@
+import os
+import json
+import zlib
+import sqlite3
+import argparse
+from tqdm import tqdm
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rooms (
+    id INTEGER PRIMARY KEY,
+    name TEXT UNIQUE NOT NULL,
+    dataset TEXT,
+    room_type TEXT,
+    num_objects INTEGER,
+    data BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS room_assets (
+    room_id INTEGER NOT NULL REFERENCES rooms(id) ON DELETE CASCADE,
+    asset_id TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (room_id, asset_id)
+);
+CREATE INDEX IF NOT EXISTS idx_rooms_dataset ON rooms(dataset);
+CREATE INDEX IF NOT EXISTS idx_rooms_room_type ON rooms(room_type);
+CREATE INDEX IF NOT EXISTS idx_room_assets_asset ON room_assets(asset_id);
+"""
+
+
+def room_type_of(room):
+    if room["objects"]:
+        return room["objects"][0]["roomId"]
+    return room["meshes"][0].get("roomId") if room["meshes"] else None
+
+
+def encode_room(room):
+    return zlib.compress(json.dumps(room, separators=(",", ":")).encode("utf-8"))
+
+
+def decode_room(blob):
+    return json.loads(zlib.decompress(blob).decode("utf-8"))
+
+
+class LayoutStore:
+    """
+    All layouts of data/layout packed into one SQLite file, with secondary
+    indexes on dataset, room type and asset id.
+
+    Rooms are keyed by their original file stem, e.g.
+        store = LayoutStore("data/layout.sqlite")
+        for name, room in store.iter_rooms(dataset=["HSSD"], room_type="BedRoom"):
+            ...
+    """
+
+    def __init__(self, path, readonly=False):
+        self.path = path
+        if readonly:
+            self.conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        else:
+            self.conn = sqlite3.connect(path)
+            self.conn.execute("PRAGMA foreign_keys = ON")
+            self.conn.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM rooms").fetchone()[0]
+
+    def put(self, name, room):
+        counts = {}
+        for obj in room["objects"]:
+            asset = obj.get("assetId")
+            if asset is not None:
+                counts[asset] = counts.get(asset, 0) + 1
+        cur = self.conn.execute(
+            "INSERT INTO rooms (name, dataset, room_type, num_objects, data) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET dataset=excluded.dataset, room_type=excluded.room_type, "
+            "num_objects=excluded.num_objects, data=excluded.data RETURNING id",
+            (name, room.get("dataset"), room_type_of(room), len(room["objects"]), encode_room(room))
+        )
+        room_id = cur.fetchone()[0]
+        self.conn.execute("DELETE FROM room_assets WHERE room_id = ?", (room_id,))
+        self.conn.executemany(
+            "INSERT INTO room_assets (room_id, asset_id, count) VALUES (?, ?, ?)",
+            [(room_id, asset, n) for asset, n in counts.items()]
+        )
+
+    def put_many(self, items):
+        with self.conn:
+            for name, room in items:
+                self.put(name, room)
+
+    def get(self, name):
+        row = self.conn.execute("SELECT data FROM rooms WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            raise KeyError(name)
+        return decode_room(row[0])
+
+    def _where(self, dataset=None, room_type=None, asset_id=None):
+        clauses, params = [], []
+        for column, value in (("dataset", dataset), ("room_type", room_type), ("asset_id", asset_id)):
+            if not value:
+                continue
+            values = [value] if isinstance(value, str) else list(value)
+            placeholders = ",".join("?" * len(values))
+            if column == "asset_id":
+                clauses.append(f"id IN (SELECT room_id FROM room_assets WHERE asset_id IN ({placeholders}))")
+            else:
+                clauses.append(f"{column} IN ({placeholders})")
+            params += values
+        where = " WHERE " + " AND ".join(clauses) if clauses else ""
+        return where, params
+
+    def names(self, dataset=None, room_type=None, asset_id=None):
+        where, params = self._where(dataset, room_type, asset_id)
+        return [row[0] for row in self.conn.execute(f"SELECT name FROM rooms{where} ORDER BY id", params)]
+
+    def count(self, dataset=None, room_type=None, asset_id=None):
+        where, params = self._where(dataset, room_type, asset_id)
+        return self.conn.execute(f"SELECT COUNT(*) FROM rooms{where}", params).fetchone()[0]
+
+    def iter_rooms(self, dataset=None, room_type=None, asset_id=None, batch_size=512):
+        """
+        Stream (name, room) pairs matching all given filters. Each filter takes a
+        single value or a list of values.
+        """
+        where, params = self._where(dataset, room_type, asset_id)
+        cur = self.conn.execute(f"SELECT name, data FROM rooms{where} ORDER BY id", params)
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                break
+            for name, blob in rows:
+                yield name, decode_room(blob)
+
+    def room_types(self):
+        return dict(self.conn.execute("SELECT room_type, COUNT(*) FROM rooms GROUP BY room_type").fetchall())
+
+    def datasets(self):
+        return dict(self.conn.execute("SELECT dataset, COUNT(*) FROM rooms GROUP BY dataset").fetchall())
+
+    def export_json(self, output_folder, **filters):
+        os.makedirs(output_folder, exist_ok=True)
+        for name, room in tqdm(self.iter_rooms(**filters), total=self.count(**filters)):
+            with open(os.path.join(output_folder, name + ".json"), "w") as file:
+                file.write(json.dumps(room, indent=4))
+
+
+def pack_folder(input_folder, store_path):
+    files = sorted(f for f in os.listdir(input_folder) if f.endswith(".json"))
+
+    def rooms():
+        for f in tqdm(files):
+            with open(os.path.join(input_folder, f), "r") as file:
+                yield os.path.splitext(f)[0], json.load(file)
+
+    with LayoutStore(store_path) as store:
+        store.put_many(rooms())
+        return len(store)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pack data/layout into an indexed SQLite store, or export it back to JSON")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    pack_parser = subparsers.add_parser("pack")
+    pack_parser.add_argument('--input_folder', type=str, default="data/layout")
+    pack_parser.add_argument('--store', type=str, default="data/layout.sqlite")
+    export_parser = subparsers.add_parser("export")
+    export_parser.add_argument('--store', type=str, default="data/layout.sqlite")
+    export_parser.add_argument('--output_folder', type=str, default="data/layout")
+    export_parser.add_argument('--dataset', type=str, nargs='*', default=None)
+    export_parser.add_argument('--room_type', type=str, nargs='*', default=None)
+    export_parser.add_argument('--asset_id', type=str, nargs='*', default=None)
+    args = parser.parse_args()
+
+    if args.command == "pack":
+        num_rooms = pack_folder(args.input_folder, args.store)
+        print(f"Packed {num_rooms} rooms into {args.store}")
+    else:
+        with LayoutStore(args.store, readonly=True) as store:
+            store.export_json(args.output_folder, dataset=args.dataset, room_type=args.room_type, asset_id=args.asset_id)
@@ -0,0 +1,225 @@
+import os
+import numpy as np
+
+
+POINT_DTYPE = np.dtype([('xyz', '<f4', (3,)), ('label', '<i4'), ('instance', '<i4')])
+BOX_DTYPE = np.dtype([
+    ('instance', '<i4'), ('label', '<i4'),
+    ('center', '<f4', (3,)), ('size', '<f4', (3,)), ('rotation', '<f4', (3, 3))
+])
+
+POINT_FILES = {"txt": "scene.txt", "npy": "scene.npy", "npz": "scene.npz", "ply": "scene.ply"}
+BBOX_FILES = {"txt": "bounding_boxes.txt", "npy": "bounding_boxes.npy", "npz": "bounding_boxes.npy", "ply": "bounding_boxes.npy"}
+
+
+def point_file_names(output_format, num_points=None):
+    """
+    Point cloud file names of one scene: scene.<ext>, or scene_<n>.<ext> for
+    every budget of a multi-resolution export (several `num_points`).
+    """
+    budgets = sorted(set(np.atleast_1d(num_points).tolist())) if num_points is not None else []
+    if len(budgets) < 2:
+        return [POINT_FILES[output_format]]
+    root, ext = os.path.splitext(POINT_FILES[output_format])
+    return [f"{root}_{n}{ext}" for n in budgets]
+
+
+PLY_TYPES = {
+    "char": "i1", "int8": "i1", "uchar": "u1", "uint8": "u1",
+    "short": "i2", "int16": "i2", "ushort": "u2", "uint16": "u2",
+    "int": "i4", "int32": "i4", "uint": "u4", "uint32": "u4",
+    "float": "f4", "float32": "f4", "double": "f8", "float64": "f8"
+}
+
+
+def save_point_cloud(file_path, points, labels, instances=None):
+    """
+    Write an (N, 3) point array with its (N,) semantic labels and instance ids.
+    The format follows the extension: .txt (x y z label instance per line),
+    .npy (structured xyz/label/instance array), .npz (separate arrays) or .ply
+    (binary PLY with label and instance properties). Only .npy and .ply can be
+    memory-mapped on load; .npz is for archiving.
+    """
+    points = np.asarray(points)
+    labels = np.asarray(labels)
+    instances = labels if instances is None else np.asarray(instances)
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext == ".txt":
+        np.savetxt(file_path, np.column_stack((points, labels, instances)))
+    elif ext == ".npy":
+        data = np.empty(len(points), dtype=POINT_DTYPE)
+        data['xyz'] = points
+        data['label'] = labels
+        data['instance'] = instances
+        np.save(file_path, data)
+    elif ext == ".npz":
+        np.savez(
+            file_path,
+            points=points.astype(np.float32), labels=labels.astype(np.int32), instances=instances.astype(np.int32)
+        )
+    elif ext == ".ply":
+        data = np.empty(len(points), dtype=POINT_DTYPE)
+        data['xyz'] = points
+        data['label'] = labels
+        data['instance'] = instances
+        header = (
+            "ply\nformat binary_little_endian 1.0\n"
+            f"element vertex {len(points)}\n"
+            "property float x\nproperty float y\nproperty float z\nproperty int label\nproperty int instance\n"
+            "end_header\n"
+        )
+        with open(file_path, "wb") as f:
+            f.write(header.encode("ascii"))
+            f.write(data.tobytes())
+    else:
+        raise ValueError(f"Unsupported point cloud format: {file_path}")
+
+
+def read_ply_header(file_path):
+    with open(file_path, "rb") as f:
+        if f.readline().strip() != b"ply":
+            raise ValueError(f"Not a PLY file: {file_path}")
+        fmt, count, fields = None, 0, []
+        in_vertex = False
+        while True:
+            line = f.readline()
+            if not line:
+                raise ValueError(f"Truncated PLY header: {file_path}")
+            tokens = line.decode("ascii").split()
+            if not tokens:
+                continue
+            if tokens[0] == "format":
+                fmt = tokens[1]
+            elif tokens[0] == "element":
+                in_vertex = tokens[1] == "vertex"
+                if in_vertex:
+                    count = int(tokens[2])
+            elif tokens[0] == "property" and in_vertex:
+                if tokens[1] == "list":
+                    raise ValueError("List properties on vertices are not supported")
+                fields.append((tokens[2], PLY_TYPES[tokens[1]]))
+            elif tokens[0] == "end_header":
+                return fmt, count, fields, f.tell()
+
+
+def load_ply(file_path, mmap=True):
+    fmt, count, fields, offset = read_ply_header(file_path)
+    if fmt not in ("binary_little_endian", "binary_big_endian"):
+        raise ValueError(f"Only binary PLY files are supported, got {fmt}")
+    order = "<" if fmt == "binary_little_endian" else ">"
+    names = [name for name, _ in fields]
+    xyz_at = names.index("x") if "x" in names else -1
+    # pack consecutive x/y/z of the same type into one (3,) field so points are a view
+    if xyz_at >= 0 and names[xyz_at:xyz_at + 3] == ["x", "y", "z"] and len({t for _, t in fields[xyz_at:xyz_at + 3]}) == 1:
+        fields = fields[:xyz_at] + [("xyz", fields[xyz_at][1], (3,))] + fields[xyz_at + 3:]
+    dtype = np.dtype([(f[0], order + f[1]) + tuple(f[2:]) for f in fields])
+    if mmap:
+        data = np.memmap(file_path, dtype=dtype, mode="r", offset=offset, shape=(count,))
+    else:
+        data = np.fromfile(file_path, dtype=dtype, count=count, offset=offset)
+    points = data["xyz"] if "xyz" in dtype.names else np.stack([data["x"], data["y"], data["z"]], axis=1)
+    labels = data["label"] if "label" in dtype.names else np.zeros(count, dtype=np.int32)
+    instances = data["instance"] if "instance" in dtype.names else labels
+    return points, labels, instances
+
+
+def load_point_cloud(file_path, mmap=True, return_instances=False):
+    """
+    Read a point cloud written by save_point_cloud and return (points, labels),
+    or (points, labels, instances) with `return_instances`. .npy and .ply files
+    are memory-mapped, so the arrays are views into the file rather than copies;
+    numpy cannot map the members of an .npz archive, so those are read into
+    memory whatever `mmap` says.
+    Files without instance ids (older n*4 txt) reuse the labels.
+    """
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext == ".txt":
+        data = np.loadtxt(file_path, ndmin=2)
+        if data.shape[1] not in (4, 5):
+            raise ValueError(f"Invalid point cloud format. Expected n*4 or n*5 array, got {data.shape}")
+        points, labels, instances = data[:, :3], data[:, 3].astype(np.int32), data[:, -1].astype(np.int32)
+    elif ext == ".npy":
+        data = np.load(file_path, mmap_mode="r" if mmap else None)
+        points, labels = data['xyz'], data['label']
+        instances = data['instance'] if 'instance' in data.dtype.names else labels
+    elif ext == ".npz":
+        with np.load(file_path) as data:
+            points, labels = data['points'], data['labels']
+            instances = data['instances'] if 'instances' in data.files else labels
+    elif ext == ".ply":
+        points, labels, instances = load_ply(file_path, mmap)
+    else:
+        raise ValueError(f"Unsupported point cloud format: {file_path}")
+    if return_instances:
+        return points, labels, instances
+    return points, labels
+
+
+def save_bboxes(file_path, boxes):
+    """
+    boxes: BOX_DTYPE array of oriented boxes (center, size along the box axes,
+    rotation whose columns are the box axes). The .txt form stores one box per
+    line as: instance label cx cy cz sx sy sz r00 r01 ... r22.
+    """
+    boxes = np.asarray(boxes, dtype=BOX_DTYPE)
+    if file_path.endswith(".txt"):
+        rows = np.column_stack([
+            boxes['instance'], boxes['label'], boxes['center'], boxes['size'], boxes['rotation'].reshape(-1, 9)
+        ])
+        np.savetxt(file_path, rows.reshape(-1, 17))
+        return
+    np.save(file_path, boxes)
+
+
+def load_bboxes(file_path, mmap=True):
+    """Returns a BOX_DTYPE structured array."""
+    if file_path.endswith(".txt"):
+        rows = np.loadtxt(file_path, ndmin=2).reshape(-1, 17)
+        boxes = np.empty(len(rows), dtype=BOX_DTYPE)
+        boxes['instance'] = rows[:, 0]
+        boxes['label'] = rows[:, 1]
+        boxes['center'] = rows[:, 2:5]
+        boxes['size'] = rows[:, 5:8]
+        boxes['rotation'] = rows[:, 8:17].reshape(-1, 3, 3)
+        return boxes
+    return np.load(file_path, mmap_mode="r" if mmap else None)
+
+
+def save_voxels(file_path, coords, labels, instances, origin, voxel_size, shape, label_names=(), dense=False):
+    """
+    Compressed voxel grid: integer `coords` of the occupied voxels with their
+    semantic label and instance id, plus the grid `origin`, `voxel_size` and
+    `shape`. With `dense`, a bit-packed occupancy grid of every occupied voxel
+    and a uint16 semantic grid (label + 1, so 0 = empty or unlabeled) are
+    stored as well.
+    """
+    coords = np.asarray(coords, dtype=np.int32).reshape(-1, 3)
+    labels = np.asarray(labels, dtype=np.int32)
+    arrays = {
+        "coords": coords, "labels": labels, "instances": np.asarray(instances, dtype=np.int32),
+        "origin": np.asarray(origin, dtype=np.float64), "voxel_size": np.float64(voxel_size),
+        "shape": np.asarray(shape, dtype=np.int64), "label_names": np.array(list(label_names), dtype=str)
+    }
+    if dense:
+        occupancy = np.zeros(tuple(shape), dtype=bool)
+        occupancy[coords[:, 0], coords[:, 1], coords[:, 2]] = True
+        semantic = np.zeros(tuple(shape), dtype=np.uint16)
+        semantic[coords[:, 0], coords[:, 1], coords[:, 2]] = np.maximum(labels + 1, 0)
+        arrays["occupancy"] = np.packbits(occupancy.ravel())
+        arrays["semantic"] = semantic
+    np.savez_compressed(file_path, **arrays)
+
+
+def load_voxels(file_path, dense=False):
+    """Returns the arrays of save_voxels as a dict, with `occupancy` unpacked to a bool grid when `dense`."""
+    with np.load(file_path) as data:
+        voxels = {k: data[k] for k in data.files}
+    if dense:
+        shape = tuple(voxels["shape"])
+        if "occupancy" in voxels:
+            voxels["occupancy"] = np.unpackbits(voxels["occupancy"], count=int(np.prod(shape))).astype(bool).reshape(shape)
+        else:
+            occupancy = np.zeros(shape, dtype=bool)
+            occupancy[tuple(voxels["coords"].T)] = True
+            voxels["occupancy"] = occupancy
+    return voxels
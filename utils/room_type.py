@@ -1,5 +1,7 @@
 import os
+import argparse
 from meta_data import read_json_file, save_json_file
+from layout_store import LayoutStore
 
 
 category_mapping = {
@@ -34,15 +36,32 @@ category_mapping = {
 }
 
 
-path = "data/layout"
-rooms = os.listdir(path)
-for room in rooms:
-    file = os.path.join(path, room)
-    data = read_json_file(file)
+def remap_room_type(data):
     objs = data["objects"]
     key = objs[0]["roomId"]
     value = category_mapping[key]
     for i in range(len(objs)):
         data["objects"][i]["roomId"] = value
     data["meshes"][0]["roomId"] = value
-    save_json_file(data, os.path.join("layout", room))
+    return data
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--store', type=str, default=None, help="Remap room types inside a packed layout store instead of data/layout")
+    parser.add_argument('--batch_size', type=int, default=512, help="Rooms rewritten per transaction with --store")
+    args = parser.parse_args()
+
+    if args.store is not None:
+        with LayoutStore(args.store) as store:
+            # rewrite by name in fixed-size batches, so only one batch of rooms is decoded at a time
+            names = store.names()
+            for start in range(0, len(names), args.batch_size):
+                store.put_many((name, remap_room_type(store.get(name))) for name in names[start:start + args.batch_size])
+    else:
+        path = "data/layout"
+        rooms = os.listdir(path)
+        for room in rooms:
+            file = os.path.join(path, room)
+            data = read_json_file(file)
+            save_json_file(remap_room_type(data), os.path.join("layout", room))
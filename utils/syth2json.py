@@ -3,6 +3,8 @@ import numpy as np
 from meta_data import read_json_file, save_json_file
 import math
 import uuid
+import argparse
+from layout_store import LayoutStore
 
 
 def capitalize_first(text):
@@ -97,8 +99,13 @@ def process(meta_data, room):
     return res
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--store', type=str, default=None, help="Write converted layouts into a packed layout store instead of data/layout")
+    args = parser.parse_args()
+
     input_path = "/home/zwx/Desktop/work/scene"
     output_path = "data/layout"
+    store = LayoutStore(args.store) if args.store is not None else None
     i = 0
     room_type = os.listdir(input_path)
     for room in room_type:
@@ -110,16 +117,20 @@ if __name__ == "__main__":
             for layout in files:
                 if layout.split(".")[-1] == "json":
                     path = os.path.join(file, layout)
-                    save_path = os.path.join(output_path, str(uuid.uuid1()) + ".json")
+                    name = str(uuid.uuid1())
+                    save_path = os.path.join(output_path, name + ".json")
                     meta_data = read_json_file(path)
                     try:
                         res = process(meta_data, room)
                         if len(res["objects"]) > 0:
-                            save_json_file(res, save_path)
+                            if store is not None:
+                                store.put(name, res)
+                            else:
+                                save_json_file(res, save_path)
                         else:
                             i += 1
                     except:
                         i += 1
+    if store is not None:
+        store.close()
     print(i)
-
-
@@ -0,0 +1,40 @@
+import numpy as np
+
+
+def gf_matrix_to_numpy(matrix):
+    return np.array(matrix, dtype=np.float64).reshape(4, 4)
+
+
+def transform_points(points, matrix):
+    # Gf matrices act on row vectors: p' = [p, 1] @ M
+    return points @ matrix[:3, :3] + matrix[3, :3]
+
+
+def triangulate_faces(face_counts, face_indices):
+    """
+    Fan-triangulate polygons of any size: an n-gon (v0, ..., vn-1) becomes
+    (v0, vk, vk+1) for k = 1..n-2. Degenerate faces with fewer than 3 vertices
+    are skipped.
+    """
+    face_counts = np.asarray(face_counts, dtype=np.int64)
+    face_indices = np.asarray(face_indices, dtype=np.int64)
+    starts = np.cumsum(face_counts) - face_counts
+    valid = face_counts >= 3
+    starts, counts = starts[valid], face_counts[valid]
+    tris_per_face = counts - 2
+    first = np.repeat(starts, tris_per_face)
+    k = np.arange(tris_per_face.sum()) - np.repeat(np.cumsum(tris_per_face) - tris_per_face, tris_per_face)
+    return np.stack([
+        face_indices[first],
+        face_indices[first + k + 1],
+        face_indices[first + k + 2]
+    ], axis=1)
+
+
+def get_asset_reference(prim):
+    """Absolute path of the .usdz asset referenced by `prim`, or None."""
+    for spec in prim.GetPrimStack():
+        for ref in spec.referenceList.GetAddedOrExplicitItems():
+            if str(ref.assetPath).endswith('.usdz'):
+                return spec.layer.ComputeAbsolutePath(ref.assetPath)
+    return None
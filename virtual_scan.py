@@ -0,0 +1,207 @@
+import argparse
+import os
+import json
+import time
+import numpy as np
+import open3d as o3d
+from PIL import Image
+from tqdm import tqdm
+from sample_scan_point import load_scene, load_label_maps, build_scene_geometry, to_output_frame, find_scene_folders
+from utils.point_io import POINT_FILES, save_point_cloud
+
+
+# semantic_<view>.png value of hits on objects without a class, kept apart from background 0
+UNLABELED_SEMANTIC = 65535
+
+
+def orbit_rig(center, distance, num_views=8, elevation=30.0):
+    """
+    Cameras evenly spaced on a circle around `center` (output frame, Z up),
+    `elevation` degrees above the horizon and all looking at `center`.
+    """
+    theta = 2 * np.pi * np.arange(num_views) / num_views
+    el = np.radians(elevation)
+    offsets = np.stack([
+        np.cos(el) * np.cos(theta), np.cos(el) * np.sin(theta), np.full(num_views, np.sin(el))
+    ], axis=1)
+    return [{"eye": (center + distance * o).tolist(), "target": list(map(float, center))} for o in offsets]
+
+
+def look_at(eye, target, up=(0.0, 0.0, 1.0)):
+    """Camera-to-world rotation with OpenCV camera axes (x right, y down, z forward)."""
+    forward = np.asarray(target, dtype=np.float64) - np.asarray(eye, dtype=np.float64)
+    forward /= np.linalg.norm(forward)
+    right = np.cross(forward, up)
+    if np.linalg.norm(right) < 1e-8:
+        # looking straight up or down
+        right = np.cross(forward, (0.0, 1.0, 0.0))
+    right /= np.linalg.norm(right)
+    down = np.cross(forward, right)
+    return np.stack([right, down, forward], axis=1)
+
+
+def pinhole_intrinsics(width, height, fov):
+    """Intrinsics for a horizontal field of view of `fov` degrees."""
+    focal = width / 2.0 / np.tan(np.radians(fov) / 2.0)
+    return np.array([[focal, 0.0, width / 2.0], [0.0, focal, height / 2.0], [0.0, 0.0, 1.0]])
+
+
+def camera_rays(eye, rotation, intrinsics, width, height):
+    """
+    (height, width, 6) ray bundle through the pixel centers. Directions have a
+    unit component along the optical axis, so hit distances are z-depths.
+    """
+    u, v = np.meshgrid(np.arange(width) + 0.5, np.arange(height) + 0.5)
+    directions = np.stack([
+        (u - intrinsics[0, 2]) / intrinsics[0, 0], (v - intrinsics[1, 2]) / intrinsics[1, 1], np.ones_like(u)
+    ], axis=-1) @ rotation.T
+    origins = np.broadcast_to(np.asarray(eye, dtype=np.float64), directions.shape)
+    return np.concatenate([origins, directions], axis=-1).astype(np.float32)
+
+
+class VirtualScanner:
+    """
+    One BVH (Open3D RaycastingScene) over all triangles of a scene. Hits are
+    mapped back to instance and semantic ids through the triangle index.
+    """
+
+    def __init__(self, vertices, triangles, triangle_instance, instance_labels, threads=0):
+        self.threads = threads
+        self.triangle_instance = np.asarray(triangle_instance, dtype=np.int32)
+        self.instance_labels = np.asarray(instance_labels, dtype=np.int32)
+        self.scene = o3d.t.geometry.RaycastingScene(nthreads=threads)
+        self.scene.add_triangles(
+            o3d.core.Tensor(np.ascontiguousarray(vertices, dtype=np.float32)),
+            o3d.core.Tensor(np.ascontiguousarray(triangles, dtype=np.uint32))
+        )
+
+    def cast(self, rays):
+        """
+        Cast a (..., 6) ray bundle. Returns depth (0 where nothing is hit),
+        normals facing the camera, and instance / semantic ids (-1 on misses).
+        """
+        result = self.scene.cast_rays(o3d.core.Tensor(rays), nthreads=self.threads)
+        t_hit = result['t_hit'].numpy()
+        hit = np.isfinite(t_hit)
+        primitive = result['primitive_ids'].numpy()[hit].astype(np.int64)
+
+        depth = np.where(hit, t_hit, 0.0).astype(np.float32)
+        normal = result['primitive_normals'].numpy().astype(np.float32)
+        facing = np.sum(normal * rays[..., 3:], axis=-1) > 0
+        normal[facing] = -normal[facing]
+        normal[~hit] = 0.0
+        instance = np.full(t_hit.shape, -1, dtype=np.int32)
+        instance[hit] = self.triangle_instance[primitive]
+        semantic = np.full(t_hit.shape, -1, dtype=np.int32)
+        semantic[hit] = self.instance_labels[instance[hit]]
+        return depth, normal, instance, semantic
+
+
+def save_scan_images(output_dir, name, depth, normal, instance, semantic):
+    """
+    depth_<name>.png: 16-bit millimeters (0 = no hit); normal_<name>.png: RGB
+    of (n + 1) / 2; instance_ / semantic_<name>.png: 16-bit id + 1 (0 = background),
+    with hits on unlabeled objects stored as UNLABELED_SEMANTIC.
+    """
+    Image.fromarray(np.clip(np.round(depth * 1000.0), 0, 65535).astype(np.uint16)).save(
+        os.path.join(output_dir, f"depth_{name}.png"))
+    normal_rgb = np.where(depth[..., None] > 0, (normal * 0.5 + 0.5) * 255.0, 0.0)
+    Image.fromarray(np.round(normal_rgb).astype(np.uint8)).save(os.path.join(output_dir, f"normal_{name}.png"))
+    Image.fromarray((instance + 1).astype(np.uint16)).save(os.path.join(output_dir, f"instance_{name}.png"))
+    semantic = np.where(semantic >= 0, semantic + 1, np.where(instance >= 0, UNLABELED_SEMANTIC, 0))
+    Image.fromarray(semantic.astype(np.uint16)).save(os.path.join(output_dir, f"semantic_{name}.png"))
+
+
+def scan_scene(input_folder, output_dir, rig=None, num_views=8, elevation=30.0, distance_scale=1.2, width=640, height=480,
+               fov=60.0, batch_views=4, threads=0, output_format="txt", asset_labels=None, label_names=None):
+    """
+    Ray-cast a scene from a camera rig (default: orbit_rig around the scene
+    bounds) and write per-view depth / normal / instance / semantic images,
+    a partial-scan point cloud scan_<view> and cameras.json. Everything is in
+    the sample_scan_point output frame (meters, Z up).
+    """
+    start = time.perf_counter()
+    scene = load_scene(input_folder, asset_labels, label_names)
+    if scene is None or not scene["meshes"]:
+        return 0
+    vertices, triangles, tri_mesh = build_scene_geometry(scene["meshes"])
+    vertices = to_output_frame(vertices)
+    triangle_instance = np.asarray(scene["mesh_instances"], dtype=np.int64)[tri_mesh]
+    scanner = VirtualScanner(vertices, triangles, triangle_instance, scene["boxes"]["label"], threads)
+
+    if rig is None:
+        lower, upper = vertices.min(axis=0), vertices.max(axis=0)
+        radius = np.linalg.norm(upper - lower) / 2.0
+        # fit the bounding sphere inside the narrower of the horizontal and vertical fields of view
+        half_fov = np.radians(fov) / 2.0
+        half_fov = min(half_fov, np.arctan(np.tan(half_fov) * height / width))
+        distance = distance_scale * radius / np.sin(half_fov)
+        rig = orbit_rig((lower + upper) / 2.0, distance, num_views, elevation)
+    intrinsics = pinhole_intrinsics(width, height, fov)
+    os.makedirs(output_dir, exist_ok=True)
+    ext = os.path.splitext(POINT_FILES[output_format])[1]
+
+    cameras = []
+    num_points = 0
+    for batch_start in range(0, len(rig), batch_views):
+        batch = rig[batch_start:batch_start + batch_views]
+        rotations = [look_at(cam["eye"], cam["target"], cam.get("up", (0.0, 0.0, 1.0))) for cam in batch]
+        rays = np.stack([camera_rays(cam["eye"], r, intrinsics, width, height) for cam, r in zip(batch, rotations)])
+        depths, normals, instances, semantics = scanner.cast(rays)
+        for k, (cam, rotation) in enumerate(zip(batch, rotations)):
+            name = f"{batch_start + k:03d}"
+            save_scan_images(output_dir, name, depths[k], normals[k], instances[k], semantics[k])
+            hit = depths[k] > 0
+            points = rays[k][hit][:, :3] + rays[k][hit][:, 3:] * depths[k][hit][:, None]
+            save_point_cloud(os.path.join(output_dir, f"scan_{name}{ext}"), points, semantics[k][hit], instances[k][hit])
+            num_points += len(points)
+            cameras.append({
+                "name": name, "eye": list(map(float, cam["eye"])), "target": list(map(float, cam["target"])),
+                "rotation": rotation.tolist(), "intrinsics": intrinsics.tolist(), "width": width, "height": height
+            })
+
+    with open(os.path.join(output_dir, 'cameras.json'), 'w') as f:
+        f.write(json.dumps({
+            "labels": scene["label_names"], "instances": scene["objects"], "cameras": cameras,
+            "seconds": time.perf_counter() - start
+        }, indent=4))
+    return num_points
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='CPU ray-cast virtual scanner: depth, normal, instance and semantic maps plus partial scans')
+    parser.add_argument('--input_folder', type=str, default=None, help='Path to input USDA folder')
+    parser.add_argument('--input_root', type=str, default=None, help='Scan every scene folder found recursively under this path')
+    parser.add_argument('--output_dir', type=str, required=True)
+    parser.add_argument('--rig', type=str, default=None, help='JSON list of cameras {"eye": [x, y, z], "target": [x, y, z]} in the output frame')
+    parser.add_argument('--views', type=int, default=8, help='Number of orbit cameras when no --rig is given')
+    parser.add_argument('--elevation', type=float, default=30.0, help='Orbit camera elevation in degrees')
+    parser.add_argument('--distance_scale', type=float, default=1.2, help='Orbit distance relative to the distance that fits the scene')
+    parser.add_argument('--width', type=int, default=640)
+    parser.add_argument('--height', type=int, default=480)
+    parser.add_argument('--fov', type=float, default=60.0, help='Horizontal field of view in degrees')
+    parser.add_argument('--batch_views', type=int, default=4, help='Views cast together in one ray bundle')
+    parser.add_argument('--threads', type=int, default=0, help='Ray casting threads, 0 uses all cores')
+    parser.add_argument('--format', type=str, default='txt', choices=['txt', 'npy', 'npz', 'ply'], help='Partial scan point cloud format')
+    parser.add_argument('--meta_data', type=str, default='data/assets.json')
+    parser.add_argument('--labels', type=str, default='data/labels.json')
+    args = parser.parse_args()
+    if (args.input_folder is None) == (args.input_root is None):
+        parser.error('Exactly one of --input_folder and --input_root is required')
+
+    rig = None
+    if args.rig is not None:
+        with open(args.rig, 'r') as f:
+            rig = json.load(f)
+    asset_labels, label_names = load_label_maps(args.meta_data, args.labels)
+    if args.input_root is not None:
+        jobs = [(d, os.path.join(args.output_dir, os.path.relpath(d, args.input_root))) for d in find_scene_folders(args.input_root)]
+    else:
+        jobs = [(args.input_folder, args.output_dir)]
+    for scene_dir, output_dir in tqdm(jobs):
+        scan_scene(
+            scene_dir, output_dir, rig=rig, num_views=args.views, elevation=args.elevation,
+            distance_scale=args.distance_scale, width=args.width, height=args.height, fov=args.fov,
+            batch_views=args.batch_views, threads=args.threads, output_format=args.format,
+            asset_labels=asset_labels, label_names=label_names
+        )
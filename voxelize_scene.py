@@ -0,0 +1,177 @@
+import argparse
+import os
+import json
+import time
+import numpy as np
+from tqdm import tqdm
+from sample_scan_point import (
+    AssetPointCache, load_scene, load_label_maps, build_scene_geometry, to_output_frame, transform_points,
+    find_scene_folders
+)
+from utils.point_io import save_voxels
+
+
+def triangle_lattice_chunks(vertices, triangles, spacing, chunk_size=1 << 22):
+    """
+    Surface points of every triangle on a barycentric lattice whose step is at
+    most `spacing` along each edge, generated in chunks of about `chunk_size`
+    lattice candidates. Yields (points, triangle index) per chunk.
+    """
+    v0 = vertices[triangles[:, 0]]
+    e1 = vertices[triangles[:, 1]] - v0
+    e2 = vertices[triangles[:, 2]] - v0
+    longest = np.max([np.linalg.norm(e1, axis=1), np.linalg.norm(e2, axis=1), np.linalg.norm(e2 - e1, axis=1)], axis=0)
+    steps = np.maximum(1, np.ceil(longest / spacing)).astype(np.int64)
+    # (i, j) candidates over the (n + 1)^2 square, of which i + j <= n are kept
+    counts = (steps + 1) ** 2
+    ends = np.cumsum(counts)
+    start = 0
+    while start < len(triangles):
+        offset = ends[start - 1] if start else 0
+        end = max(start + 1, int(np.searchsorted(ends, offset + chunk_size, side="right")))
+        tri = np.arange(start, end)
+        c = counts[tri]
+        rep = np.repeat(tri, c)
+        local = np.arange(c.sum()) - np.repeat(np.cumsum(c) - c, c)
+        n = steps[rep]
+        i, j = local // (n + 1), local % (n + 1)
+        keep = i + j <= n
+        rep, n, i, j = rep[keep], n[keep], i[keep], j[keep]
+        points = v0[rep] + (i / n)[:, None] * e1[rep] + (j / n)[:, None] * e2[rep]
+        yield points, rep
+        start = end
+
+
+class VoxelAccumulator:
+    """
+    Sparse surface voxels of a fixed grid. Every voxel keeps per-instance hit
+    counts, merged whenever `merge_every` pending pairs pile up, so memory is
+    bounded by the number of occupied voxels rather than by the input points.
+    """
+
+    def __init__(self, origin, voxel_size, shape, num_instances, merge_every=1 << 22):
+        self.origin = np.asarray(origin, dtype=np.float64)
+        self.voxel_size = voxel_size
+        self.shape = np.asarray(shape, dtype=np.int64)
+        self.num_instances = max(int(num_instances), 1)
+        self.merge_every = merge_every
+        self.pairs = np.zeros(0, dtype=np.int64)
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.pending = []
+        self.num_pending = 0
+
+    def add(self, points, instances):
+        idx = np.floor((points - self.origin) / self.voxel_size).astype(np.int64)
+        idx = np.clip(idx, 0, self.shape - 1)
+        keys = (idx[:, 0] * self.shape[1] + idx[:, 1]) * self.shape[2] + idx[:, 2]
+        pairs, counts = np.unique(keys * self.num_instances + instances, return_counts=True)
+        self.pending.append((pairs, counts))
+        self.num_pending += len(pairs)
+        if self.num_pending >= self.merge_every:
+            self.merge()
+
+    def merge(self):
+        if not self.pending:
+            return
+        pairs = np.concatenate([self.pairs] + [p for p, _ in self.pending])
+        counts = np.concatenate([self.counts] + [c for _, c in self.pending])
+        self.pairs, inverse = np.unique(pairs, return_inverse=True)
+        self.counts = np.bincount(inverse.reshape(-1), weights=counts).astype(np.int64)
+        self.pending, self.num_pending = [], 0
+
+    def result(self):
+        """Occupied voxel coordinates and the instance with the most hits in each."""
+        self.merge()
+        keys, instances = self.pairs // self.num_instances, self.pairs % self.num_instances
+        order = np.lexsort((-self.counts, keys))
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = keys[order][1:] != keys[order][:-1]
+        keys, instances = keys[order][first], instances[order][first]
+        coords = np.stack(np.unravel_index(keys, tuple(self.shape)), axis=1)
+        return coords, instances
+
+
+def voxelize(input_folder, output_dir, voxel_size=0.05, dense=False, chunk_size=1 << 22, asset_cache=None,
+             asset_labels=None, label_names=None, population_mask=None):
+    """
+    Rasterize the scene surface into voxels of `voxel_size` meters in the
+    sample_scan_point output frame and write them to voxels.npz (see
+    save_voxels). Triangles are covered by a lattice at half the voxel size.
+    Instances served by an `asset_cache` are voxelized from their cached
+    local-space samples, so each asset is only sampled once across scenes.
+    """
+    start = time.perf_counter()
+    scene = load_scene(input_folder, asset_labels, label_names, asset_cache, population_mask)
+    if scene is None:
+        return 0
+    vertices, triangles, tri_mesh = build_scene_geometry(scene["meshes"])
+    vertices = to_output_frame(vertices)
+    triangle_instance = np.asarray(scene["mesh_instances"], dtype=np.int64)[tri_mesh]
+    cached_points = [
+        (instance_id, to_output_frame(transform_points(entry["points"].astype(np.float64), matrix)))
+        for instance_id, entry, matrix in scene["cached_instances"]
+    ]
+
+    extents = [e for e in [vertices] + [points for _, points in cached_points] if len(e)]
+    if not extents:
+        print("Scene has no geometry to voxelize.")
+        return 0
+    lower = np.min([e.min(axis=0) for e in extents], axis=0)
+    upper = np.max([e.max(axis=0) for e in extents], axis=0)
+    origin = np.floor(lower / voxel_size) * voxel_size
+    shape = np.floor((upper - origin) / voxel_size).astype(np.int64) + 1
+
+    grid = VoxelAccumulator(origin, voxel_size, shape, len(scene["objects"]))
+    for points, tri in triangle_lattice_chunks(vertices, triangles, voxel_size / 2.0, chunk_size):
+        grid.add(points, triangle_instance[tri])
+    for instance_id, points in cached_points:
+        for chunk_start in range(0, len(points), chunk_size):
+            chunk = points[chunk_start:chunk_start + chunk_size]
+            grid.add(chunk, np.full(len(chunk), instance_id, dtype=np.int64))
+    coords, instances = grid.result()
+
+    os.makedirs(output_dir, exist_ok=True)
+    save_voxels(
+        os.path.join(output_dir, 'voxels.npz'), coords, scene["boxes"]["label"][instances], instances,
+        origin, voxel_size, shape, scene["label_names"], dense=dense
+    )
+    with open(os.path.join(output_dir, 'instances.json'), 'w') as f:
+        f.write(json.dumps({"labels": scene["label_names"], "instances": scene["objects"]}, indent=4))
+    print(f"{input_folder}: {len(coords)} voxels in a {tuple(shape)} grid, {time.perf_counter() - start:.2f}s")
+    return len(coords)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Voxelize USDA scenes into compressed semantic occupancy grids')
+    parser.add_argument('--input_folder', type=str, default=None, help='Path to input USDA folder')
+    parser.add_argument('--input_root', type=str, default=None, help='Voxelize every scene folder found recursively under this path')
+    parser.add_argument('--output_dir', type=str, required=True)
+    parser.add_argument('--voxel_size', type=float, default=0.05, help='Voxel edge length in meters')
+    parser.add_argument('--dense', action='store_true', help='Also store dense occupancy and semantic grids')
+    parser.add_argument('--chunk_size', type=int, default=1 << 22, help='Surface points rasterized per chunk, bounds peak memory')
+    parser.add_argument('--asset_cache', type=str, default=None, help='Directory of per-asset local-space samples shared with sample_scan_point.py')
+    parser.add_argument('--cache_density', type=float, default=10000.0, help='Asset cache sampling density in points per square meter')
+    parser.add_argument('--population_mask', type=str, nargs='*', default=None)
+    parser.add_argument('--meta_data', type=str, default='data/assets.json')
+    parser.add_argument('--labels', type=str, default='data/labels.json')
+    args = parser.parse_args()
+    if (args.input_folder is None) == (args.input_root is None):
+        parser.error('Exactly one of --input_folder and --input_root is required')
+
+    asset_cache = None
+    if args.asset_cache is not None:
+        asset_cache = AssetPointCache(args.asset_cache, density=args.cache_density)
+        if args.cache_density * args.voxel_size ** 2 < 16:
+            print(f"Warning: --cache_density {args.cache_density:g} gives fewer than 16 samples per voxel face; "
+                  "cached assets may leave holes at this voxel size")
+    asset_labels, label_names = load_label_maps(args.meta_data, args.labels)
+    if args.input_root is not None:
+        jobs = [(d, os.path.join(args.output_dir, os.path.relpath(d, args.input_root))) for d in find_scene_folders(args.input_root)]
+    else:
+        jobs = [(args.input_folder, args.output_dir)]
+    for scene_dir, output_dir in tqdm(jobs):
+        voxelize(
+            scene_dir, output_dir, voxel_size=args.voxel_size, dense=args.dense, chunk_size=args.chunk_size,
+            asset_cache=asset_cache, asset_labels=asset_labels, label_names=label_names,
+            population_mask=args.population_mask
+        )